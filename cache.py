@@ -0,0 +1,65 @@
+# cache.py
+# Thread-sicherer LRU-Cache mit optionaler Ablaufzeit (TTL)
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU-Cache mit Ablaufzeit pro Eintrag.
+
+    Bei Überschreiten von maxsize wird der am längsten nicht genutzte
+    Eintrag verdrängt. Abgelaufene Einträge werden beim Zugriff entfernt.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: Maximale Anzahl Einträge
+            ttl: Lebensdauer in Sekunden (None = unbegrenzt)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Gibt den Wert zurück (und markiert ihn als zuletzt genutzt)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Speichert einen Wert und verdrängt ggf. den ältesten Eintrag."""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Entfernt einen Eintrag."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Leert den Cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
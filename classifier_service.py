@@ -6,29 +6,43 @@ from fastapi.responses import JSONResponse
 from fastapi.requests import Request
 import traceback
 import io
+import os
 import hashlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import List, Tuple
 import uuid
 from datetime import datetime
 from PIL import Image
-import pytesseract
 import numpy as np
 import cv2
 import torch
-from transformers import CLIPProcessor, CLIPModel
 
 # Neue Module importieren
 from config import config
+from config_manager import config_manager
+from cache import TTLCache
+from responses import ORJSONResponse
 from models.corner_detector import CornerDetector
 from models.ocr_analyzer import OCRAnalyzer
+from models.clip_batcher import CLIPBatcher
+from models.clip_preprocess import CLIPPreprocessor
 from features.color_analyzer import ColorAnalyzer
 from features.line_analyzer import LineAnalyzer
 from features.feature_extractor import FeatureExtractor
-from database.ci4_client import ci4_client
+from features.image_arrays import ImageArrays
+from database.ci4_client import ci4_client, async_ci4_client
 from database.schemas import FeedbackRequest
 from learning.feedback_processor import initialize_feedback_processor, feedback_processor
 from routers.config_api import router as config_router
 
-app = FastAPI(title="Image Classification Service", version="2.0.0")
+app = FastAPI(
+    title="Image Classification Service",
+    version="2.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Include configuration API router
 app.include_router(config_router, prefix="/config", tags=["configuration"])
@@ -46,41 +60,196 @@ async def global_exception_handler(request: Request, exc: Exception):
     })
 
 # ----------------------------
-# INITIALIZE COMPONENTS
+# THREADING
 # ----------------------------
-# CLIP Model
-try:
-    clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    MODEL_READY = True
-except Exception as e:
-    print(f"⚠️ CLIP model loading failed: {e}")
-    clip_model = None
-    processor = None
-    MODEL_READY = False
+# Tesseract-internes OpenMP bremst mehr als es nützt - parallelisiert wird
+# über Prozesse/Threads. Muss vor dem ersten Tesseract-Aufruf gesetzt sein.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Bei mehreren uvicorn-Workern (WEB_CONCURRENCY) keine verschachtelten
+# Thread-Pools in OpenCV/Torch, sonst N×N Threads auf N Kernen
+if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    cv2.setNumThreads(1)
+    torch.set_num_threads(1)
 
+# ----------------------------
+# INITIALIZE COMPONENTS
+# ----------------------------
 # Component Instances
 corner_detector = CornerDetector()
 ocr_analyzer = OCRAnalyzer()
 color_analyzer = ColorAnalyzer()
 line_analyzer = LineAnalyzer()
 feature_extractor = None  # Wird nach CLIP-Model-Loading initialisiert
+clip_loader_task = None  # Hintergrund-Task (Referenz halten)
+
+# Ergebnis-Cache für Duplikate (Key: SHA-256 des Bildes + Config-REVISION,
+# damit gelernte Gewichte/Schwellwerte und Config-Änderungen sofort greifen)
+classification_cache = TTLCache(
+    maxsize=config.CACHE_MAX_SIZE,
+    ttl=config.CACHE_TTL
+) if config.ENABLE_CACHING else None
+
+# Thread-Pool für die unabhängigen Analyse-Schritte (OpenCV/Torch/Tesseract geben den GIL frei)
+executor = ThreadPoolExecutor(
+    max_workers=config.PERFORMANCE["worker_threads"],
+    thread_name_prefix="classify"
+)
+
+# CI4-Schreibzugriffe laufen im Hintergrund (async, blockieren keine Analyse)
+ci4_queue: asyncio.Queue = asyncio.Queue(maxsize=config.CI4_CONFIG["queue_size"])
+ci4_worker_tasks = []
+
+# Feedback/Learning serialisiert in einem eigenen Thread (Gewichte sind geteilter Zustand)
+feedback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feedback")
+
+# Tesseract nutzt intern OpenMP - ohne OMP_THREAD_LIMIT=1 OCR-Aufrufe serialisieren
+ocr_guard = nullcontext() if os.getenv("OMP_THREAD_LIMIT") == "1" else threading.Semaphore(1)
 
 LABELS = ["document", "photo", "device type plate"]
 
+# CLIP Model (FP16 auf der GPU, BF16 auf der CPU) - wird beim Start im
+# Hintergrund geladen, damit uvicorn sofort /health beantworten kann
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+CLIP_DTYPE = torch.float16 if DEVICE == "cuda" else torch.bfloat16
+
+clip_model = None
+processor = None
+clip_preprocessor = None
+onnx_session = None
+TEXT_FEATURES = None  # Normalisierte Label-Embeddings (3, D)
+TEXT_LOGIT_WEIGHTS = None  # logit_scale * TEXT_FEATURES.T (D, 3), direkt für die Logits
+MODEL_READY = False
+CLIP_STATUS = "loading"
+clip_ready = asyncio.Event()  # Gesetzt sobald das Laden beendet ist (auch bei Fehler)
+
+if DEVICE == "cuda":
+    torch.backends.cudnn.benchmark = True  # Feste Eingabegröße (224x224)
+
+
+def load_onnx_session(onnx_path: str):
+    """
+    Lädt den (INT8-quantisierten) ONNX-Bild-Tower, falls konfiguriert.
+
+    Args:
+        onnx_path: Pfad zur ONNX-Datei (leer = deaktiviert)
+
+    Returns:
+        onnxruntime.InferenceSession oder None
+    """
+    if not onnx_path:
+        return None
+    try:
+        import onnxruntime as ort
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        return ort.InferenceSession(onnx_path, providers=providers)
+    except Exception as e:
+        print(f"⚠️ ONNX image encoder loading failed, using PyTorch: {e}")
+        return None
+
+
+def compute_text_features():
+    """
+    Berechnet die normalisierten Text-Embeddings der LABELS einmalig.
+
+    Die Labels sind konstant - der Text-Tower muss daher nicht bei
+    jedem Request erneut laufen.
+    """
+    text_inputs = processor(text=LABELS, return_tensors="pt", padding=True).to(DEVICE)
+    with torch.inference_mode():
+        with torch.autocast(device_type=DEVICE, dtype=CLIP_DTYPE):
+            text_features = clip_model.get_text_features(**text_inputs)
+        text_features = text_features.float()
+        return text_features / text_features.norm(dim=-1, keepdim=True)
+
+
+def compile_image_tower():
+    """
+    Übersetzt den CLIP-Bild-Tower mit torch.compile (opt-in via CLIP_COMPILE).
+
+    Auf CUDA mit CUDA-Graphs (reduce-overhead), auf der CPU mit Inductor.
+    Ein Warmup-Forward löst die Übersetzung noch beim Start aus; schlägt sie
+    fehl, bleibt der ungekompilierte Tower aktiv.
+    """
+    vision_model = clip_model.vision_model
+    try:
+        mode = "reduce-overhead" if DEVICE == "cuda" else "default"
+        clip_model.vision_model = torch.compile(vision_model, mode=mode, fullgraph=True)
+
+        size = clip_model.config.vision_config.image_size
+        dummy = torch.zeros(1, 3, size, size, device=DEVICE, dtype=CLIP_DTYPE)
+        with torch.inference_mode(), torch.autocast(device_type=DEVICE, dtype=CLIP_DTYPE):
+            clip_model.get_image_features(pixel_values=dummy)
+        print(f"✓ CLIP image tower compiled ({mode})")
+    except Exception as e:
+        print(f"⚠️ torch.compile failed, using eager CLIP: {e}")
+        clip_model.vision_model = vision_model
+
+
+def load_clip():
+    """Lädt CLIP, optionalen ONNX-Bild-Tower und die Label-Embeddings (blockierend)."""
+    global clip_model, processor, clip_preprocessor, onnx_session, TEXT_FEATURES, TEXT_LOGIT_WEIGHTS, MODEL_READY, CLIP_STATUS
+
+    try:
+        from transformers import CLIPProcessor, CLIPModel
+
+        model_name = config.CLIP_CONFIG["model_name"]
+        clip_model = CLIPModel.from_pretrained(model_name).to(DEVICE, dtype=CLIP_DTYPE).eval()
+        processor = CLIPProcessor.from_pretrained(model_name)
+        if config.CLIP_CONFIG["fast_preprocess"]:
+            clip_preprocessor = CLIPPreprocessor(processor)
+        onnx_session = load_onnx_session(config.CLIP_CONFIG["onnx_path"])
+        if config.CLIP_CONFIG["compile"] and onnx_session is None:
+            compile_image_tower()
+        TEXT_FEATURES = compute_text_features()
+        with torch.inference_mode():
+            TEXT_LOGIT_WEIGHTS = (clip_model.logit_scale.exp().float() * TEXT_FEATURES).T.contiguous()
+        MODEL_READY = True
+        CLIP_STATUS = "ready"
+    except Exception as e:
+        print(f"⚠️ CLIP model loading failed: {e}")
+        clip_model = None
+        processor = None
+        clip_preprocessor = None
+        onnx_session = None
+        MODEL_READY = False
+        CLIP_STATUS = "not loaded"
+
+
+async def load_clip_background():
+    """Lädt CLIP im Thread und initialisiert danach die CLIP-abhängigen Komponenten."""
+    global feature_extractor, feedback_processor
+
+    try:
+        await asyncio.to_thread(load_clip)
+
+        if MODEL_READY:
+            feature_extractor = FeatureExtractor(clip_model, processor, onnx_session)
+            feedback_processor = initialize_feedback_processor(clip_model, processor)
+            print("✓ CLIP Model: Ready")
+            print("✓ Feature Extractor: Initialized")
+            print("✓ Adaptive Learning: Enabled")
+        else:
+            print("⚠ Feature Extractor: Disabled (CLIP model not loaded)")
+            print("⚠ Adaptive Learning: Disabled (CLIP model not loaded)")
+    finally:
+        clip_ready.set()
+
 # ----------------------------
 # HEALTH CHECK
 # ----------------------------
 @app.get("/health")
-def health():
+async def health():
     """Health check endpoint."""
     ci4_status = "enabled" if ci4_client.enabled else "disabled"
-    ci4_reachable = ci4_client.health_check() if ci4_client.enabled else None
+    ci4_reachable = await async_ci4_client.health_check() if ci4_client.enabled else None
 
     return {
         "status": "ok",
         "version": config.VERSION,
-        "clip_model": "ready" if MODEL_READY else "not loaded",
+        "clip_model": CLIP_STATUS,
+        "clip_backend": "onnx" if onnx_session is not None else "torch",
         "ci4_integration": ci4_status,
         "ci4_reachable": ci4_reachable
     }
@@ -88,39 +257,141 @@ def health():
 # ----------------------------
 # CLIP CLASSIFICATION
 # ----------------------------
+def classify_clip_batch(images: List[Image.Image]) -> List[Tuple[str, float]]:
+    """
+    Klassifiziert mehrere Bilder mit einem einzigen CLIP-Forward-Pass.
+
+    Args:
+        images: Liste von PIL Images
+
+    Returns:
+        Liste von (label, confidence) in Eingabe-Reihenfolge
+    """
+    if not MODEL_READY:
+        return [("unknown", 0.0)] * len(images)
+
+    if clip_preprocessor is not None:
+        pixel_values = clip_preprocessor(images)
+    else:
+        pixel_values = processor(images=images, return_tensors="pt")["pixel_values"]
+
+    # Nur noch der Bild-Tower pro Request, Text-Embeddings sind vorberechnet
+    with torch.inference_mode():
+        if onnx_session is not None:
+            image_embeds = onnx_session.run(
+                None, {"pixel_values": pixel_values.numpy()}
+            )[0]
+            image_features = torch.from_numpy(image_embeds).to(DEVICE).float()
+        else:
+            pixel_values = pixel_values.to(DEVICE, dtype=CLIP_DTYPE)
+            with torch.autocast(device_type=DEVICE, dtype=CLIP_DTYPE):
+                image_features = clip_model.get_image_features(pixel_values=pixel_values)
+            image_features = image_features.float()
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        logits = image_features @ TEXT_LOGIT_WEIGHTS
+        conf, idx = logits.softmax(dim=1).max(dim=1)
+
+    return [(LABELS[i], c) for i, c in zip(idx.tolist(), conf.tolist())]
+
+
 def classify_clip(image: Image.Image):
     """Klassifiziert Bild mit CLIP."""
-    if not MODEL_READY:
-        return "unknown", 0.0
+    return classify_clip_batch([image])[0]
+
 
-    inp = processor(text=LABELS, images=image, return_tensors="pt", padding=True)
-    out = clip_model(**inp)
-    prob = out.logits_per_image.softmax(dim=1)
-    idx = prob.argmax().item()
+async def classify_clip_async(image: Image.Image):
+    """Wartet ggf. auf das Laden von CLIP und reiht das Bild in den Batcher ein."""
+    await clip_ready.wait()
+    return await clip_batcher.submit(image)
 
-    return LABELS[idx], float(prob[0][idx])
+
+# Gleichzeitige /classify-Requests teilen sich einen CLIP-Forward-Pass
+clip_batcher = CLIPBatcher(
+    classify_clip_batch,
+    batch_size=config.PERFORMANCE["clip_batch_size"],
+    max_wait_ms=config.PERFORMANCE["clip_batch_wait_ms"],
+    executor=executor
+)
 
 # ----------------------------
 # TYPEPLATE LEGACY FEATURES
 # ----------------------------
-def detect_typeplate_legacy(image: Image.Image, text: str):
-    """Legacy Typeplate-Detektion (für Kompatibilität)."""
-    TYPEPLATE_KW = config.OCR_CONFIG["typeplate_keywords"]
+def edge_density(arrays: ImageArrays) -> float:
+    """
+    Anteil der Canny-Kantenpixel (80/200) - Linien-Dichte für den TP-Score.
+
+    Wird in Original-Auflösung gemessen: line_density_factor ist auf diese
+    Dichte kalibriert, ein verkleinertes (geglättetes) Bild liefert weniger
+    Kantenpixel.
+
+    Args:
+        arrays: Gemeinsame Pixel-Puffer des Requests
+    """
+    edges = arrays.canny_full(80, 200)
+    return cv2.countNonZero(edges) / edges.size
+
 
-    t = text.lower()
-    digits = sum(c.isdigit() for c in t)
-    digit_ratio = digits / max(len(t), 1)
+def detect_typeplate_legacy(typeplate_text_features: dict, line_density: float):
+    """
+    Legacy Typeplate-Detektion (für Kompatibilität).
 
-    kw_hits = sum(1 for kw in TYPEPLATE_KW if kw in t)
+    Ziffern-Ratio und Keyword-Anzahl stammen aus
+    OCRAnalyzer.analyze_typeplate_features (identische Definition), der
+    Text wird daher nicht erneut durchlaufen.
 
-    gray = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
-    edges = cv2.Canny(gray, 80, 200)
-    line_density = np.sum(edges > 0) / (image.size[0] * image.size[1])
+    Args:
+        typeplate_text_features: Ergebnis von analyze_typeplate_features
+        line_density: Ergebnis von edge_density
+    """
+    digit_ratio = typeplate_text_features["digit_ratio"]
+    kw_hits = typeplate_text_features["keyword_count"]
 
     score = digit_ratio * 2 + kw_hits * 0.7 + line_density * 600
 
     return score, digit_ratio, kw_hits, line_density
 
+# ----------------------------
+# IMAGE DECODING
+# ----------------------------
+def decode_image(data: bytes) -> Tuple[Image.Image, np.ndarray]:
+    """
+    Dekodiert die Bilddaten direkt in ein RGB-Array (OpenCV/libjpeg-turbo).
+
+    EXIF-Orientierung wird wie bei PIL ignoriert. Formate, die OpenCV nicht
+    lesen kann (z.B. GIF), laufen über PIL.
+
+    Returns:
+        (PIL Image für OCR/CLIP, RGB Numpy array)
+    """
+    bgr = cv2.imdecode(
+        np.frombuffer(data, np.uint8),
+        cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    )
+    if bgr is None:
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        return img, np.array(img)
+
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    return Image.fromarray(rgb), rgb
+
+# ----------------------------
+# TEXT PIPELINE (OCR + textbasierte Features)
+# ----------------------------
+def analyze_text(image: Image.Image):
+    """
+    OCR und alle davon abhängigen Text-Features in einem Worker-Thread.
+
+    Returns:
+        (ocr_result, (ar_score, ar_debug), typeplate_text_features)
+    """
+    with ocr_guard:
+        ocr_result = ocr_analyzer.analyze(image)
+    text = ocr_result["text"]
+
+    arbeitsbericht, typeplate_text_features = ocr_analyzer.analyze_text(text)
+
+    return ocr_result, arbeitsbericht, typeplate_text_features
+
 # ----------------------------
 # MAIN CLASSIFICATION ENDPOINT
 # ----------------------------
@@ -140,91 +411,104 @@ async def classify_image(file: UploadFile = File(...)):
     if not data:
         raise ValueError("Leere Datei hochgeladen.")
 
-    # Image laden
-    img = Image.open(io.BytesIO(data)).convert("RGB")
-    img_array = np.array(img)
+    # Image Hash für Deduplizierung (SHA-256, da CI4 "sha256:"-IDs speichert)
+    loop = asyncio.get_running_loop()
+    image_hash = await loop.run_in_executor(executor, lambda: hashlib.sha256(data).hexdigest())
 
-    # Image Hash für Deduplizierung
-    image_hash = hashlib.sha256(data).hexdigest()
+    # Duplikat: komplette Pipeline überspringen
+    cache_key = (image_hash, config.REVISION)
+    cached = classification_cache.get(cache_key) if classification_cache is not None else None
+    if cached is not None:
+        cached_response, ci4_features, confidence = cached
+        response = {**cached_response, "classification_id": str(uuid.uuid4()), "cached": True}
+        store_classification(response, image_hash, confidence, ci4_features)
+        return ORJSONResponse(response)
 
-    # ----------------------------
-    # 1. OCR ANALYSIS
-    # ----------------------------
-    ocr_result = ocr_analyzer.analyze(img)
-    text = ocr_result["text"]
-    text_len = ocr_result["text_length"]
-    text_density = ocr_result["text_density"]
+    # Image laden
+    img, img_array = await loop.run_in_executor(executor, decode_image, data)
 
-    # ----------------------------
-    # 2. ARBEITSBERICHT DETECTION
-    # ----------------------------
-    ar_score, ar_debug = ocr_analyzer.detect_arbeitsbericht(text)
+    # Einmal verkleinert; Graustufen/LAB/Canny werden von allen Analyzern geteilt.
+    # OCR und CLIP arbeiten weiterhin auf dem Originalbild.
+    arrays = ImageArrays.downscaled(img_array, config.PERFORMANCE["analysis_max_side"])
 
     # ----------------------------
-    # 3. CLIP CLASSIFICATION
-    # ----------------------------
-    clip_label, clip_conf = classify_clip(img)
-
+    # 1.-5. ANALYSE (parallel im Thread-Pool)
     # ----------------------------
-    # 4. TYPEPLATE FEATURES (NEU)
-    # ----------------------------
-    typeplate_text_features = ocr_analyzer.analyze_typeplate_features(text)
+    # OCR + Arbeitsbericht + Typeplate-Text-Features, CLIP, Farbe, Linien,
+    # Kantendichte und Eckpunkte sind voneinander unabhängig
+    (
+        (ocr_result, (ar_score, ar_debug), typeplate_text_features),
+        (clip_label, clip_conf),
+        color_info,
+        line_info,
+        line_density,
+        corners
+    ) = await asyncio.gather(
+        loop.run_in_executor(executor, analyze_text, img),
+        classify_clip_async(img),
+        loop.run_in_executor(executor, color_analyzer.analyze_color_uniformity, arrays),
+        loop.run_in_executor(executor, line_analyzer.analyze_straight_lines, arrays),
+        loop.run_in_executor(executor, edge_density, arrays),
+        loop.run_in_executor(executor, corner_detector.detect_4_corners, arrays)
+    )
 
     # Legacy features (Kompatibilität)
-    legacy_score, dr, kw, ld = detect_typeplate_legacy(img, text)
-
-    # Neue Features
-    color_info = color_analyzer.analyze_color_uniformity(img)
-    line_info = line_analyzer.analyze_straight_lines(img)
+    legacy_score, dr, kw, ld = detect_typeplate_legacy(typeplate_text_features, line_density)
 
-    # ----------------------------
-    # 5. CORNER DETECTION (NEU)
-    # ----------------------------
-    corners = corner_detector.detect_4_corners(img_array)
+    text = ocr_result["text"]
+    text_len = ocr_result["text_length"]
+    text_density = ocr_result["text_density"]
 
     # ----------------------------
     # 6. SCORING CALCULATION
     # ----------------------------
 
+    # Gewichte/Schwellwerte einmal binden (ein konsistenter Stand pro Request,
+    # auch wenn das Learning-System parallel Gewichte anpasst)
+    tp_w = config.WEIGHTS["TP"]
+    doc_w = config.WEIGHTS["DOC"]
+    photo_w = config.WEIGHTS["PHOTO"]
+    thresholds = config.THRESHOLDS
+
     # Arbeitsbericht Score (UPDATED mit neuem System)
     AR = ar_score  # Bereits berechnet in ocr_analyzer
 
     # Typeplate Score (ENHANCED)
     TP = (
-        (clip_label == "device type plate") * (clip_conf * config.WEIGHTS["TP"]["clip_factor"])
-        + typeplate_text_features["keyword_count"] * config.WEIGHTS["TP"]["keyword_multiplier"]
-        + (dr * config.WEIGHTS["TP"]["digit_ratio_factor"])
-        + (ld * config.WEIGHTS["TP"]["line_density_factor"])
-        + color_info["uniformity_score"] * config.WEIGHTS["TP"]["color_uniformity_factor"]  # NEU
-        + line_info["line_score"] * config.WEIGHTS["TP"]["rect_score_factor"]  # NEU
+        (clip_label == "device type plate") * (clip_conf * tp_w["clip_factor"])
+        + typeplate_text_features["keyword_count"] * tp_w["keyword_multiplier"]
+        + (dr * tp_w["digit_ratio_factor"])
+        + (ld * tp_w["line_density_factor"])
+        + color_info["uniformity_score"] * tp_w["color_uniformity_factor"]  # NEU
+        + line_info["line_score"] * tp_w["rect_score_factor"]  # NEU
     )
 
     # Document Score
     DOC = (
-        (text_len / config.WEIGHTS["DOC"]["text_length_divisor"])
-        + (clip_label == "document") * (clip_conf * config.WEIGHTS["DOC"]["clip_factor"])
+        (text_len / doc_w["text_length_divisor"])
+        + (clip_label == "document") * (clip_conf * doc_w["clip_factor"])
     )
 
     # Photo Score
     PHOTO = (
-        (text_len < config.WEIGHTS["PHOTO"]["low_text_threshold"]) * config.WEIGHTS["PHOTO"]["low_text_bonus"]
+        (text_len < photo_w["low_text_threshold"]) * photo_w["low_text_bonus"]
         + (kw == 0) * 1
         + (dr == 0) * 1
-        + (clip_label == "photo") * (clip_conf * config.WEIGHTS["PHOTO"]["clip_factor"])
+        + (clip_label == "photo") * (clip_conf * photo_w["clip_factor"])
     )
 
     # ----------------------------
     # 7. CLASSIFICATION DECISION
     # ----------------------------
-    if AR >= config.THRESHOLDS["arbeitsbericht"]:  # >= 5.0
+    if AR >= thresholds["arbeitsbericht"]:  # >= 5.0
         predicted = "arbeitsbericht"
         confidence = min(AR / 10.0, 0.95)
 
-    elif TP > max(DOC, PHOTO) and TP >= config.THRESHOLDS["typeplate"]:
+    elif TP > max(DOC, PHOTO) and TP >= thresholds["typeplate"]:
         predicted = "typeplate"
         confidence = min(TP / 15.0, 0.95)
 
-    elif DOC > PHOTO and DOC >= config.THRESHOLDS["document"]:
+    elif DOC > PHOTO and DOC >= thresholds["document"]:
         predicted = "document"
         confidence = min(DOC / 8.0, 0.95)
 
@@ -269,42 +553,90 @@ async def classify_image(file: UploadFile = File(...)):
             "color_uniformity": color_info,  # NEU
             "line_analysis": line_info  # NEU
         },
-        "model_version": config.VERSION
+        "model_version": config.VERSION,
+        "cached": False
     }
 
     # ----------------------------
     # 9. CI4 INTEGRATION (optional)
     # ----------------------------
-    if ci4_client.enabled:
-        try:
-            classification_data = {
-                "classification_id": classification_id,
-                "timestamp": datetime.now().isoformat(),
-                "image_hash": f"sha256:{image_hash}",
-                "prediction": {
-                    "class": predicted,
-                    "confidence": confidence,
-                    "scores": response["scores"]
-                },
-                "features": {
-                    "text_length": text_len,
-                    "clip_label": clip_label,
-                    "clip_confidence": clip_conf,
-                    "color_uniformity": color_info["global_std"],
-                    "has_rectangular_border": line_info["has_rectangular_border"],
-                    "corner_detection_method": corners["detection_method"],
-                    "arbeitsbericht_keyword": ar_debug["has_main_keyword"]
-                },
-                "model_version": config.VERSION,
-                "weights_version": config.VERSION
-            }
+    ci4_features = {
+        "text_length": text_len,
+        "clip_label": clip_label,
+        "clip_confidence": clip_conf,
+        "color_uniformity": color_info["global_std"],
+        "has_rectangular_border": line_info["has_rectangular_border"],
+        "corner_detection_method": corners["detection_method"],
+        "arbeitsbericht_keyword": ar_debug["has_main_keyword"]
+    }
+
+    if classification_cache is not None:
+        classification_cache.set(cache_key, (response, ci4_features, confidence))
+
+    store_classification(response, image_hash, confidence, ci4_features)
 
-            ci4_client.store_classification(classification_data)
+    # Direkt als Response: orjson statt jsonable_encoder + json.dumps
+    return ORJSONResponse(response)
 
+
+def enqueue_ci4(fn, *args) -> bool:
+    """
+    Reiht einen CI4-Schreibzugriff (Coroutine-Funktion) in die Hintergrund-Queue ein.
+
+    Bei voller Queue wird der Eintrag verworfen (Backpressure statt
+    wachsendem Speicher, wenn CI4 nicht erreichbar ist).
+
+    Returns:
+        False wenn der Eintrag verworfen wurde
+    """
+    try:
+        ci4_queue.put_nowait((fn, args))
+    except asyncio.QueueFull:
+        print(f"⚠️ CI4 queue full, dropping {fn.__name__}")
+        return False
+    return True
+
+
+async def ci4_worker():
+    """Arbeitet die CI4-Queue ab."""
+    while True:
+        fn, args = await ci4_queue.get()
+        try:
+            await fn(*args)
         except Exception as e:
-            print(f"⚠️ CI4 storage failed: {e}")
+            print(f"⚠️ CI4 {fn.__name__} failed: {e}")
+        finally:
+            ci4_queue.task_done()
+
+
+def store_classification(response: dict, image_hash: str, confidence: float, features: dict):
+    """
+    Speichert eine Klassifizierung in CI4 (falls aktiviert, im Hintergrund).
+
+    Args:
+        response: API-Response der Klassifizierung
+        image_hash: SHA-256 des Bildes (hex)
+        confidence: Ungerundete Konfidenz
+        features: Feature-Zusammenfassung für CI4
+    """
+    if not ci4_client.enabled:
+        return
+
+    classification_data = {
+        "classification_id": response["classification_id"],
+        "timestamp": datetime.now().isoformat(),
+        "image_hash": f"sha256:{image_hash}",
+        "prediction": {
+            "class": response["predicted"],
+            "confidence": confidence,
+            "scores": response["scores"]
+        },
+        "features": features,
+        "model_version": config.VERSION,
+        "weights_version": config.VERSION
+    }
 
-    return response
+    enqueue_ci4(async_ci4_client.store_classification, classification_data)
 
 # ----------------------------
 # FEEDBACK ENDPOINT (ENHANCED)
@@ -350,31 +682,29 @@ async def submit_feedback(feedback: FeedbackRequest):
             "corrected_corners": feedback.corrected_corners
         }
 
-        # FeedbackProcessor verwenden (adaptives Learning)
+        # FeedbackProcessor verwenden (adaptives Learning, außerhalb des Event-Loops)
         if feedback_processor:
-            result = feedback_processor.process_feedback(
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                feedback_executor,
+                feedback_processor.process_feedback,
                 feedback.classification_id,
                 feedback_data
             )
             return result
         else:
-            # Fallback: Nur in CI4 speichern (kein Learning)
-            result = ci4_client.store_feedback(
-                feedback.classification_id,
-                feedback_data
-            )
-
-            if result:
-                return {
-                    "status": "success",
-                    "message": "Feedback stored (learning disabled)"
-                }
-            else:
+            # Fallback: Nur in CI4 speichern (kein Learning, im Hintergrund)
+            if not enqueue_ci4(async_ci4_client.store_feedback, feedback.classification_id, feedback_data):
                 return {
                     "status": "error",
-                    "message": "Failed to store feedback"
+                    "message": "Failed to store feedback (CI4 queue full)"
                 }
 
+            return {
+                "status": "success",
+                "message": "Feedback queued for storage (learning disabled)"
+            }
+
     except Exception as e:
         return {
             "status": "error",
@@ -419,7 +749,7 @@ async def get_similar_images(classification_id: str, limit: int = 10):
 
     try:
         # 1. Original-Klassifizierung von CI4 laden
-        original = ci4_client.get_classification(classification_id)
+        original = await async_ci4_client.get_classification(classification_id)
 
         if not original:
             return {
@@ -431,7 +761,7 @@ async def get_similar_images(classification_id: str, limit: int = 10):
         features = original.get('features', {})
 
         # 3. Ähnliche Bilder von CI4 abfragen
-        similar = ci4_client.find_similar_images(features, limit)
+        similar = await async_ci4_client.find_similar_images(features, limit)
 
         return {
             "reference": {
@@ -480,36 +810,54 @@ async def get_learning_statistics():
 @app.on_event("startup")
 async def startup_event():
     """Initialisierung beim Start."""
-    global feature_extractor, feedback_processor
+    global clip_loader_task
 
     print("=" * 60)
     print("Image Classification Service v2.0 - Self-Learning Edition")
     print("=" * 60)
     print(f"✓ Config loaded: {config.VERSION}")
-    print(f"✓ CLIP Model: {'Ready' if MODEL_READY else 'Not loaded'}")
+    print("… CLIP Model: Loading in background")
     print(f"✓ CI4 Integration: {'Enabled' if ci4_client.enabled else 'Disabled'}")
     print(f"✓ Corner Detection: Hybrid (Contour + Harris)")
     print(f"✓ Color Analysis: LAB-based uniformity")
     print(f"✓ Line Analysis: Hough transform")
-
-    # Initialisiere FeatureExtractor und FeedbackProcessor
-    if MODEL_READY:
-        feature_extractor = FeatureExtractor(clip_model, processor)
-        feedback_processor = initialize_feedback_processor(clip_model, processor)
-        print("✓ Feature Extractor: Initialized")
-        print("✓ Adaptive Learning: Enabled")
-    else:
-        print("⚠ Feature Extractor: Disabled (CLIP model not loaded)")
-        print("⚠ Adaptive Learning: Disabled (CLIP model not loaded)")
-
     print("=" * 60)
 
+    # CLIP (inkl. FeatureExtractor und FeedbackProcessor) im Hintergrund laden
+    clip_loader_task = asyncio.create_task(load_clip_background())
+
     # Optional: Gewichte von CI4 laden
     if ci4_client.enabled:
-        weights = ci4_client.get_model_weights()
+        ci4_worker_tasks.extend(
+            asyncio.create_task(ci4_worker()) for _ in range(config.CI4_CONFIG["queue_workers"])
+        )
+
+        weights = await async_ci4_client.get_model_weights()
         if weights:
             print("✓ Loaded weights from CI4")
             config.update_weights(weights.get("weights", {}))
             config.update_thresholds(weights.get("thresholds", {}))
         else:
             print("⚠ No weights found in CI4, using defaults")
+
+# ----------------------------
+# SHUTDOWN EVENT
+# ----------------------------
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Wartet kurz auf ausstehende CI4-Schreibzugriffe und Audit-Log-Einträge."""
+    # Noch nicht angewendete Gewichts-Updates nicht verlieren
+    if feedback_processor:
+        feedback_processor.flush()
+
+    await config_manager.flush_audit_log()
+
+    if ci4_worker_tasks:
+        try:
+            await asyncio.wait_for(ci4_queue.join(), timeout=config.CI4_CONFIG["timeout"])
+        except asyncio.TimeoutError:
+            print(f"⚠️ Shutdown: {ci4_queue.qsize()} CI4 writes not stored")
+        for task in ci4_worker_tasks:
+            task.cancel()
+
+    await async_ci4_client.close()
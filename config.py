@@ -2,7 +2,58 @@
 # Zentrale Konfiguration mit adaptiven Gewichten für selbstlernendes System
 
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher, get_matcher
+
+def _flatten_weights(weights: Dict[str, Dict[str, Any]]) -> Tuple[np.ndarray, Dict[Tuple[str, str], int]]:
+    """
+    Legt alle numerischen Gewichte in ein zusammenhängendes Array.
+
+    Args:
+        weights: WEIGHTS-Dict ({Kategorie: {Name: Wert}})
+
+    Returns:
+        (float64-Array, {(Kategorie, Name): Index})
+    """
+    index = {}
+    values = []
+    for category, entries in weights.items():
+        for key, value in entries.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                index[(category, key)] = len(values)
+                values.append(value)
+    return np.array(values, dtype=np.float64), index
+
+
+def _category_ranges(index: Dict[Tuple[str, str], int]) -> Dict[str, Tuple[slice, Tuple[str, ...]]]:
+    """
+    Bereich jeder Kategorie in WEIGHTS_ARRAY (Kategorien liegen zusammenhängend).
+
+    Returns:
+        {Kategorie: (Slice, Gewichts-Namen in Array-Reihenfolge)}
+    """
+    ranges: Dict[str, list] = {}
+    for (category, key), i in index.items():
+        ranges.setdefault(category, []).append((i, key))
+    return {
+        category: (slice(entries[0][0], entries[-1][0] + 1), tuple(key for _, key in entries))
+        for category, entries in ranges.items()
+    }
+
+
+def _flatten_thresholds(thresholds: Dict[str, float]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Legt die Schwellwerte in ein Array.
+
+    Returns:
+        (float64-Array, {Klasse: Index})
+    """
+    index = {name: i for i, name in enumerate(thresholds)}
+    return np.array([thresholds[name] for name in index], dtype=np.float64), index
+
 
 class ClassificationConfig:
     """Zentrale Konfiguration für Klassifizierungs-Service."""
@@ -10,6 +61,9 @@ class ClassificationConfig:
     # Version tracking
     VERSION = "1.0.0"
 
+    # Änderungszähler - wird bei jeder Laufzeit-Änderung erhöht (siehe mark_changed)
+    REVISION = 0
+
     # Klassifizierungs-Schwellwerte (adaptive)
     THRESHOLDS = {
         "arbeitsbericht": 5.0,  # Muss Keyword "Arbeitsbericht" enthalten
@@ -46,6 +100,12 @@ class ClassificationConfig:
         }
     }
 
+    # Numerische Gewichte/Schwellwerte als Arrays + Index (Structure of Arrays)
+    # für vektorisierte Auswertung - abgeleitet, von mark_changed() neu aufgebaut
+    WEIGHTS_ARRAY, WEIGHTS_INDEX = _flatten_weights(WEIGHTS)
+    WEIGHTS_RANGES = _category_ranges(WEIGHTS_INDEX)
+    THRESHOLDS_ARRAY, THRESHOLDS_INDEX = _flatten_thresholds(THRESHOLDS)
+
     # Eckpunkt-Erkennung Parameter
     CORNER_DETECTION = {
         "method": "contour_based",  # primary method
@@ -69,8 +129,10 @@ class ClassificationConfig:
         "lab_std_threshold_medium": 25.0,  # < 25 = mäßig uniform
         "dominant_color_threshold": 0.6,  # > 60% = dominante Farbe
         "grid_divisions": 5,  # 5x5 Grid für regionale Analyse
-        "kmeans_clusters": 3,  # K-Means für dominante Farben
-        "kmeans_iterations": 10
+        "kmeans_clusters": 3,  # Veraltet (dominante Farbe per Palette-Histogramm)
+        "kmeans_iterations": 10,  # Veraltet
+        "palette_bits": 5,  # Quantisierung pro Kanal für dominante Farbe (5 = 32768 Farben)
+        "max_side": 512  # Analyse auf verkleinertem Bild (0 = volle Auflösung)
     }
 
     # Linien-Erkennung Parameter
@@ -107,6 +169,26 @@ class ClassificationConfig:
         ]
     }
 
+    # Keyword-Mengen (kleingeschrieben) für O(1)-Lookups - abgeleitet aus OCR_CONFIG,
+    # werden von mark_changed() neu aufgebaut
+    ARBEITSBERICHT_KEYWORD_SET = frozenset(kw.lower() for kw in OCR_CONFIG["arbeitsbericht_keywords"])
+    TYPEPLATE_KEYWORD_SET = frozenset(kw.lower() for kw in OCR_CONFIG["typeplate_keywords"])
+    # Vorkompilierte Multi-Pattern-Matcher (Aho-Corasick) für den OCR-Text
+    ARBEITSBERICHT_MATCHER = get_matcher(OCR_CONFIG["arbeitsbericht_keywords"])
+    TYPEPLATE_MATCHER = get_matcher(OCR_CONFIG["typeplate_keywords"])
+
+    # CLIP-Backbone (nur beim Start ausgewertet)
+    CLIP_CONFIG = {
+        # z.B. "wkcn/TinyCLIP-ViT-40M-32-Text-19M" für ein destilliertes Modell
+        "model_name": os.getenv("CLIP_MODEL_NAME", "openai/clip-vit-base-patch32"),
+        # Optionaler INT8-ONNX-Export des Bild-Towers (siehe export_clip_onnx.py)
+        "onnx_path": os.getenv("CLIP_ONNX_PATH", ""),
+        # Bild-Tower mit torch.compile übersetzen (längerer Start, schnellere Requests)
+        "compile": os.getenv("CLIP_COMPILE", "false").lower() == "true",
+        # Resize/Normalisierung per OpenCV statt CLIPProcessor (models/clip_preprocess.py)
+        "fast_preprocess": os.getenv("CLIP_FAST_PREPROCESS", "true").lower() == "true"
+    }
+
     # Configuration API
     CONFIG_API_KEY = os.getenv("CONFIG_API_KEY", "")
 
@@ -117,12 +199,19 @@ class ClassificationConfig:
         "timeout": 10,  # Sekunden
         "retry_attempts": 3,
         "retry_delay": 1,  # Sekunden
-        "enabled": os.getenv("CI4_ENABLED", "false").lower() == "true"
+        "enabled": os.getenv("CI4_ENABLED", "false").lower() == "true",
+        "queue_size": 1000,  # Max. ausstehende Hintergrund-Schreibzugriffe
+        "queue_workers": 2  # Parallele Hintergrund-Schreibzugriffe
     }
 
+    # Häufig abgefragte Flags als Attribute (von mark_changed() aktualisiert)
+    CI4_ENABLED = CI4_CONFIG["enabled"]
+
     # Feature-Extraktion
     FEATURE_CONFIG = {
         "perceptual_hash_size": 8,  # 8x8 = 64-bit hash
+        # "libphash": DCT in C, nur 8x8 - andere Hashwerte als imagehash, nicht mischen!
+        "phash_backend": "imagehash",
         "color_histogram_bins": 32,
         "edge_histogram_bins": 32,
         "clip_embedding_dim": 512,
@@ -142,7 +231,11 @@ class ClassificationConfig:
         "reward_factor": 0.1,  # Bei Korrektur zur richtigen Klasse
         "threshold_recalc_interval": 50,  # Alle N Feedbacks
         "min_feedback_for_update": 10,  # Minimum Feedbacks vor Anwendung
-        "weight_update_interval": 50  # Gewichte an CI4 senden
+        "weight_update_interval": 50,  # Gewichte an CI4 senden
+        "weight_batch_size": 16,  # Gewichts-Updates sammeln und alle N Feedbacks anwenden
+        "recent_feedback_size": 10,  # Vollständige Einträge für "recent_feedback"
+        # Dauerhaftes Feedback-Log (80 Byte/Eintrag, beim Start eingelesen; leer = aus)
+        "feedback_log_path": os.getenv("FEEDBACK_LOG_PATH", "")
     }
 
     # Performance & Caching
@@ -151,9 +244,17 @@ class ClassificationConfig:
         "cache_ttl": 3600,  # Sekunden (1 Stunde)
         "max_cache_size": 1000,  # Anzahl gecachte Items
         "lazy_feature_extraction": True,  # Nur bei Bedarf extrahieren
-        "async_feature_extraction": True  # Im Hintergrund extrahieren
+        "async_feature_extraction": True,  # Im Hintergrund extrahieren
+        "worker_threads": 4,  # Thread-Pool für parallele Analyse-Schritte
+        "analysis_max_side": 1024,  # OpenCV-Analysen auf verkleinertem Bild (0 = aus)
+        "clip_batch_size": 16,  # Max. Bilder pro CLIP-Forward-Pass
+        "clip_batch_wait_ms": 10  # Max. Wartezeit auf weitere Requests
     }
 
+    ENABLE_CACHING = PERFORMANCE["enable_caching"]
+    CACHE_TTL = PERFORMANCE["cache_ttl"]
+    CACHE_MAX_SIZE = PERFORMANCE["max_cache_size"]
+
     @classmethod
     def get_arbeitsbericht_keywords(cls) -> list:
         """Gibt Arbeitsbericht-Keywords zurück."""
@@ -164,6 +265,31 @@ class ClassificationConfig:
         """Gibt Typeplate-Keywords zurück."""
         return cls.OCR_CONFIG["typeplate_keywords"]
 
+    @classmethod
+    def get_weight(cls, category: str, key: str) -> float:
+        """Liest ein Gewicht über den Array-Index (KeyError falls unbekannt)."""
+        return float(cls.WEIGHTS_ARRAY[cls.WEIGHTS_INDEX[(category, key)]])
+
+    @classmethod
+    def get_arbeitsbericht_keyword_set(cls) -> frozenset:
+        """Gibt Arbeitsbericht-Keywords als (kleingeschriebenes) frozenset zurück."""
+        return cls.ARBEITSBERICHT_KEYWORD_SET
+
+    @classmethod
+    def get_typeplate_keyword_set(cls) -> frozenset:
+        """Gibt Typeplate-Keywords als (kleingeschriebenes) frozenset zurück."""
+        return cls.TYPEPLATE_KEYWORD_SET
+
+    @classmethod
+    def get_arbeitsbericht_matcher(cls) -> KeywordMatcher:
+        """Gibt den Keyword-Matcher für Arbeitsberichte zurück."""
+        return cls.ARBEITSBERICHT_MATCHER
+
+    @classmethod
+    def get_typeplate_matcher(cls) -> KeywordMatcher:
+        """Gibt den Keyword-Matcher für Typenschilder zurück."""
+        return cls.TYPEPLATE_MATCHER
+
     @classmethod
     def update_weights(cls, new_weights: Dict[str, Any]):
         """
@@ -175,6 +301,38 @@ class ClassificationConfig:
         for category, weights in new_weights.items():
             if category in cls.WEIGHTS:
                 cls.WEIGHTS[category].update(weights)
+        cls.mark_changed()
+
+    @classmethod
+    def scale_weights(cls, category: str, factor: float, minimum: Optional[float] = None) -> bool:
+        """
+        Skaliert alle numerischen Gewichte einer Kategorie mit (1 + factor).
+
+        Eine Array-Operation auf dem WEIGHTS_ARRAY-Bereich der Kategorie,
+        danach werden die Werte in WEIGHTS zurückgeschrieben.
+
+        Args:
+            category: Gewichts-Kategorie (AR, TP, DOC, PHOTO)
+            factor: Relative Änderung (z.B. 0.05 = +5%, -0.1 = -10%)
+            minimum: Optionale Untergrenze je Gewicht
+
+        Returns:
+            False wenn die Kategorie keine numerischen Gewichte hat
+        """
+        entry = cls.WEIGHTS_RANGES.get(category)
+        if entry is None:
+            return False
+
+        span, keys = entry
+        values = cls.WEIGHTS_ARRAY[span] * (1 + factor)
+        if minimum is not None:
+            np.maximum(values, minimum, out=values)
+
+        weights = cls.WEIGHTS[category]
+        for key, value in zip(keys, values.tolist()):
+            weights[key] = value
+        cls.mark_changed()
+        return True
 
     @classmethod
     def update_thresholds(cls, new_thresholds: Dict[str, float]):
@@ -185,6 +343,40 @@ class ClassificationConfig:
             new_thresholds: Dictionary mit neuen Schwellwerten
         """
         cls.THRESHOLDS.update(new_thresholds)
+        cls.mark_changed()
+
+    @classmethod
+    def mark_changed(cls):
+        """
+        Markiert die Konfiguration als geändert.
+
+        Muss nach jeder direkten Änderung der Klassen-Attribute aufgerufen
+        werden, damit abgeleitete Caches (z.B. im ConfigurationManager)
+        neu aufgebaut werden.
+        """
+        cls.REVISION += 1
+        cls._rebuild_derived()
+
+    @classmethod
+    def _rebuild_derived(cls):
+        """Baut aus den Konfig-Dicts abgeleitete Strukturen neu auf."""
+        cls.ARBEITSBERICHT_KEYWORD_SET = frozenset(
+            kw.lower() for kw in cls.OCR_CONFIG["arbeitsbericht_keywords"]
+        )
+        cls.TYPEPLATE_KEYWORD_SET = frozenset(
+            kw.lower() for kw in cls.OCR_CONFIG["typeplate_keywords"]
+        )
+        cls.CI4_ENABLED = cls.CI4_CONFIG["enabled"]
+        cls.ENABLE_CACHING = cls.PERFORMANCE["enable_caching"]
+        cls.CACHE_TTL = cls.PERFORMANCE["cache_ttl"]
+        cls.CACHE_MAX_SIZE = cls.PERFORMANCE["max_cache_size"]
+        cls.WEIGHTS_ARRAY, cls.WEIGHTS_INDEX = _flatten_weights(cls.WEIGHTS)
+        cls.WEIGHTS_RANGES = _category_ranges(cls.WEIGHTS_INDEX)
+        cls.THRESHOLDS_ARRAY, cls.THRESHOLDS_INDEX = _flatten_thresholds(cls.THRESHOLDS)
+        # Nur bei geänderten Keywords neu bauen (sonst gecachter Automat);
+        # Tausch per Zuweisung, laufende Scans nutzen den alten Matcher
+        cls.ARBEITSBERICHT_MATCHER = get_matcher(cls.OCR_CONFIG["arbeitsbericht_keywords"])
+        cls.TYPEPLATE_MATCHER = get_matcher(cls.OCR_CONFIG["typeplate_keywords"])
 
     @classmethod
     def to_dict(cls) -> Dict[str, Any]:
@@ -2,18 +2,82 @@
 # Thread-safe configuration manager with file persistence
 
 import asyncio
+import atexit
 import json
 import logging
+import os
+import pickle
+import shutil
+import time
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 from datetime import datetime
 from copy import deepcopy
 
-from config_schemas import FullConfigSchema, ConfigMetadata
+import numpy as np
+
+from config_schemas import ConfigMetadata, validate_full_config
 from config import ClassificationConfig
+from rwlock import AsyncRWLock
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Ohne Validierung bauen - nur für intern erzeugte, vertrauenswürdige Werte!
+_construct_metadata = getattr(ConfigMetadata, "model_construct", None) or ConfigMetadata.construct
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict for shared config snapshots.
+
+    A dict subclass (not MappingProxyType) so that FastAPI/Pydantic and
+    orjson serialize it like a plain dict. Copies (copy.deepcopy, pickle)
+    yield ordinary mutable dicts.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config snapshot is read-only - use get_config_mutable()")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _freeze(obj: Any) -> Any:
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(obj, dict):
+        return FrozenDict((key, _freeze(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return tuple(_freeze(item) for item in obj)
+    return obj
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Parse JSON bytes (orjson if available)."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson if available)."""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
+
 
 class ConfigurationManager:
     """
@@ -27,13 +91,29 @@ class ConfigurationManager:
     5. Environment variables (immutable)
     """
 
+    # Audit-Log: max. Datensätze pro Schreibvorgang / Sammelzeit in Sekunden
+    AUDIT_BATCH_SIZE = 100
+    AUDIT_FLUSH_INTERVAL = 0.1
+
+    # stat() der Config-Datei max. alle 100 ms (Metadaten-Polling, Netz-Dateisysteme)
+    STAT_CACHE_NS = 100_000_000
+
     def __init__(self, config_file: Path = Path("/root/ocr-classifier/config.json")):
         self.config_file = config_file
-        self._lock = asyncio.Lock()
+        self._lock = AsyncRWLock()  # Parallele Leser, exklusive Schreiber
         self._runtime_overrides = {}  # Learning system writes here
+        self._file_cache: Optional[Tuple[int, Dict[str, Any]]] = None  # (st_mtime_ns, parsed config)
+        self._stat_result: Optional[os.stat_result] = None
+        self._stat_time_ns: Optional[int] = None  # monotonic_ns des letzten stat()
+        self._defaults_cache: Optional[Tuple[int, bytes]] = None  # (REVISION, pickled snapshot)
+        self._overrides_version = 0  # Erhöht bei jeder Änderung von _runtime_overrides
+        self._frozen_cache: Optional[Tuple[tuple, FrozenDict]] = None  # ((REVISION, file mtime_ns, overrides version), snapshot)
         self._audit_log_file = config_file.parent / "config_audit.jsonl"
+        self._audit_queue: Optional[asyncio.Queue] = None  # Serialisierte Audit-Zeilen
+        self._audit_task: Optional[asyncio.Task] = None
+        self._audit_fd: Optional[int] = None  # Dauerhaft geöffnet (O_APPEND)
 
-    async def get_config(self, section: Optional[str] = None) -> Dict[str, Any]:
+    async def get_config(self, section: Optional[str] = None) -> Mapping[str, Any]:
         """
         Get configuration with all layers merged.
 
@@ -41,26 +121,33 @@ class ConfigurationManager:
             section: Optional section name (e.g., "WEIGHTS", "THRESHOLDS")
 
         Returns:
-            Complete config dict or specific section
+            Complete config or specific section as read-only snapshot
+            (FrozenDict, lists as tuples) - shared between callers,
+            use get_config_mutable() to modify
         """
-        async with self._lock:
-            # Start with hardcoded defaults
-            config = self._get_defaults()
+        async with self._lock.reader_lock:
+            config = await self._frozen_config()
 
-            # Layer 2: Merge file config (if exists)
-            file_config = await self._load_from_file()
-            if file_config:
-                config = self._deep_merge(config, file_config)
+        if section:
+            return config.get(section, FrozenDict())
+        return config
 
-            # Layer 3 & 4: Merge runtime overrides (from CI4 + learning)
-            if self._runtime_overrides:
-                config = self._deep_merge(config, self._runtime_overrides)
+    async def get_config_mutable(self, section: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a mutable copy of the merged configuration.
 
-            # Layer 5: Environment variables already applied in config.py
+        Args:
+            section: Optional section name (e.g., "WEIGHTS", "THRESHOLDS")
 
-            if section:
-                return config.get(section, {})
-            return config
+        Returns:
+            Complete config dict or specific section (owned by the caller)
+        """
+        async with self._lock.reader_lock:
+            config = await self._merged_config()
+
+        if section:
+            return config.get(section, {})
+        return config
 
     async def update_config(self, updates: Dict[str, Any], persist: bool = True) -> Dict[str, Any]:
         """
@@ -71,21 +158,26 @@ class ConfigurationManager:
             persist: If True, save to file. If False, runtime-only (for learning system)
 
         Returns:
-            Updated configuration
+            Effective configuration after the update, with the same layer
+            precedence as get_config() (a fresh dict owned by the caller)
 
         Raises:
             ValidationError: If updates are invalid
         """
-        async with self._lock:
-            # Get current config
-            current = await self.get_config()
+        async with self._lock.writer_lock:
+            # Get current config (unlocked helper - the lock is not reentrant)
+            current = await self._merged_config()
 
             # Merge updates
             updated = self._deep_merge(current, updates)
 
+            # No-op update (e.g. rehydration with identical values): nothing to validate, write or log
+            if updated == current:
+                return updated
+
             # Validate with Pydantic
             try:
-                FullConfigSchema(**updated)
+                validate_full_config(updated)
             except Exception as e:
                 logger.error(f"Config validation failed: {e}")
                 raise ValueError(f"Invalid configuration: {e}")
@@ -99,12 +191,18 @@ class ConfigurationManager:
 
                 # Apply to singleton (for backwards compatibility)
                 self._apply_to_singleton(updated)
+
+                # Runtime overrides still take precedence over the file layer:
+                # re-apply them so the result matches get_config()
+                if self._runtime_overrides:
+                    self._merge_into(updated, self._runtime_overrides)
             else:
                 # Runtime-only override (for learning system)
                 self._runtime_overrides = self._deep_merge(self._runtime_overrides, updates)
+                self._overrides_version += 1
                 await self._log_change("update_runtime", current, updated)
 
-            return await self.get_config()
+            return updated
 
     async def reload(self, clear_runtime: bool = True) -> Dict[str, Any]:
         """
@@ -116,9 +214,10 @@ class ConfigurationManager:
         Returns:
             Reloaded configuration
         """
-        async with self._lock:
+        async with self._lock.writer_lock:
             if clear_runtime:
                 self._runtime_overrides = {}
+                self._overrides_version += 1
                 logger.warning("Runtime overrides cleared - learning progress lost")
 
             file_config = await self._load_from_file()
@@ -126,7 +225,7 @@ class ConfigurationManager:
                 self._apply_to_singleton(file_config)
 
             await self._log_change("reload", {}, file_config or {})
-            return await self.get_config()
+            return await self._merged_config()
 
     async def reset_to_defaults(self) -> Dict[str, Any]:
         """
@@ -136,11 +235,12 @@ class ConfigurationManager:
         Returns:
             Default configuration
         """
-        async with self._lock:
+        async with self._lock.writer_lock:
             defaults = self._get_defaults()
 
             # Clear runtime overrides
             self._runtime_overrides = {}
+            self._overrides_version += 1
 
             # Save defaults to file
             await self._atomic_write(defaults)
@@ -151,18 +251,24 @@ class ConfigurationManager:
             await self._log_change("reset_to_defaults", {}, defaults)
             return defaults
 
-    async def validate_safety(self, new_config: Dict[str, Any]) -> List[str]:
+    async def validate_safety(
+        self,
+        new_config: Dict[str, Any],
+        current: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
         """
         Check if configuration changes are safe.
 
         Args:
             new_config: Proposed new configuration
+            current: Current merged configuration, if the caller already has it
 
         Returns:
             List of warning messages
         """
         warnings = []
-        current = await self.get_config()
+        if current is None:
+            current = await self.get_config()
 
         # Check weights changes
         if "WEIGHTS" in new_config and "WEIGHTS" in current:
@@ -191,64 +297,162 @@ class ConfigurationManager:
 
     async def clear_runtime_overrides(self):
         """Clear runtime overrides (called when base config changes)."""
-        async with self._lock:
+        async with self._lock.writer_lock:
             self._runtime_overrides = {}
+            self._overrides_version += 1
             logger.info("Runtime overrides cleared")
 
+    async def flush_audit_log(self, timeout: float = 5.0):
+        """
+        Wait until all queued audit records are written (e.g. on shutdown).
+
+        Args:
+            timeout: Maximum wait time in seconds
+        """
+        if self._audit_queue is None or self._audit_task is None or self._audit_task.done():
+            return
+        try:
+            await asyncio.wait_for(self._audit_queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Audit log flush timed out - {self._audit_queue.qsize()} records lost")
+
     def get_metadata(self) -> ConfigMetadata:
         """Get configuration metadata."""
-        return ConfigMetadata(
+        st = self._stat_cached()
+        # Alle Felder stammen aus diesem Prozess (kein User-Input) -> keine Validierung
+        return _construct_metadata(
             version=ClassificationConfig.VERSION,
-            last_modified=self.config_file.stat().st_mtime if self.config_file.exists() else None,
-            ci4_enabled=ClassificationConfig.CI4_CONFIG.get("enabled", False),
+            last_modified=st.st_mtime if st is not None else None,
+            ci4_enabled=ClassificationConfig.CI4_ENABLED,
             has_runtime_overrides=bool(self._runtime_overrides),
-            config_file_exists=self.config_file.exists()
+            config_file_exists=st is not None
         )
 
     # Private methods
 
+    def _stat_cached(self) -> Optional[os.stat_result]:
+        """
+        stat() of the config file, reused for STAT_CACHE_NS.
+
+        Returns:
+            stat result or None if the file doesn't exist
+        """
+        now = time.monotonic_ns()
+        if self._stat_time_ns is None or now - self._stat_time_ns >= self.STAT_CACHE_NS:
+            try:
+                self._stat_result = os.stat(self.config_file)
+            except FileNotFoundError:
+                self._stat_result = None
+            self._stat_time_ns = now
+        return self._stat_result
+
+    async def _frozen_config(self) -> Mapping[str, Any]:
+        """
+        Read-only merged config, rebuilt only when a layer changed.
+
+        Returns:
+            Cached frozen snapshot
+        """
+        await self._load_from_file()
+        file_mtime_ns = self._file_cache[0] if self._file_cache is not None else None
+        key = (ClassificationConfig.REVISION, file_mtime_ns, self._overrides_version)
+
+        if self._frozen_cache is None or self._frozen_cache[0] != key:
+            self._frozen_cache = (key, _freeze(await self._merged_config()))
+
+        return self._frozen_cache[1]
+
+    async def _merged_config(self) -> Dict[str, Any]:
+        """
+        Merge all configuration layers (caller must hold self._lock).
+
+        Returns:
+            New merged config dict owned by the caller
+        """
+        # Start with hardcoded defaults
+        config = self._get_defaults()
+
+        # Layer 2: Merge file config (if exists)
+        file_config = await self._load_from_file()
+        if file_config:
+            self._merge_into(config, file_config)
+
+        # Layer 3 & 4: Merge runtime overrides (from CI4 + learning)
+        if self._runtime_overrides:
+            self._merge_into(config, self._runtime_overrides)
+
+        # Layer 5: Environment variables already applied in config.py
+        return config
+
     def _get_defaults(self) -> Dict[str, Any]:
-        """Get hardcoded default configuration from config.py."""
+        """
+        Get hardcoded default configuration from config.py.
+
+        The snapshot is pickled once per ClassificationConfig.REVISION;
+        unpickling yields a fresh (mutable) copy considerably faster than
+        deepcopy.
+        """
+        revision = ClassificationConfig.REVISION
+        if self._defaults_cache is None or self._defaults_cache[0] != revision:
+            blob = pickle.dumps(self._build_defaults(), protocol=pickle.HIGHEST_PROTOCOL)
+            self._defaults_cache = (revision, blob)
+
+        return pickle.loads(self._defaults_cache[1])
+
+    def _build_defaults(self) -> Dict[str, Any]:
+        """Assemble the defaults dict (references the class attributes, no copies)."""
         return {
             "version": ClassificationConfig.VERSION,
-            "THRESHOLDS": deepcopy(ClassificationConfig.THRESHOLDS),
-            "WEIGHTS": deepcopy(ClassificationConfig.WEIGHTS),
-            "CORNER_DETECTION": deepcopy(ClassificationConfig.CORNER_DETECTION),
-            "COLOR_ANALYSIS": deepcopy(ClassificationConfig.COLOR_ANALYSIS),
-            "LINE_ANALYSIS": deepcopy(ClassificationConfig.LINE_ANALYSIS),
-            "OCR_CONFIG": deepcopy(ClassificationConfig.OCR_CONFIG),
-            "CI4_CONFIG": deepcopy(ClassificationConfig.CI4_CONFIG),
-            "FEATURE_CONFIG": deepcopy(ClassificationConfig.FEATURE_CONFIG),
-            "LEARNING_CONFIG": deepcopy(ClassificationConfig.LEARNING_CONFIG),
-            "PERFORMANCE": deepcopy(ClassificationConfig.PERFORMANCE)
+            "THRESHOLDS": ClassificationConfig.THRESHOLDS,
+            "WEIGHTS": ClassificationConfig.WEIGHTS,
+            "CORNER_DETECTION": ClassificationConfig.CORNER_DETECTION,
+            "COLOR_ANALYSIS": ClassificationConfig.COLOR_ANALYSIS,
+            "LINE_ANALYSIS": ClassificationConfig.LINE_ANALYSIS,
+            "OCR_CONFIG": ClassificationConfig.OCR_CONFIG,
+            "CI4_CONFIG": ClassificationConfig.CI4_CONFIG,
+            "FEATURE_CONFIG": ClassificationConfig.FEATURE_CONFIG,
+            "LEARNING_CONFIG": ClassificationConfig.LEARNING_CONFIG,
+            "PERFORMANCE": ClassificationConfig.PERFORMANCE
         }
 
     async def _load_from_file(self) -> Optional[Dict[str, Any]]:
         """
         Load configuration from file with corruption recovery.
 
+        The parsed result is cached by file mtime and shared between calls -
+        callers must not mutate it.
+
         Returns:
             Config dict or None if file doesn't exist
         """
-        if not self.config_file.exists():
+        st = self._stat_cached()
+        if st is None:
+            self._file_cache = None
             return None
+        mtime_ns = st.st_mtime_ns
+
+        # Unveränderte Datei: geparstes + validiertes Ergebnis wiederverwenden
+        if self._file_cache is not None and self._file_cache[0] == mtime_ns:
+            return self._file_cache[1]
 
         try:
-            with open(self.config_file, 'r') as f:
-                data = json.load(f)
+            with open(self.config_file, 'rb') as f:
+                data = _json_loads(f.read())
 
             # Validate
-            FullConfigSchema(**data)
+            validate_full_config(data)
             logger.info(f"Loaded configuration from {self.config_file}")
-            return data
 
         except json.JSONDecodeError as e:
             logger.error(f"Config file corrupted (JSON error): {e}")
-            return await self._recover_from_corruption()
+            data = await self._recover_from_corruption()
 
         except Exception as e:
             logger.error(f"Config file invalid: {e}")
-            return await self._recover_from_corruption()
+            data = await self._recover_from_corruption()
+
+        self._file_cache = (mtime_ns, data)
+        return data
 
     async def _recover_from_corruption(self) -> Optional[Dict[str, Any]]:
         """
@@ -262,9 +466,9 @@ class ConfigurationManager:
         if backup.exists():
             try:
                 logger.info("Attempting recovery from backup file")
-                with open(backup, 'r') as f:
-                    data = json.load(f)
-                FullConfigSchema(**data)
+                with open(backup, 'rb') as f:
+                    data = _json_loads(f.read())
+                validate_full_config(data)
                 logger.info("Successfully recovered from backup")
                 return data
             except Exception as e:
@@ -284,18 +488,26 @@ class ConfigurationManager:
         backup_file = self.config_file.with_suffix('.json.backup')
 
         try:
-            # Write to temp file first
-            with open(temp_file, 'w') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            # Write to temp file first (durable before the swap)
+            with open(temp_file, 'wb') as f:
+                f.write(_json_dumps(config, indent=True))
+                f.flush()
+                os.fsync(f.fileno())
 
-            # Backup existing config
+            # Backup existing config (the original stays in place until the swap)
             if self.config_file.exists():
-                self.config_file.rename(backup_file)
+                shutil.copy2(self.config_file, backup_file)
 
-            # Atomic rename
-            temp_file.rename(self.config_file)
+            # Atomic replace - readers see either the old or the new file
+            os.replace(temp_file, self.config_file)
+            self._fsync_dir(self.config_file.parent)
             logger.info(f"Configuration saved to {self.config_file}")
 
+            # Prime stat + file cache (next read needs no parse)
+            self._stat_time_ns = None
+            st = self._stat_cached()
+            self._file_cache = (st.st_mtime_ns, deepcopy(config))
+
         except Exception as e:
             logger.error(f"Failed to save configuration: {e}")
             # Cleanup temp file if it exists
@@ -303,6 +515,20 @@ class ConfigurationManager:
                 temp_file.unlink()
             raise
 
+    @staticmethod
+    def _fsync_dir(directory: Path):
+        """Flush a directory entry (rename) to disk; no-op where unsupported."""
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
     def _deep_merge(self, base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
         """
         Deep merge two dictionaries.
@@ -314,17 +540,26 @@ class ConfigurationManager:
         Returns:
             Merged dictionary
         """
+        # Einmal kopieren, danach in-place zusammenführen
         result = deepcopy(base)
+        self._merge_into(result, updates)
+        return result
+
+    def _merge_into(self, target: Dict[str, Any], updates: Dict[str, Any]):
+        """
+        Merge updates into target in place.
 
+        Args:
+            target: Dictionary to modify (already owned by the caller)
+            updates: Updates to merge (not modified, values are copied)
+        """
         for key, value in updates.items():
-            if key in result and isinstance(result[key], dict) and isinstance(value, dict):
+            if key in target and isinstance(target[key], dict) and isinstance(value, dict):
                 # Recursive merge for nested dicts
-                result[key] = self._deep_merge(result[key], value)
+                self._merge_into(target[key], value)
             else:
                 # Replace value (including arrays)
-                result[key] = deepcopy(value)
-
-        return result
+                target[key] = deepcopy(value)
 
     def _apply_to_singleton(self, config: Dict[str, Any]):
         """Apply configuration to ClassificationConfig singleton."""
@@ -338,31 +573,32 @@ class ConfigurationManager:
         for key in ["CORNER_DETECTION", "COLOR_ANALYSIS", "LINE_ANALYSIS",
                     "OCR_CONFIG", "FEATURE_CONFIG", "LEARNING_CONFIG", "PERFORMANCE"]:
             if key in config:
-                setattr(ClassificationConfig, key, config[key])
-
-    def _calculate_change_percentage(self, old_weights: Dict, new_weights: Dict) -> float:
-        """Calculate percentage change in weights."""
-        total_change = 0
-        count = 0
-
-        for category in old_weights:
-            if category not in new_weights:
-                continue
-
-            for key in old_weights[category]:
-                if key not in new_weights[category]:
-                    continue
-
-                old_val = old_weights[category][key]
-                new_val = new_weights[category][key]
+                # Eigene Kopie - config kann der gecachte Datei-Inhalt sein
+                setattr(ClassificationConfig, key, deepcopy(config[key]))
 
-                if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)):
-                    if old_val != 0:
-                        change = abs(new_val - old_val) / abs(old_val) * 100
-                        total_change += change
-                        count += 1
+        ClassificationConfig.mark_changed()
 
-        return total_change / count if count > 0 else 0
+    def _calculate_change_percentage(self, old_weights: Dict, new_weights: Dict) -> float:
+        """Calculate mean percentage change over all weights present in both configs."""
+        pairs = []
+        for category, key in ClassificationConfig.WEIGHTS_INDEX:
+            old_val = old_weights.get(category, {}).get(key)
+            new_val = new_weights.get(category, {}).get(key)
+            if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)):
+                pairs.append((old_val, new_val))
+
+        if not pairs:
+            return 0
+
+        # Vektorisiert: |new - old| / |old| über alle Gewichte (old == 0 ausgenommen)
+        values = np.array(pairs, dtype=np.float64)
+        old_vec, new_vec = values[:, 0], values[:, 1]
+        nonzero = old_vec != 0
+        if not nonzero.any():
+            return 0
+
+        change = np.abs(new_vec[nonzero] - old_vec[nonzero]) / np.abs(old_vec[nonzero]) * 100
+        return float(change.mean())
 
     async def _log_change(self, action: str, old_config: Dict, new_config: Dict):
         """
@@ -378,26 +614,99 @@ class ConfigurationManager:
             "action": action,
             "changes": self._calculate_diff(old_config, new_config)
         }
+        if not record["changes"]:
+            return
 
+        # Sofort serialisieren (Snapshot), geschrieben wird im Hintergrund
         try:
-            with open(self._audit_log_file, 'a') as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            line = _json_dumps(record) + b"\n"
         except Exception as e:
-            logger.error(f"Failed to write audit log: {e}")
+            logger.error(f"Failed to serialize audit record: {e}")
+            return
+
+        self._ensure_audit_writer()
+        self._audit_queue.put_nowait(line)
+
+    def _ensure_audit_writer(self):
+        """Start the background audit writer in the running event loop."""
+        if self._audit_task is None or self._audit_task.done():
+            self._audit_queue = asyncio.Queue()
+            self._audit_task = asyncio.get_running_loop().create_task(self._audit_writer())
+
+    async def _audit_writer(self):
+        """Drain the audit queue and append records in batches."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            lines = [await self._audit_queue.get()]
+            deadline = loop.time() + self.AUDIT_FLUSH_INTERVAL
+
+            while len(lines) < self.AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    lines.append(await asyncio.wait_for(self._audit_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await asyncio.to_thread(self._append_audit_lines, lines)
+            except Exception as e:
+                logger.error(f"Failed to write audit log: {e}")
+            finally:
+                for _ in lines:
+                    self._audit_queue.task_done()
+
+    def _append_audit_lines(self, lines: List[bytes]):
+        """Append serialized records to the audit file (runs in a thread)."""
+        if self._audit_fd is None:
+            # Einmal öffnen; O_APPEND hängt jeden write() atomar ans Dateiende
+            self._audit_fd = os.open(
+                self._audit_log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+            atexit.register(os.close, self._audit_fd)
+
+        data = memoryview(b"".join(lines))
+        while data:
+            written = os.write(self._audit_fd, data)
+            data = data[written:]
 
     def _calculate_diff(self, old: Dict, new: Dict) -> Dict[str, Any]:
-        """Calculate differences between two configs."""
-        diff = {}
-
-        all_keys = set(old.keys()) | set(new.keys())
-
-        for key in all_keys:
-            if key not in old:
-                diff[key] = {"added": new[key]}
-            elif key not in new:
-                diff[key] = {"removed": old[key]}
-            elif old[key] != new[key]:
-                diff[key] = {"old": old[key], "new": new[key]}
+        """
+        Calculate differences between two configs.
+
+        Nested sections that differ are diffed further ({"nested": {...}}),
+        so a changed leaf doesn't dump the whole section. Identical objects
+        (e.g. shared snapshot sections) are skipped without comparison.
+        """
+        diff: Dict[str, Any] = {}
+        if old is new:
+            return diff
+
+        # Iterativ statt rekursiv: (alt, neu, Ziel-Dict)
+        stack = [(old, new, diff)]
+        while stack:
+            old_level, new_level, out = stack.pop()
+
+            for key in old_level.keys() | new_level.keys():
+                if key not in old_level:
+                    out[key] = {"added": new_level[key]}
+                    continue
+                if key not in new_level:
+                    out[key] = {"removed": old_level[key]}
+                    continue
+
+                old_val, new_val = old_level[key], new_level[key]
+                if old_val is new_val:
+                    continue
+                if isinstance(old_val, dict) and isinstance(new_val, dict):
+                    if old_val != new_val:
+                        nested = {}
+                        out[key] = {"nested": nested}
+                        stack.append((old_val, new_val, nested))
+                elif old_val != new_val:
+                    out[key] = {"old": old_val, "new": new_val}
 
         return diff
 
@@ -1,11 +1,17 @@
 # config_schemas.py
 # Pydantic validation schemas for configuration API
 
-from pydantic import BaseModel, Field, validator
-from typing import Dict, List, Any, Optional
+from math import fsum
+from pydantic import BaseModel, ConfigDict, Field, model_validator, validator
+from typing import Dict, List, Any, Literal, Optional
 
 
-class WeightsARConfig(BaseModel):
+class _FrozenModel(BaseModel):
+    """Base for config schemas: immutable value objects, unknown fields rejected."""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+
+class WeightsARConfig(_FrozenModel):
     """Arbeitsbericht weights configuration."""
     text_length_divisor: float = Field(gt=0, le=10000, description="Text length divisor for scoring")
     text_length_factor: float = Field(gt=0, le=100, description="Text length weight factor")
@@ -14,7 +20,7 @@ class WeightsARConfig(BaseModel):
     min_text_length: int = Field(ge=0, le=100000, description="Minimum expected text length")
 
 
-class WeightsTPConfig(BaseModel):
+class WeightsTPConfig(_FrozenModel):
     """Typeplate weights configuration."""
     clip_factor: float = Field(gt=0, le=100, description="CLIP model weight factor")
     keyword_multiplier: float = Field(gt=0, le=100, description="Keyword match multiplier")
@@ -24,20 +30,20 @@ class WeightsTPConfig(BaseModel):
     rect_score_factor: float = Field(gt=0, le=100, description="Rectangle/corner detection weight")
 
 
-class WeightsDOCConfig(BaseModel):
+class WeightsDOCConfig(_FrozenModel):
     """Document weights configuration."""
     text_length_divisor: float = Field(gt=0, le=10000, description="Text length divisor")
     clip_factor: float = Field(gt=0, le=100, description="CLIP model weight factor")
 
 
-class WeightsPHOTOConfig(BaseModel):
+class WeightsPHOTOConfig(_FrozenModel):
     """Photo weights configuration."""
     low_text_threshold: int = Field(ge=0, le=1000, description="Threshold for low text detection")
     low_text_bonus: float = Field(ge=0, le=100, description="Bonus for low text content")
     clip_factor: float = Field(gt=0, le=100, description="CLIP model weight factor")
 
 
-class WeightsConfig(BaseModel):
+class WeightsConfig(_FrozenModel):
     """Complete weights configuration for all classes."""
     AR: WeightsARConfig
     TP: WeightsTPConfig
@@ -45,21 +51,15 @@ class WeightsConfig(BaseModel):
     PHOTO: WeightsPHOTOConfig
 
 
-class ThresholdsConfig(BaseModel):
+class ThresholdsConfig(_FrozenModel):
     """Classification thresholds configuration."""
     arbeitsbericht: float = Field(ge=0, le=1000, description="Arbeitsbericht classification threshold")
     typeplate: float = Field(ge=0, le=1000, description="Typeplate classification threshold")
     document: float = Field(ge=0, le=1000, description="Document classification threshold")
     photo: float = Field(ge=0, le=1000, description="Photo classification threshold (fallback)")
 
-    @validator('*')
-    def validate_non_negative(cls, v):
-        if v < 0:
-            raise ValueError('Thresholds must be non-negative')
-        return v
-
 
-class CornerDetectionConfig(BaseModel):
+class CornerDetectionConfig(_FrozenModel):
     """Corner detection parameters."""
     method: str = Field(default="contour_based", description="Primary detection method")
     fallback_method: str = Field(default="harris", description="Fallback detection method")
@@ -80,7 +80,7 @@ class CornerDetectionConfig(BaseModel):
         return v
 
 
-class ColorAnalysisConfig(BaseModel):
+class ColorAnalysisConfig(_FrozenModel):
     """Color uniformity analysis parameters."""
     lab_std_threshold_high: float = Field(ge=0, le=100, description="LAB std threshold for high uniformity")
     lab_std_threshold_medium: float = Field(ge=0, le=100, description="LAB std threshold for medium uniformity")
@@ -88,9 +88,11 @@ class ColorAnalysisConfig(BaseModel):
     grid_divisions: int = Field(ge=2, le=20, description="Grid divisions for regional analysis")
     kmeans_clusters: int = Field(ge=2, le=10, description="K-means cluster count")
     kmeans_iterations: int = Field(ge=1, le=100, description="K-means max iterations")
+    palette_bits: int = Field(default=5, ge=1, le=8, description="Bits per channel for dominant color quantization")
+    max_side: int = Field(default=512, ge=0, le=8192, description="Downscale longest side before analysis (0 = off)")
 
 
-class LineAnalysisConfig(BaseModel):
+class LineAnalysisConfig(_FrozenModel):
     """Line detection parameters."""
     hough_threshold: int = Field(ge=1, le=500, description="Hough transform threshold")
     hough_min_line_length: int = Field(ge=1, le=1000, description="Minimum line length")
@@ -101,14 +103,14 @@ class LineAnalysisConfig(BaseModel):
     canny_high: int = Field(ge=0, le=500, description="Canny high threshold")
 
 
-class OCRConfig(BaseModel):
+class OCRConfig(_FrozenModel):
     """OCR and text analysis configuration."""
     tesseract_lang: str = Field(default="deu+eng", description="Tesseract language config")
     arbeitsbericht_keywords: List[str] = Field(min_items=1, description="Arbeitsbericht detection keywords")
     typeplate_keywords: List[str] = Field(min_items=1, description="Typeplate detection keywords")
 
 
-class CI4Config(BaseModel):
+class CI4Config(_FrozenModel):
     """CI4 integration configuration."""
     base_url: str = Field(description="CI4 API base URL")
     api_key: str = Field(default="", description="CI4 API key (empty if disabled)")
@@ -116,25 +118,31 @@ class CI4Config(BaseModel):
     retry_attempts: int = Field(ge=0, le=10, description="Number of retry attempts")
     retry_delay: int = Field(ge=0, le=60, description="Delay between retries in seconds")
     enabled: bool = Field(description="Enable/disable CI4 integration")
+    queue_size: int = Field(default=1000, ge=1, le=100000, description="Max pending background writes (restart required)")
+    queue_workers: int = Field(default=2, ge=1, le=32, description="Concurrent background writers (restart required)")
 
 
-class FeatureConfig(BaseModel):
+class FeatureConfig(_FrozenModel):
     """Feature extraction configuration."""
     perceptual_hash_size: int = Field(ge=4, le=64, description="Perceptual hash size (n x n)")
+    phash_backend: Literal["imagehash", "libphash"] = Field(default="imagehash", description="Perceptual hash implementation (hashes are not comparable across backends)")
     color_histogram_bins: int = Field(ge=8, le=256, description="Color histogram bins")
     edge_histogram_bins: int = Field(ge=8, le=256, description="Edge histogram bins")
     clip_embedding_dim: int = Field(ge=128, le=2048, description="CLIP embedding dimensions")
     similarity_weights: Dict[str, float] = Field(description="Similarity metric weights")
 
-    @validator('similarity_weights')
-    def validate_weights_sum(cls, v):
-        total = sum(v.values())
+    @model_validator(mode='after')
+    def validate_weights_sum(self):
+        weights = self.similarity_weights
+        if not weights:
+            return self
+        total = fsum(weights.values())  # Exact summation, no accumulated rounding error
         if not (0.99 <= total <= 1.01):  # Allow small floating point error
             raise ValueError(f'Similarity weights must sum to 1.0, got {total}')
-        return v
+        return self
 
 
-class LearningConfig(BaseModel):
+class LearningConfig(_FrozenModel):
     """Learning system configuration."""
     learning_rate: float = Field(ge=0.001, le=1.0, description="Learning rate for weight adjustments")
     reinforce_factor: float = Field(ge=0, le=1.0, description="Reinforcement for correct predictions")
@@ -143,18 +151,25 @@ class LearningConfig(BaseModel):
     threshold_recalc_interval: int = Field(ge=1, le=1000, description="Threshold recalculation interval")
     min_feedback_for_update: int = Field(ge=1, le=100, description="Minimum feedback before applying updates")
     weight_update_interval: int = Field(ge=1, le=1000, description="CI4 sync interval for weights")
+    weight_batch_size: int = Field(default=16, ge=1, le=1000, description="Feedbacks accumulated per weight update")
+    recent_feedback_size: int = Field(default=10, ge=1, le=10000, description="Full feedback entries kept for statistics")
+    feedback_log_path: str = Field(default="", description="Append-only feedback log file, empty disables (restart required)")
 
 
-class PerformanceConfig(BaseModel):
+class PerformanceConfig(_FrozenModel):
     """Performance and caching configuration."""
     enable_caching: bool = Field(description="Enable feature caching")
     cache_ttl: int = Field(ge=60, le=86400, description="Cache TTL in seconds")
     max_cache_size: int = Field(ge=10, le=100000, description="Maximum cache entries")
     lazy_feature_extraction: bool = Field(description="Extract features only when needed")
     async_feature_extraction: bool = Field(description="Extract features asynchronously")
+    worker_threads: int = Field(default=4, ge=1, le=64, description="Thread pool size for parallel analysis (restart required)")
+    analysis_max_side: int = Field(default=1024, ge=0, le=16384, description="Longest image side for OpenCV analyses, 0 disables downscaling")
+    clip_batch_size: int = Field(default=16, ge=1, le=256, description="Max images per CLIP forward pass (restart required)")
+    clip_batch_wait_ms: float = Field(default=10, ge=0, le=1000, description="Max wait for CLIP batch to fill in ms (restart required)")
 
 
-class FullConfigSchema(BaseModel):
+class FullConfigSchema(_FrozenModel):
     """Complete configuration schema for validation."""
     version: str = Field(default="1.0.0", description="Configuration version")
     THRESHOLDS: Optional[ThresholdsConfig] = None
@@ -168,14 +183,34 @@ class FullConfigSchema(BaseModel):
     LEARNING_CONFIG: Optional[LearningConfig] = None
     PERFORMANCE: Optional[PerformanceConfig] = None
 
-    class Config:
-        extra = "forbid"  # Reject unknown fields
-
 
-class ConfigMetadata(BaseModel):
+class ConfigMetadata(_FrozenModel):
     """Metadata about configuration state."""
     version: str
     last_modified: Optional[float] = None
     ci4_enabled: bool
     has_runtime_overrides: bool = False
     config_file_exists: bool = False
+
+
+# Core-Validator einmalig beim Import holen und für alle Reloads wiederverwenden
+# (Pydantic v1 hat keinen __pydantic_validator__ -> parse_obj)
+_FULL_VALIDATOR = getattr(FullConfigSchema, "__pydantic_validator__", None)
+
+
+def validate_full_config(data: Dict[str, Any]) -> FullConfigSchema:
+    """
+    Validate a complete configuration dict against FullConfigSchema.
+
+    Args:
+        data: Configuration dict (all sections optional)
+
+    Returns:
+        Validated FullConfigSchema instance
+
+    Raises:
+        ValidationError: If any section violates the schema
+    """
+    if _FULL_VALIDATOR is not None:
+        return _FULL_VALIDATOR.validate_python(data)
+    return FullConfigSchema.parse_obj(data)
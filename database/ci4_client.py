@@ -1,11 +1,30 @@
 # database/ci4_client.py
 # REST-API Client für CI4-Kommunikation
 
+import asyncio
+import json
 import requests
 import logging
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict, List, Optional
+from cache import TTLCache
 from config import config
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,6 +39,12 @@ class CI4Client:
     - Model-Gewichte Sync
     """
 
+    # Max. gleichzeitig offene Verbindungen zum CI4-Host
+    POOL_SIZE = 50
+
+    # Gewichte/Basis-Konfiguration ändern sich selten - Lesezugriffe cachen (Sekunden)
+    CONFIG_CACHE_TTL = 300
+
     def __init__(self):
         self.cfg = config.CI4_CONFIG
         self.base_url = self.cfg["base_url"].rstrip('/')
@@ -27,11 +52,53 @@ class CI4Client:
         self.enabled = self.cfg["enabled"]
 
         self.session = requests.Session()
+        # Geteilt mit AsyncCI4Client; Keys: "model_weights", "base_config"
+        self.config_cache = TTLCache(maxsize=4, ttl=self.CONFIG_CACHE_TTL)
+
+        # Verbindungen wiederverwenden (Keep-Alive) + Retry bei Verbindungsfehlern/5xx.
+        # POST wird nur bei Verbindungsfehlern wiederholt (Urllib3-Default), nicht nach 5xx.
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_SIZE,
+            pool_maxsize=self.POOL_SIZE,
+            max_retries=Retry(
+                total=self.cfg["retry_attempts"],
+                backoff_factor=self.cfg["retry_delay"],
+                status_forcelist=[502, 503, 504],
+                raise_on_status=False
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
         if self.cfg["api_key"]:
             self.session.headers.update({
                 "Authorization": f"Bearer {self.cfg['api_key']}"
             })
 
+    def _post(self, url: str, payload: Dict, timeout: float) -> requests.Response:
+        """POST mit orjson-Serialisierung (serialisiert auch NumPy-Arrays)."""
+        if not ORJSON_AVAILABLE:
+            return self.session.post(url, json=payload, timeout=timeout)
+
+        return self.session.post(
+            url,
+            data=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+            headers={"Content-Type": "application/json"},
+            timeout=timeout
+        )
+
+    @staticmethod
+    def _decode(response: requests.Response):
+        """Parst den Response-Body mit orjson (Fehlerbehandlung wie response.json())."""
+        if ORJSON_AVAILABLE:
+            try:
+                return orjson.loads(response.content)
+            except ValueError:
+                pass
+        # Liefert bei ungültigem JSON die gewohnte requests-Exception
+        return response.json()
+
     def store_classification(self, data: Dict) -> Optional[Dict]:
         """
         Speichert Klassifizierungsergebnis in CI4.
@@ -47,13 +114,13 @@ class CI4Client:
             return None
 
         try:
-            response = self.session.post(
+            response = self._post(
                 f"{self.base_url}/classifications",
-                json=data,
+                data,
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            return self._decode(response)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to store classification in CI4: {e}")
@@ -80,13 +147,13 @@ class CI4Client:
                 **feedback
             }
 
-            response = self.session.post(
+            response = self._post(
                 f"{self.base_url}/feedback",
-                json=payload,
+                payload,
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            return self._decode(response)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to store feedback in CI4: {e}")
@@ -107,35 +174,45 @@ class CI4Client:
             return []
 
         try:
-            response = self.session.post(
+            response = self._post(
                 f"{self.base_url}/similar-images",
-                json={"features": features, "limit": limit},
+                {"features": features, "limit": limit},
                 timeout=self.timeout * 2  # Längere Timeout für Suche
             )
             response.raise_for_status()
-            return response.json().get("results", [])
+            return self._decode(response).get("results", [])
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to find similar images: {e}")
             return []
 
-    def get_model_weights(self) -> Optional[Dict]:
+    def get_model_weights(self, use_cache: bool = True) -> Optional[Dict]:
         """
         Lädt aktuelle Model-Gewichte von CI4.
 
+        Args:
+            use_cache: Gecachtes Ergebnis verwenden (max. CONFIG_CACHE_TTL alt)
+
         Returns:
             Weights dict oder None
         """
         if not self.enabled:
             return None
 
+        if use_cache:
+            cached = self.config_cache.get("model_weights")
+            if cached is not None:
+                return cached
+
         try:
             response = self.session.get(
                 f"{self.base_url}/model-weights/latest",
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            result = self._decode(response)
+            self.config_cache.set("model_weights", result)
+            return result
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get model weights: {e}")
@@ -162,13 +239,14 @@ class CI4Client:
                 "version": config.VERSION
             }
 
-            response = self.session.post(
+            response = self._post(
                 f"{self.base_url}/model-weights",
-                json=payload,
+                payload,
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            self.config_cache.pop("model_weights")
+            return self._decode(response)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to update model weights: {e}")
@@ -194,7 +272,7 @@ class CI4Client:
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            return self._decode(response)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get classification: {e}")
@@ -221,36 +299,47 @@ class CI4Client:
                 "updated_by": "config_api"
             }
 
-            response = self.session.post(
+            response = self._post(
                 f"{self.base_url}/config/base",
-                json=payload,
+                payload,
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            self.config_cache.pop("base_config")
+            return self._decode(response)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to update base config in CI4: {e}")
             return None
 
-    def get_base_config(self) -> Optional[Dict]:
+    def get_base_config(self, use_cache: bool = True) -> Optional[Dict]:
         """
         Lädt Basis-Konfiguration von CI4.
         Separate from learning weights.
 
+        Args:
+            use_cache: Gecachtes Ergebnis verwenden (max. CONFIG_CACHE_TTL alt)
+
         Returns:
             Base configuration dict oder None
         """
         if not self.enabled:
             return None
 
+        if use_cache:
+            cached = self.config_cache.get("base_config")
+            if cached is not None:
+                return cached
+
         try:
             response = self.session.get(
                 f"{self.base_url}/config/base/latest",
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
+            result = self._decode(response)
+            self.config_cache.set("base_config", result)
+            return result
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get base config from CI4: {e}")
@@ -277,5 +366,210 @@ class CI4Client:
             return False
 
 
-# Singleton-Instanz
+class AsyncCI4Client:
+    """
+    Asynchroner CI4-Client für den Event-Loop (gleiche Methoden wie CI4Client).
+
+    Nutzt eine gemeinsame aiohttp.ClientSession mit Connection-Pool. Ohne
+    aiohttp laufen die Requests über die Session des synchronen Clients in
+    einem Thread (asyncio.to_thread).
+    """
+
+    # Max. gleichzeitige Verbindungen / Keep-Alive in Sekunden
+    POOL_SIZE = 100
+    KEEPALIVE_TIMEOUT = 60
+
+    def __init__(self, sync_client: CI4Client):
+        """
+        Args:
+            sync_client: Synchroner Client (Konfiguration, Fallback-Session)
+        """
+        self._sync = sync_client
+        self.cfg = sync_client.cfg
+        self.base_url = sync_client.base_url
+        self.timeout = sync_client.timeout
+        self.enabled = sync_client.enabled
+        self.config_cache = sync_client.config_cache
+        self._session = None
+
+    def _get_session(self):
+        """Erzeugt die aiohttp-Session im laufenden Event-Loop (einmalig)."""
+        if self._session is None or self._session.closed:
+            headers = {"Content-Type": "application/json"}
+            if self.cfg["api_key"]:
+                headers["Authorization"] = f"Bearer {self.cfg['api_key']}"
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.POOL_SIZE,
+                    keepalive_timeout=self.KEEPALIVE_TIMEOUT
+                ),
+                headers=headers
+            )
+        return self._session
+
+    async def close(self):
+        """Schließt die Session (beim Shutdown)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict] = None,
+                       timeout: Optional[float] = None) -> Any:
+        """
+        Führt einen Request aus und parst die JSON-Antwort.
+
+        Wiederholt bei Verbindungsfehlern (und bei 502/503/504 für GET)
+        bis zu retry_attempts mal mit exponentiellem Backoff.
+
+        Raises:
+            aiohttp.ClientError / requests.RequestException / asyncio.TimeoutError
+        """
+        url = f"{self.base_url}{path}"
+        timeout = timeout or self.timeout
+
+        if not AIOHTTP_AVAILABLE:
+            if method == "GET":
+                response = await asyncio.to_thread(self._sync.session.get, url, timeout=timeout)
+            else:
+                response = await asyncio.to_thread(self._sync._post, url, payload, timeout)
+            response.raise_for_status()
+            return CI4Client._decode(response)
+
+        session = self._get_session()
+        body = None
+        if payload is not None:
+            body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) \
+                if ORJSON_AVAILABLE else json.dumps(payload)
+
+        attempts = self.cfg["retry_attempts"]
+        for attempt in range(attempts + 1):
+            try:
+                async with session.request(
+                    method, url, data=body, timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    if method == "GET" and response.status in (502, 503, 504) and attempt < attempts:
+                        raise _RetryableStatus(response.status)
+                    response.raise_for_status()
+                    raw = await response.read()
+                return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+            except (aiohttp.ClientConnectionError, _RetryableStatus) as e:
+                # POST nur wiederholen, wenn die Verbindung gar nicht zustande kam
+                retryable = method == "GET" or isinstance(e, aiohttp.ClientConnectorError)
+                if not retryable or attempt >= attempts:
+                    raise
+                await asyncio.sleep(self.cfg["retry_delay"] * (2 ** attempt))
+
+    async def _call(self, method: str, path: str, error_msg: str, payload: Optional[Dict] = None,
+                    timeout: Optional[float] = None) -> Any:
+        """_request mit Logging; gibt bei Fehler None zurück."""
+        try:
+            return await self._request(method, path, payload, timeout)
+        except _ASYNC_ERRORS as e:
+            logger.error(f"{error_msg}: {e}")
+            return None
+
+    async def store_classification(self, data: Dict) -> Optional[Dict]:
+        """Speichert Klassifizierungsergebnis in CI4 (siehe CI4Client)."""
+        if not self.enabled:
+            return None
+        return await self._call("POST", "/classifications", "Failed to store classification in CI4", data)
+
+    async def store_feedback(self, classification_id: str, feedback: Dict) -> Optional[Dict]:
+        """Speichert User-Feedback in CI4."""
+        if not self.enabled:
+            return None
+        payload = {"classification_id": classification_id, **feedback}
+        return await self._call("POST", "/feedback", "Failed to store feedback in CI4", payload)
+
+    async def find_similar_images(self, features: Dict, limit: int = 10) -> List[Dict]:
+        """Findet ähnliche Bilder basierend auf Features."""
+        if not self.enabled:
+            return []
+        result = await self._call(
+            "POST", "/similar-images", "Failed to find similar images",
+            {"features": features, "limit": limit},
+            timeout=self.timeout * 2  # Längere Timeout für Suche
+        )
+        return result.get("results", []) if result else []
+
+    async def get_model_weights(self, use_cache: bool = True) -> Optional[Dict]:
+        """Lädt aktuelle Model-Gewichte von CI4 (gecacht, siehe CI4Client)."""
+        if not self.enabled:
+            return None
+        return await self._cached_get(
+            "model_weights", "/model-weights/latest", "Failed to get model weights", use_cache
+        )
+
+    async def update_model_weights(self, weights: Dict, thresholds: Dict) -> Optional[Dict]:
+        """Aktualisiert Model-Gewichte in CI4."""
+        if not self.enabled:
+            return None
+        payload = {"weights": weights, "thresholds": thresholds, "version": config.VERSION}
+        result = await self._call("POST", "/model-weights", "Failed to update model weights", payload)
+        if result is not None:
+            self.config_cache.pop("model_weights")
+        return result
+
+    async def get_classification(self, classification_id: str) -> Optional[Dict]:
+        """Lädt einzelne Klassifizierung von CI4."""
+        if not self.enabled:
+            return None
+        return await self._call("GET", f"/classifications/{classification_id}", "Failed to get classification")
+
+    async def update_base_config(self, config_data: Dict) -> Optional[Dict]:
+        """Speichert Basis-Konfiguration in CI4 (Config API only)."""
+        if not self.enabled:
+            return None
+        payload = {"config": config_data, "version": config.VERSION, "updated_by": "config_api"}
+        result = await self._call("POST", "/config/base", "Failed to update base config in CI4", payload)
+        if result is not None:
+            self.config_cache.pop("base_config")
+        return result
+
+    async def get_base_config(self, use_cache: bool = True) -> Optional[Dict]:
+        """Lädt Basis-Konfiguration von CI4 (gecacht, siehe CI4Client)."""
+        if not self.enabled:
+            return None
+        return await self._cached_get(
+            "base_config", "/config/base/latest", "Failed to get base config from CI4", use_cache
+        )
+
+    async def _cached_get(self, key: str, path: str, error_msg: str, use_cache: bool) -> Optional[Dict]:
+        """GET über den gemeinsamen config_cache (nur erfolgreiche Antworten)."""
+        if use_cache:
+            cached = self.config_cache.get(key)
+            if cached is not None:
+                return cached
+
+        result = await self._call("GET", path, error_msg)
+        if result is not None:
+            self.config_cache.set(key, result)
+        return result
+
+    async def health_check(self) -> bool:
+        """Prüft ob CI4-API erreichbar ist."""
+        if not self.enabled:
+            return False
+        if not AIOHTTP_AVAILABLE:
+            return await asyncio.to_thread(self._sync.health_check)
+        try:
+            async with self._get_session().get(
+                f"{self.base_url}/health", timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+
+class _RetryableStatus(Exception):
+    """Interner Marker: 5xx-Antwort, die wiederholt werden darf."""
+
+
+# Fehler, die AsyncCI4Client loggt statt weiterzureichen (ValueError = ungültiges JSON)
+_ASYNC_ERRORS = (requests.exceptions.RequestException, asyncio.TimeoutError, ValueError) + \
+    ((aiohttp.ClientError,) if AIOHTTP_AVAILABLE else ())
+
+
+# Singleton-Instanzen (synchron für Worker-Threads, asynchron für den Event-Loop)
 ci4_client = CI4Client()
+async_ci4_client = AsyncCI4Client(ci4_client)
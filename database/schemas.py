@@ -2,7 +2,7 @@
 # Pydantic Datenmodelle für API-Kommunikation
 
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Literal, Optional, Any, Union
 from datetime import datetime
 
 
@@ -40,7 +40,7 @@ class FeedbackRequest(BaseModel):
     """User-Feedback Request."""
     classification_id: str
     corrected_class: Optional[str] = None
-    user_confidence: str = Field(..., pattern="^(low|medium|high)$")
+    user_confidence: Literal["low", "medium", "high"]
     correction_reason: Optional[str] = None
     corrected_corners: Optional[List[Dict[str, int]]] = None
 
@@ -78,7 +78,7 @@ class ConfigUpdateResponse(BaseModel):
     warnings: List[str]
     config: Dict[str, Any]
     learning_reset_required: bool = False
-    ci4_synced: bool = False
+    ci4_synced: Union[bool, str] = False  # "pending" = Sync läuft im Hintergrund
 
 
 class ConfigReloadResponse(BaseModel):
@@ -92,7 +92,7 @@ class ConfigResetResponse(BaseModel):
     """Configuration reset response."""
     status: str
     config: Dict[str, Any]
-    ci4_synced: bool = False
+    ci4_synced: Union[bool, str] = False  # "pending" = Sync läuft im Hintergrund
 
 
 class ConfigDiffResponse(BaseModel):
@@ -0,0 +1,76 @@
+# export_clip_onnx.py
+# Exportiert den CLIP-Bild-Tower nach ONNX und quantisiert ihn auf INT8
+#
+# Verwendung:
+#   python export_clip_onnx.py --output clip_int8.onnx
+#   export CLIP_ONNX_PATH=/root/ocr-classifier/clip_int8.onnx
+
+import argparse
+from pathlib import Path
+
+import torch
+from transformers import CLIPModel
+
+from config import config
+
+
+class ImageEncoder(torch.nn.Module):
+    """Bild-Tower + Projektion, liefert die (unnormalisierten) Image-Embeddings."""
+
+    def __init__(self, clip_model: CLIPModel):
+        super().__init__()
+        self.vision_model = clip_model.vision_model
+        self.visual_projection = clip_model.visual_projection
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        pooled = self.vision_model(pixel_values=pixel_values).pooler_output
+        return self.visual_projection(pooled)
+
+
+def export(model_name: str, output: Path, quantize: bool = True):
+    """
+    Exportiert den Bild-Tower mit dynamischer Batch-Achse.
+
+    Args:
+        model_name: HuggingFace-Modellname
+        output: Ziel-Datei (INT8 falls quantize, sonst FP32)
+        quantize: Gewichte dynamisch auf INT8 quantisieren
+    """
+    model = CLIPModel.from_pretrained(model_name).eval()
+    encoder = ImageEncoder(model).eval()
+    size = model.config.vision_config.image_size
+    dummy = torch.randn(1, 3, size, size)
+
+    fp32_path = output.with_name(output.stem + "_fp32.onnx") if quantize else output
+    torch.onnx.export(
+        encoder,
+        (dummy,),
+        str(fp32_path),
+        input_names=["pixel_values"],
+        output_names=["image_embeds"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+        opset_version=17,
+        dynamo=False  # TorchScript-Exporter, quantisiert zuverlässig
+    )
+    print(f"✓ ONNX export: {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        # Add-Knoten bleiben in FP32 (Genauigkeit der Residual-Verbindungen)
+        quantize_dynamic(
+            str(fp32_path),
+            str(output),
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=["MatMul", "Gemm"]
+        )
+        print(f"✓ INT8-Quantisierung: {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CLIP-Bild-Tower nach ONNX exportieren")
+    parser.add_argument("--model", default=config.CLIP_CONFIG["model_name"])
+    parser.add_argument("--output", type=Path, default=Path("clip_int8.onnx"))
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    export(args.model, args.output, quantize=not args.no_quantize)
@@ -1,11 +1,34 @@
 # features/color_analyzer.py
 # Farbuniformitäts-Analyse für Typenschild-Erkennung
 
+import hashlib
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Dict
+from typing import Dict, List, Optional, Tuple, Union
+from cache import TTLCache
 from config import config
+from features.image_arrays import ImageArrays
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    xxhash = None
+    XXHASH_AVAILABLE = False
+
+
+def _pixel_digest(rgb: np.ndarray) -> bytes:
+    """Schneller Digest der Pixeldaten (xxh3, Fallback: BLAKE2b)."""
+    buf = np.ascontiguousarray(rgb)
+    h = xxhash.xxh3_128() if XXHASH_AVAILABLE else hashlib.blake2b(digest_size=16)
+    h.update(repr(buf.shape).encode())
+    h.update(buf.data)
+    return h.digest()
 
 
 class ColorAnalyzer:
@@ -16,12 +39,35 @@ class ColorAnalyzer:
     """
 
     def __init__(self):
+        self._revision = None
+        self._cache = TTLCache(maxsize=config.PERFORMANCE["max_cache_size"])
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._refresh_config()
+
+    def _refresh_config(self):
+        """Übernimmt COLOR_ANALYSIS neu, wenn sich die Konfiguration geändert hat."""
+        if self._revision == config.REVISION:
+            return
         self.config = config.COLOR_ANALYSIS
+        # Schwellwerte als lokale Floats (keine Dict-Lookups pro Bild)
+        self._hi = float(self.config["lab_std_threshold_high"])
+        self._med = float(self.config["lab_std_threshold_medium"])
+        self._dom = float(self.config["dominant_color_threshold"])
+        # Ergebnisse hängen von COLOR_ANALYSIS ab -> bei Änderung verwerfen
+        self._cache.clear()
+        self._revision = config.REVISION
 
-    def analyze_color_uniformity(self, image: Image.Image) -> Dict:
+    def analyze_color_uniformity(self, image: Union[Image.Image, ImageArrays]) -> Dict:
         """
         Führt Farbuniformitäts-Analyse durch.
 
+        Ergebnisse werden pro Pixelinhalt gecacht (gleiches Bild = gleiches
+        Ergebnis), solange sich die Konfiguration nicht ändert.
+
+        Args:
+            image: PIL Image oder ImageArrays (teilt LAB-Puffer)
+
         Returns:
             {
                 "global_std": 12.3,
@@ -31,33 +77,139 @@ class ColorAnalyzer:
                 "is_uniform": True
             }
         """
-        img_array = np.array(image.convert("RGB"))
+        self._refresh_config()
+        arrays = self._prepare(image)
 
-        # Zu LAB konvertieren (perzeptuell uniform)
-        lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
+        key = _pixel_digest(arrays.rgb) if config.ENABLE_CACHING else None
+        if key is not None:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
 
-        # 1. Globale Uniformität (Standardabweichung)
-        l_std = np.std(lab[:, :, 0])  # Lightness
-        a_std = np.std(lab[:, :, 1])  # Green-Red
-        b_std = np.std(lab[:, :, 2])  # Blue-Yellow
+        # LAB-Farbraum (perzeptuell uniform)
+        lab = arrays.lab
 
+        result = self._build_result(arrays.rgb, lab)
+
+        if key is not None:
+            self._cache.set(key, result)
+        return result
+
+    def analyze_batch(self, images: List[Union[Image.Image, ImageArrays]]) -> List[Dict]:
+        """
+        Farbuniformitäts-Analyse für mehrere Bilder.
+
+        Gleich große Bilder werden gestapelt: eine LAB-Konvertierung pro
+        Größengruppe statt pro Bild.
+
+        Args:
+            images: PIL Images oder ImageArrays
+
+        Returns:
+            Ergebnisse wie analyze_color_uniformity, in Eingabe-Reihenfolge
+        """
+        self._refresh_config()
+        results: List[Optional[Dict]] = [None] * len(images)
+        prepared: Dict[int, Tuple[np.ndarray, Optional[bytes]]] = {}
+        groups: Dict[Tuple[int, ...], List[int]] = {}
+
+        for i, image in enumerate(images):
+            rgb = self._prepare(image).rgb
+            key = _pixel_digest(rgb) if config.ENABLE_CACHING else None
+            if key is not None:
+                results[i] = self._cache.get(key)
+                if results[i] is not None:
+                    continue
+            prepared[i] = (rgb, key)
+            groups.setdefault(rgb.shape, []).append(i)
+
+        for shape, indices in groups.items():
+            n, (h, w) = len(indices), shape[:2]
+            stack = np.stack([prepared[i][0] for i in indices])
+
+            # (N, H, W, 3) -> (N*H, W, 3): cvtColor arbeitet pixelweise
+            lab = cv2.cvtColor(stack.reshape(n * h, w, 3), cv2.COLOR_RGB2LAB).reshape(n, h, w, 3)
+
+            for j, i in enumerate(indices):
+                rgb, key = prepared[i]
+                results[i] = self._build_result(rgb, lab[j])
+                if key is not None:
+                    self._cache.set(key, results[i])
+
+        return results
+
+    def analyze_many(
+        self,
+        images: List[Union[Image.Image, ImageArrays]],
+        executor: Optional[Executor] = None
+    ) -> List[Dict]:
+        """
+        Analysiert mehrere Bilder parallel in Threads.
+
+        OpenCV gibt in cvtColor/resize den GIL frei, NumPy in den
+        Reduktionen - Threads reichen, kein Multiprocessing nötig.
+
+        Args:
+            images: PIL Images oder ImageArrays
+            executor: Eigener Pool (None = interner Pool mit cpu_count Threads)
+
+        Returns:
+            Ergebnisse wie analyze_color_uniformity, in Eingabe-Reihenfolge
+        """
+        pool = executor or self._get_pool()
+        return list(pool.map(self.analyze_color_uniformity, images))
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Erzeugt den internen Thread-Pool beim ersten Bedarf."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=os.cpu_count() or 1,
+                        thread_name_prefix="color"
+                    )
+        return self._pool
+
+    def _prepare(self, image: Union[Image.Image, ImageArrays]) -> ImageArrays:
+        """
+        Wandelt um und verkleinert auf max_side.
+
+        Die verkleinerte Ansicht wird am übergebenen ImageArrays gecacht,
+        damit ihr LAB-Puffer pro Request nur einmal berechnet wird.
+        """
+        # Uniformitäts-Statistiken konvergieren bei geringer Auflösung
+        max_side = self.config.get("max_side", 512)
+        return ImageArrays.ensure(image).downscaled_view(max_side)
+
+    def _build_result(self, rgb: np.ndarray, lab: np.ndarray) -> Dict:
+        """
+        Berechnet alle Kennzahlen und setzt das Ergebnis zusammen.
+
+        Args:
+            rgb: RGB-Bild (analysierte Auflösung)
+            lab: Zugehöriges LAB-Bild
+
+        Returns:
+            Ergebnis-Dict (siehe analyze_color_uniformity)
+        """
+        # Globale Uniformität: meanStdDev liest uint8 direkt (SIMD, ein Durchlauf)
+        # L = Lightness, a = Green-Red, b = Blue-Yellow
+        _, stddev = cv2.meanStdDev(lab)
+        l_std, a_std, b_std = stddev[:, 0]
         global_std = (l_std + a_std + b_std) / 3.0
 
-        # 2. Regionale Analyse (Grid)
+        # Regionale Analyse (Grid)
         regional_std = self._analyze_regional_uniformity(lab)
 
-        # 3. Dominante Farbe
-        dominant_ratio = self._calculate_dominant_color_ratio(img_array)
+        # Dominante Farbe
+        dominant_ratio = self._calculate_dominant_color_ratio(rgb)
 
-        # 4. Scoring
+        # Scoring
         uniformity_score = self._calculate_uniformity_score(
             global_std, regional_std, dominant_ratio
         )
 
-        is_uniform = (
-            global_std < self.config["lab_std_threshold_medium"] and
-            dominant_ratio > self.config["dominant_color_threshold"]
-        )
+        is_uniform = global_std < self._med and dominant_ratio > self._dom
 
         return {
             "global_std": round(float(global_std), 2),
@@ -73,67 +225,48 @@ class ColorAnalyzer:
         }
 
     def _analyze_regional_uniformity(self, lab_image: np.ndarray) -> float:
-        """Analysiert Uniformität in Grid-Regionen."""
+        """Analysiert Uniformität in Grid-Regionen (alle Zellen in einer Reduktion)."""
         h, w = lab_image.shape[:2]
         grid_size = self.config["grid_divisions"]
 
         cell_h = h // grid_size
         cell_w = w // grid_size
 
-        cell_stds = []
+        # Grid als Block-View (grid, cell_h, grid, cell_w, 3), Rest am Rand entfällt
+        cropped = lab_image[:grid_size * cell_h, :grid_size * cell_w]
+        blocks = cropped.reshape(grid_size, cell_h, grid_size, cell_w, -1)
+        cell_stds = blocks.std(axis=(1, 3, 4), dtype=np.float32)  # float32: halbe Bandbreite
 
-        for i in range(grid_size):
-            for j in range(grid_size):
-                y1, y2 = i * cell_h, (i + 1) * cell_h
-                x1, x2 = j * cell_w, (j + 1) * cell_w
-
-                cell = lab_image[y1:y2, x1:x2]
-                cell_std = np.std(cell)
-                cell_stds.append(cell_std)
-
-        return np.mean(cell_stds)
+        return cell_stds.mean()
 
     def _calculate_dominant_color_ratio(self, rgb_image: np.ndarray) -> float:
-        """Berechnet Dominanz-Ratio der häufigsten Farbe (K-Means)."""
-        pixels = rgb_image.reshape(-1, 3).astype(np.float32)
-
-        # K-Means Clustering
-        criteria = (
-            cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,
-            self.config["kmeans_iterations"],
-            1.0
-        )
+        """
+        Berechnet Dominanz-Ratio der häufigsten Farbe.
 
-        k = self.config["kmeans_clusters"]
-        _, labels, centers = cv2.kmeans(
-            pixels, k, None, criteria, 10, cv2.KMEANS_PP_CENTERS
-        )
+        Statt K-Means: Farben auf palette_bits Bit pro Kanal quantisieren,
+        zu einem Index packen und per bincount in einem Durchlauf zählen.
+        """
+        bits = self.config.get("palette_bits", 5)
+        shift = 8 - bits
 
-        # Dominanz-Ratio berechnen
-        label_counts = np.bincount(labels.flatten())
-        max_count = np.max(label_counts)
-        total_count = len(labels)
+        q = rgb_image.reshape(-1, 3) >> shift
+        idx = (q[:, 0].astype(np.int32) << (2 * bits)) | (q[:, 1].astype(np.int32) << bits) | q[:, 2]
 
-        return max_count / total_count
+        counts = np.bincount(idx, minlength=1 << (3 * bits))
+        return counts.max() / max(idx.size, 1)
 
     def _calculate_uniformity_score(
         self, global_std: float, regional_std: float, dominant_ratio: float
     ) -> float:
-        """Berechnet Uniformitäts-Score für Typeplate-Erkennung."""
-        score = 0.0
-
-        # Globale Uniformität
-        if global_std < self.config["lab_std_threshold_high"]:
-            score += 3.0
-        elif global_std < self.config["lab_std_threshold_medium"]:
-            score += 1.5
-
-        # Dominante Farbe
-        if dominant_ratio > self.config["dominant_color_threshold"]:
-            score += 2.0
-
-        # Regionale Konsistenz
-        if regional_std < self.config["lab_std_threshold_high"]:
-            score += 1.0
+        """
+        Berechnet Uniformitäts-Score für Typeplate-Erkennung.
 
-        return score
+        Verzweigungsfrei: jede Bedingung trägt als 0/1 zur Summe bei.
+        """
+        hi, med = self._hi, self._med
+        return (
+            3.0 * (global_std < hi)                           # Globale Uniformität
+            + 1.5 * (hi <= global_std < med)
+            + 2.0 * (dominant_ratio > self._dom)              # Dominante Farbe
+            + 1.0 * (regional_std < hi)                       # Regionale Konsistenz
+        )
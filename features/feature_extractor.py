@@ -1,18 +1,130 @@
 # features/feature_extractor.py
 # Multi-modale Feature-Extraktion für Ähnlichkeitssuche
 
+import io
+
 import cv2
 import numpy as np
-import imagehash
 from PIL import Image
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 import torch
+from cache import TTLCache
 from config import config
+from features.image_arrays import ImageArrays
+from models.clip_preprocess import CLIPPreprocessor
+
+try:
+    import ihist
+    IHIST_AVAILABLE = True
+except ImportError:
+    ihist = None
+    IHIST_AVAILABLE = False
+
+try:
+    from libphash import ImageContext
+    LIBPHASH_AVAILABLE = True
+except ImportError:
+    ImageContext = None
+    LIBPHASH_AVAILABLE = False
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+def _present(value) -> bool:
+    """True für nicht-leere Listen/Arrays (ndarray hat keinen eindeutigen Wahrheitswert)."""
+    return value is not None and len(value) > 0
+
+
+def _dct_phash(image: Image.Image, hash_size: int) -> int:
+    """
+    pHash mit denselben Bits wie imagehash.phash, DCT per cv2.dct.
+
+    cv2.dct ist orthonormal skaliert, scipy (imagehash) unskaliert: relativ
+    zueinander unterscheiden sich nur Zeile und Spalte 0 um Faktor sqrt(2).
+    Sie werden zurückskaliert, damit der Median-Vergleich identisch bleibt.
+
+    Args:
+        image: PIL Image
+        hash_size: Kantenlänge des Hashes (hash_size² Bits)
+
+    Returns:
+        Hash als Integer (Bits zeilenweise, MSB zuerst)
+    """
+    size = hash_size * 4
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+
+    low = cv2.dct(pixels)[:hash_size, :hash_size]
+    low[0, :] *= np.sqrt(2)
+    low[:, 0] *= np.sqrt(2)
+
+    bits = (low > np.median(low)).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-bits.size % 8)
+
+
+def _stack_vectors(features: List[Dict], key: str, dtype=np.float32) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stapelt eine Vektor-Komponente aller Einträge zu (N, D) in dtype.
+
+    Einträge ohne Vektor oder mit abweichender Länge sind per Maske
+    ausgeschlossen (calculate_similarity liefert für sie ebenfalls 0.0).
+    """
+    vectors = [f.get(key) for f in features]
+    dim = next((len(v) for v in vectors if _present(v)), 0)
+    stacked = np.zeros((len(vectors), dim), dtype=dtype)
+    mask = np.zeros(len(vectors), dtype=bool)
+    for i, v in enumerate(vectors):
+        if _present(v) and len(v) == dim:
+            stacked[i] = v
+            mask[i] = True
+    return stacked, mask
+
+
+class FeatureGallery:
+    """
+    Gestapelte Features vieler Bilder für 1-gegen-N-Ähnlichkeit.
+
+    Jede Komponente liegt als zusammenhängendes Array vor, damit
+    FeatureExtractor.batch_similarity pro Komponente eine Array-Operation
+    statt N Einzelaufrufen ausführt.
+
+    Histogramme und Embeddings werden als float16 gehalten (halber RAM und
+    halbe Speicherbandbreite beim Scan); gerechnet wird in float32.
+    """
+
+    STORAGE_DTYPE = np.float16
+
+    def __init__(self, features: List[Dict]):
+        """
+        Args:
+            features: Feature-Dictionaries (wie von extract_features bzw. CI4)
+        """
+        self.size = len(features)
+        self.hashes = [f.get("perceptual_hash") or "" for f in features]
+
+        # 64-bit Hashes (8x8) als uint64 für XOR + popcount (Hex nur bei älteren Datensätzen)
+        ints = [
+            f.get("perceptual_hash_u64") if f.get("perceptual_hash_u64") is not None
+            else (int(h, 16) if len(h) == 16 else None)
+            for f, h in zip(features, self.hashes)
+        ]
+        self.phash_mask = np.array([v is not None for v in ints], dtype=bool)
+        self.phash = np.array([v or 0 for v in ints], dtype=np.uint64)
+
+        self.color, self.color_mask = _stack_vectors(features, "color_histogram", self.STORAGE_DTYPE)
+        self.edge, self.edge_mask = _stack_vectors(features, "edge_histogram", self.STORAGE_DTYPE)
+
+        # CLIP zeilenweise vornormalisieren (in float32) -> Cosinus = ein Matrix-Vektor-Produkt
+        clip, self.clip_mask = _stack_vectors(features, "clip_embedding")
+        norms = np.linalg.norm(clip, axis=1)
+        self.clip_mask &= norms > 0
+        clip[self.clip_mask] /= norms[self.clip_mask, None]
+        self.clip = clip.astype(self.STORAGE_DTYPE)
+
+    def __len__(self) -> int:
+        return self.size
+
+
 class FeatureExtractor:
     """
     Multi-modale Feature-Extraktion für Bild-Ähnlichkeit.
@@ -26,21 +138,32 @@ class FeatureExtractor:
     6. Layout-Features: Aspect-Ratio, Text-Dichte
     """
 
-    def __init__(self, clip_model=None, clip_processor=None):
+    SIMILARITY_CACHE_SIZE = 100_000  # Teil-Scores je Bildpaar (LRU)
+
+    def __init__(self, clip_model=None, clip_processor=None, onnx_session=None):
         """
         Initialisiert Feature-Extractor.
 
         Args:
             clip_model: Optional CLIP-Model (wird wiederverwendet)
             clip_processor: Optional CLIP-Processor
+            onnx_session: Optional ONNX-Bild-Tower (export_clip_onnx.py), ersetzt
+                den PyTorch-Forward für die Embeddings
         """
         self.clip_model = clip_model
         self.clip_processor = clip_processor
+        self.onnx_session = onnx_session
+        # Mean/Std/Zielgröße einmalig aus dem Processor übernommen
+        self.clip_preprocessor = (
+            CLIPPreprocessor(clip_processor)
+            if clip_processor is not None and config.CLIP_CONFIG["fast_preprocess"] else None
+        )
         self.cfg = config.FEATURE_CONFIG
+        self._similarity_cache = TTLCache(maxsize=self.SIMILARITY_CACHE_SIZE)
 
     def extract_features(
         self,
-        image: Image.Image,
+        image: Union[Image.Image, ImageArrays],
         ocr_text: str = "",
         ocr_data: Optional[Dict] = None
     ) -> Dict:
@@ -48,13 +171,15 @@ class FeatureExtractor:
         Extrahiert alle Features.
 
         Args:
-            image: PIL Image
+            image: PIL Image oder ImageArrays (teilt RGB/Graustufen/LAB-Puffer
+                mit den Analyzern, z.B. LineAnalyzer)
             ocr_text: OCR-extrahierter Text
             ocr_data: Optional OCR-Analyse-Daten
 
         Returns:
             {
                 "perceptual_hash": "abc123...",
+                "perceptual_hash_u64": 12345...,      # 64-bit Integer (None bei hash_size != 8)
                 "color_histogram": [0.1, 0.05, ...],  # 32 bins
                 "edge_histogram": [0.08, 0.12, ...],  # 32 bins
                 "clip_embedding": [0.45, -0.12, ...], # 512-dim
@@ -65,18 +190,24 @@ class FeatureExtractor:
         features = {}
 
         try:
+            # Pixel-Puffer einmal pro Bild (RGB, Graustufen, LAB bei Bedarf)
+            arrays = ImageArrays.ensure(image)
+            pil_image = image if isinstance(image, Image.Image) else Image.fromarray(arrays.rgb)
+
             # 1. Perceptual Hash
-            features['perceptual_hash'] = self._compute_perceptual_hash(image)
+            phash_hex, phash_int = self._compute_perceptual_hash(pil_image)
+            features['perceptual_hash'] = phash_hex  # Hex für CI4/JSON
+            features['perceptual_hash_u64'] = phash_int if len(phash_hex) == 16 else None
 
             # 2. Color Histogram (LAB)
-            features['color_histogram'] = self._compute_color_histogram(image)
+            features['color_histogram'] = self._compute_color_histogram(arrays)
 
             # 3. Edge Orientation Histogram
-            features['edge_histogram'] = self._compute_edge_histogram(image)
+            features['edge_histogram'] = self._compute_edge_histogram(arrays)
 
             # 4. CLIP Embedding
             if self.clip_model and self.clip_processor:
-                features['clip_embedding'] = self._compute_clip_embedding(image)
+                features['clip_embedding'] = self._compute_clip_embedding(pil_image)
             else:
                 features['clip_embedding'] = None
 
@@ -84,7 +215,7 @@ class FeatureExtractor:
             features['text_features'] = self._extract_text_features(ocr_text, ocr_data)
 
             # 6. Layout Features
-            features['layout_features'] = self._extract_layout_features(image, ocr_text)
+            features['layout_features'] = self._extract_layout_features(arrays, ocr_text)
 
         except Exception as e:
             logger.error(f"Feature extraction failed: {e}")
@@ -93,13 +224,38 @@ class FeatureExtractor:
 
         return features
 
-    def _compute_perceptual_hash(self, image: Image.Image) -> str:
-        """Berechnet Perceptual Hash (phash) - robust gegen kleine Änderungen."""
+    def _compute_perceptual_hash(self, image: Image.Image) -> Tuple[str, int]:
+        """
+        Berechnet Perceptual Hash (phash) - robust gegen kleine Änderungen.
+
+        Standard: imagehash-kompatible Bits (cv2.dct, siehe _dct_phash).
+        Mit phash_backend "libphash" läuft alles in C (nur 64-bit Hash).
+        Die libphash-Werte unterscheiden sich - gespeicherte Hashes sind
+        nach einem Wechsel nicht mehr vergleichbar.
+
+        Returns:
+            (Hex-String, Integer)
+        """
         hash_size = self.cfg["perceptual_hash_size"]
-        phash = imagehash.phash(image, hash_size=hash_size)
-        return str(phash)
 
-    def _compute_color_histogram(self, image: Image.Image) -> List[float]:
+        if self.cfg.get("phash_backend") == "libphash":
+            if LIBPHASH_AVAILABLE and hash_size == 8:
+                value = self._libphash(image)
+                return f"{value:016x}", value
+            logger.warning("libphash nicht verfügbar oder hash_size != 8 - nutze DCT-pHash")
+
+        value = _dct_phash(image, hash_size)
+        return f"{value:0{(hash_size * hash_size + 3) // 4}x}", value
+
+    @staticmethod
+    def _libphash(image: Image.Image) -> int:
+        """64-bit phash via libphash (Graustufen als unkomprimiertes BMP übergeben)."""
+        buf = io.BytesIO()
+        image.convert("L").save(buf, format="BMP")
+        with ImageContext(bytes_data=buf.getvalue(), load_grayscale=True) as ctx:
+            return ctx.phash
+
+    def _compute_color_histogram(self, image: Union[Image.Image, ImageArrays]) -> List[float]:
         """
         Berechnet LAB-Farb-Histogramm.
 
@@ -108,22 +264,28 @@ class FeatureExtractor:
         """
         bins = self.cfg["color_histogram_bins"]
 
-        # Zu LAB konvertieren
-        img_array = np.array(image.convert("RGB"))
-        lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
+        # LAB (geteilter Puffer, nur einmal pro Bild konvertiert)
+        lab = ImageArrays.ensure(image).lab
 
-        # Histogramm für jeden Kanal
-        hist_l = cv2.calcHist([lab], [0], None, [bins], [0, 256])
-        hist_a = cv2.calcHist([lab], [1], None, [bins], [0, 256])
-        hist_b = cv2.calcHist([lab], [2], None, [bins], [0, 256])
+        if IHIST_AVAILABLE:
+            # Alle drei Kanäle in einem (parallelen) Durchlauf mit 256 bins,
+            # danach auf `bins` zusammenfassen - gleiche Grenzen wie calcHist
+            starts = -((-np.arange(bins) * 256) // bins)
+            full = ihist.histogram(lab)
+            hist_combined = np.add.reduceat(full, starts, axis=1).ravel().astype(np.float32)
+        else:
+            # Histogramm für jeden Kanal
+            hist_l = cv2.calcHist([lab], [0], None, [bins], [0, 256])
+            hist_a = cv2.calcHist([lab], [1], None, [bins], [0, 256])
+            hist_b = cv2.calcHist([lab], [2], None, [bins], [0, 256])
+            hist_combined = np.concatenate([hist_l, hist_a, hist_b]).flatten()
 
-        # Zusammenführen und normalisieren
-        hist_combined = np.concatenate([hist_l, hist_a, hist_b]).flatten()
+        # Normalisieren
         hist_normalized = hist_combined / (hist_combined.sum() + 1e-6)
 
         return hist_normalized.tolist()
 
-    def _compute_edge_histogram(self, image: Image.Image) -> List[float]:
+    def _compute_edge_histogram(self, image: Union[Image.Image, ImageArrays]) -> List[float]:
         """
         Berechnet Edge-Orientierungs-Histogramm.
 
@@ -132,24 +294,32 @@ class FeatureExtractor:
         """
         bins = self.cfg["edge_histogram_bins"]
 
-        # Zu Graustufen
-        img_array = np.array(image.convert("L"))
-
-        # Sobel-Filter für Gradienten
-        sobelx = cv2.Sobel(img_array, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(img_array, cv2.CV_64F, 0, 1, ksize=3)
-
-        # Gradientenrichtung
-        magnitude = np.sqrt(sobelx**2 + sobely**2)
-        orientation = np.arctan2(sobely, sobelx)
-
-        # Nur starke Kanten berücksichtigen (> Schwellwert)
-        threshold = np.percentile(magnitude, 75)
-        strong_edges = magnitude > threshold
+        # Graustufen (geteilter Puffer)
+        img_array = ImageArrays.ensure(image).gray
+
+        # Sobel-Filter für Gradienten (float32: Werte sind exakt, halbe Bandbreite)
+        sobelx = cv2.Sobel(img_array, cv2.CV_32F, 1, 0, ksize=3)
+        sobely = cv2.Sobel(img_array, cv2.CV_32F, 0, 1, ksize=3)
+
+        # Quadrierte Gradientenstärke (ganzzahlig, exakt in float32; ohne sqrt,
+        # da nur verglichen wird)
+        magnitude_sq = sobelx * sobelx
+        magnitude_sq += sobely * sobely
+
+        # Nur starke Kanten berücksichtigen (> 75%-Perzentil). Das Perzentil
+        # interpoliert zwischen den Rangwerten k und k+1 (Bruchteil < 1), also
+        # ist "> Perzentil" gleichbedeutend mit "> Rangwert k".
+        flat = magnitude_sq.ravel()
+        k = (3 * (flat.size - 1)) // 4
+        threshold_sq = np.partition(flat, k)[k]
+        strong_edges = magnitude_sq > threshold_sq
+
+        # Gradientenrichtung nur für starke Kanten (float64, damit +pi im Bereich bleibt)
+        orientations_filtered = np.arctan2(
+            sobely[strong_edges].astype(np.float64), sobelx[strong_edges]
+        )
 
         # Histogramm der Orientierungen (nur starke Kanten)
-        orientations_filtered = orientation[strong_edges]
-
         if len(orientations_filtered) > 0:
             hist, _ = np.histogram(orientations_filtered, bins=bins, range=(-np.pi, np.pi))
             hist_normalized = hist / (hist.sum() + 1e-6)
@@ -165,22 +335,55 @@ class FeatureExtractor:
         Returns:
             Embedding-Vektor oder None
         """
-        try:
-            # CLIP-Input vorbereiten
-            inputs = self.clip_processor(images=image, return_tensors="pt")
+        return self.compute_clip_embeddings([image])[0]
+
+    def compute_clip_embeddings(self, images: List[Image.Image]) -> List[Optional[List[float]]]:
+        """
+        Berechnet CLIP-Embeddings für mehrere Bilder in einem Forward-Pass.
+
+        Passt als batch_fn für models.clip_batcher.CLIPBatcher, um
+        gleichzeitige Aufrufe zu bündeln.
 
-            # Embedding extrahieren
-            with torch.no_grad():
-                image_features = self.clip_model.get_image_features(**inputs)
+        Args:
+            images: Liste von PIL Images
 
-            # Normalisieren
+        Returns:
+            Normalisierte Embeddings in Eingabe-Reihenfolge (None bei Fehler)
+        """
+        try:
+            # CLIP-Input vorbereiten (ein Tensor für den ganzen Batch)
+            if self.clip_preprocessor is not None:
+                pixel_values = self.clip_preprocessor(images)
+            else:
+                pixel_values = self.clip_processor(images=images, return_tensors="pt")["pixel_values"]
+
+            if self.onnx_session is not None:
+                # ONNX Runtime (FP32-Eingabe, liefert unnormalisierte Embeddings)
+                image_embeds = self.onnx_session.run(
+                    None, {"pixel_values": pixel_values.numpy()}
+                )[0]
+                image_features = torch.from_numpy(image_embeds)
+            else:
+                # Auf Device/Dtype des Models bringen (FP16/BF16)
+                device, dtype = self.clip_model.device, self.clip_model.dtype
+                pixel_values = pixel_values.to(device, dtype=dtype)
+
+                # Embedding extrahieren (autocast nur bei halber Genauigkeit)
+                with torch.inference_mode(), torch.autocast(
+                    device_type=device.type, dtype=dtype,
+                    enabled=dtype in (torch.float16, torch.bfloat16)
+                ):
+                    image_features = self.clip_model.get_image_features(pixel_values=pixel_values)
+
+            # Normalisieren in FP32 (ganzer Batch auf einmal)
+            image_features = image_features.float()
             image_features = image_features / image_features.norm(dim=-1, keepdim=True)
 
-            return image_features.squeeze().cpu().numpy().tolist()
+            return image_features.cpu().numpy().tolist()
 
         except Exception as e:
             logger.error(f"CLIP embedding extraction failed: {e}")
-            return None
+            return [None] * len(images)
 
     def _extract_text_features(self, text: str, ocr_data: Optional[Dict] = None) -> Dict:
         """Extrahiert Text-basierte Features."""
@@ -195,11 +398,12 @@ class FeatureExtractor:
         words = text.split()
         word_count = len(words)
         char_count = len(text)
-        digit_count = sum(c.isdigit() for c in text)
+        # map/join laufen in C statt pro Zeichen bzw. Wort im Interpreter
+        digit_count = sum(map(str.isdigit, text))
         digit_ratio = digit_count / max(char_count, 1)
 
-        # Durchschnittliche Wortlänge
-        avg_word_length = sum(len(w) for w in words) / max(word_count, 1)
+        # Durchschnittliche Wortlänge (Wörter enthalten alle Nicht-Leerzeichen)
+        avg_word_length = len("".join(words)) / max(word_count, 1)
 
         return {
             "word_count": word_count,
@@ -208,9 +412,9 @@ class FeatureExtractor:
             "char_count": char_count
         }
 
-    def _extract_layout_features(self, image: Image.Image, text: str) -> Dict:
-        """Extrahiert Layout-Features."""
-        width, height = image.size
+    def _extract_layout_features(self, image: Union[Image.Image, ImageArrays], text: str) -> Dict:
+        """Extrahiert Layout-Features (Größe des Originalbildes)."""
+        height, width = ImageArrays.ensure(image).full_shape[:2]
         aspect_ratio = width / max(height, 1)
 
         # Text-Dichte (Zeichen pro Pixel)
@@ -228,6 +432,7 @@ class FeatureExtractor:
         """Returniert leere Feature-Struktur bei Fehler."""
         return {
             "perceptual_hash": "",
+            "perceptual_hash_u64": None,
             "color_histogram": [],
             "edge_histogram": [],
             "clip_embedding": None,
@@ -235,7 +440,34 @@ class FeatureExtractor:
             "layout_features": {}
         }
 
-    def calculate_similarity(self, features1: Dict, features2: Dict) -> float:
+    @staticmethod
+    def prepare_features(features: Dict) -> Dict:
+        """
+        Wandelt die Vektor-Features einmalig in float32-Arrays um.
+
+        Für Galerie-Scans: vorbereitete Features sparen die Listen-Konvertierung
+        bei jedem calculate_similarity-Aufruf. Das Ergebnis ist nicht mehr
+        JSON-serialisierbar - die Listen-Form bleibt für CI4 maßgeblich.
+
+        Args:
+            features: Feature-Dictionary (z.B. aus extract_features oder CI4)
+
+        Returns:
+            Kopie mit color_histogram/edge_histogram/clip_embedding als ndarray
+        """
+        prepared = dict(features)
+        for key in ("color_histogram", "edge_histogram", "clip_embedding"):
+            value = prepared.get(key)
+            if value is not None:
+                prepared[key] = np.asarray(value, dtype=np.float32)
+        return prepared
+
+    def calculate_similarity(
+        self,
+        features1: Dict,
+        features2: Dict,
+        ids: Optional[Tuple[str, str]] = None
+    ) -> float:
         """
         Berechnet Ähnlichkeit zwischen zwei Feature-Vektoren.
 
@@ -246,17 +478,59 @@ class FeatureExtractor:
         - clip_embedding_similarity * 0.4
 
         Args:
-            features1, features2: Feature-Dictionaries
+            features1, features2: Feature-Dictionaries (Listen oder prepare_features)
+            ids: Optional eindeutige IDs der beiden Bilder (z.B. classification_id)
+                für den Teil-Score-Cache
 
         Returns:
             Similarity score 0.0-1.0
         """
         weights = self.cfg["similarity_weights"]
+        similarities = self.similarity_components(features1, features2, ids)
+
+        # Gewichtete Summe
+        total_similarity = sum(
+            similarities[key] * weights[key]
+            for key in similarities
+        )
+
+        return round(total_similarity, 3)
+
+    def similarity_components(
+        self,
+        features1: Dict,
+        features2: Dict,
+        ids: Optional[Tuple[str, str]] = None
+    ) -> Dict[str, float]:
+        """
+        Ungewichtete Teil-Ähnlichkeiten (hash, color_hist, edge_hist, clip_embedding).
+
+        Mit ids werden die Teil-Scores gecacht (alle Metriken sind symmetrisch,
+        Schlüssel ist das sortierte ID-Paar). Geänderte similarity_weights
+        erfordern so keine Neuberechnung. Der Perceptual Hash taugt nicht als
+        Schlüssel - verschiedene Bilder können denselben Hash haben.
+
+        Args:
+            features1, features2: Feature-Dictionaries
+            ids: Optional eindeutige IDs der beiden Bilder
+
+        Returns:
+            {"hash": ..., "color_hist": ..., "edge_hist": ..., "clip_embedding": ...}
+        """
+        key = tuple(sorted(ids)) if ids is not None else None
+        if key is not None:
+            cached = self._similarity_cache.get(key)
+            if cached is not None:
+                return cached
 
         similarities = {}
 
         # 1. Perceptual Hash Similarity
-        if features1.get('perceptual_hash') and features2.get('perceptual_hash'):
+        u64_1, u64_2 = features1.get('perceptual_hash_u64'), features2.get('perceptual_hash_u64')
+        if u64_1 is not None and u64_2 is not None:
+            similarities['hash'] = self._u64_hash_similarity(u64_1, u64_2)
+        elif features1.get('perceptual_hash') and features2.get('perceptual_hash'):
+            # Ältere Datensätze ohne Integer-Hash
             hash_sim = self._hash_similarity(
                 features1['perceptual_hash'],
                 features2['perceptual_hash']
@@ -266,7 +540,7 @@ class FeatureExtractor:
             similarities['hash'] = 0.0
 
         # 2. Color Histogram Similarity
-        if features1.get('color_histogram') and features2.get('color_histogram'):
+        if _present(features1.get('color_histogram')) and _present(features2.get('color_histogram')):
             color_sim = self._histogram_similarity(
                 features1['color_histogram'],
                 features2['color_histogram']
@@ -276,7 +550,7 @@ class FeatureExtractor:
             similarities['color_hist'] = 0.0
 
         # 3. Edge Histogram Similarity
-        if features1.get('edge_histogram') and features2.get('edge_histogram'):
+        if _present(features1.get('edge_histogram')) and _present(features2.get('edge_histogram')):
             edge_sim = self._histogram_similarity(
                 features1['edge_histogram'],
                 features2['edge_histogram']
@@ -286,7 +560,7 @@ class FeatureExtractor:
             similarities['edge_hist'] = 0.0
 
         # 4. CLIP Embedding Similarity
-        if features1.get('clip_embedding') and features2.get('clip_embedding'):
+        if _present(features1.get('clip_embedding')) and _present(features2.get('clip_embedding')):
             clip_sim = self._cosine_similarity(
                 features1['clip_embedding'],
                 features2['clip_embedding']
@@ -295,26 +569,94 @@ class FeatureExtractor:
         else:
             similarities['clip_embedding'] = 0.0
 
-        # Gewichtete Summe
-        total_similarity = sum(
-            similarities[key] * weights[key]
-            for key in similarities
-        )
+        if key is not None:
+            self._similarity_cache.set(key, similarities)
+        return similarities
 
-        return round(total_similarity, 3)
+    def batch_similarity(self, query: Dict, gallery: FeatureGallery) -> np.ndarray:
+        """
+        Ähnlichkeit eines Feature-Dicts gegen alle Einträge einer Galerie.
+
+        Liefert dieselben Werte wie calculate_similarity pro Paar (bis auf
+        float16-Rundung der Galerie), rechnet aber jede Komponente als eine
+        Array-Operation über die ganze Galerie.
+
+        Args:
+            query: Feature-Dictionary des Anfragebildes
+            gallery: Vorbereitete Vergleichs-Features
+
+        Returns:
+            Similarity scores 0.0-1.0 (float64, Galerie-Reihenfolge)
+        """
+        weights = self.cfg["similarity_weights"]
+        total = np.zeros(len(gallery))
+
+        # 1. Perceptual Hash
+        query_hash = query.get("perceptual_hash")
+        query_u64 = query.get("perceptual_hash_u64")
+        if query_u64 is not None or query_hash:
+            if query_u64 is not None or len(query_hash) == 16:
+                hash_sims = np.where(
+                    gallery.phash_mask,
+                    self.batch_hash_similarity(
+                        query_u64 if query_u64 is not None else query_hash, gallery.phash
+                    ),
+                    0.0
+                )
+            else:  # Andere Hash-Größen: seltener Fall, paarweise
+                hash_sims = np.array([
+                    self._hash_similarity(query_hash, h) if h else 0.0
+                    for h in gallery.hashes
+                ])
+            total += weights["hash"] * hash_sims
+
+        # 2./3. Histogramme (Chi-Square, vektorisiert über alle Zeilen)
+        for key, stacked, mask, weight_key in (
+            ("color_histogram", gallery.color, gallery.color_mask, "color_hist"),
+            ("edge_histogram", gallery.edge, gallery.edge_mask, "edge_hist"),
+        ):
+            q = query.get(key)
+            if not _present(q) or len(q) != stacked.shape[1]:
+                continue
+            q = np.asarray(q, dtype=np.float32)
+            rows = stacked.astype(np.float32)
+            diff = rows - q
+            rows += q
+            rows += 1e-6
+            np.divide(diff, rows, out=rows)
+            chi_square = np.einsum("ij,ij->i", diff, rows)
+            sims = np.clip(np.exp(-chi_square / 2), 0.0, 1.0)
+            total += weights[weight_key] * np.where(mask, sims, 0.0)
+
+        # 4. CLIP (Galerie ist vornormalisiert)
+        q = query.get("clip_embedding")
+        if _present(q) and len(q) == gallery.clip.shape[1]:
+            q = np.asarray(q, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm > 0:
+                cos = gallery.clip.astype(np.float32) @ (q / norm)
+                sims = np.clip((cos + 1) / 2, 0.0, 1.0)
+                total += weights["clip_embedding"] * np.where(gallery.clip_mask, sims, 0.0)
+
+        return np.round(total, 3)
+
+    @staticmethod
+    def _u64_hash_similarity(hash1: int, hash2: int) -> float:
+        """Hash-Ähnlichkeit zweier 64-bit Integer-Hashes (XOR + popcount)."""
+        return 1.0 - (hash1 ^ hash2).bit_count() / 64.0
 
     def _hash_similarity(self, hash1: str, hash2: str) -> float:
         """
         Berechnet Ähnlichkeit zwischen zwei Perceptual Hashes.
 
-        Verwendet Hamming-Distanz.
+        Hamming-Distanz per Integer-XOR + popcount (ohne imagehash-Objekte).
         """
         try:
-            h1 = imagehash.hex_to_hash(hash1)
-            h2 = imagehash.hex_to_hash(hash2)
+            if len(hash1) != len(hash2):
+                raise ValueError(f"Hash-Längen unterschiedlich: {len(hash1)} vs {len(hash2)}")
 
             # Hamming-Distanz
-            hamming_dist = h1 - h2
+            hamming_dist = (int(hash1, 16) ^ int(hash2, 16)).bit_count()
 
             # Max Distanz für 8x8 Hash = 64
             max_dist = len(hash1) * 4  # 4 Bits pro Hex-Zeichen
@@ -328,18 +670,59 @@ class FeatureExtractor:
             logger.error(f"Hash similarity calculation failed: {e}")
             return 0.0
 
-    def _histogram_similarity(self, hist1: List[float], hist2: List[float]) -> float:
+    @staticmethod
+    def hashes_to_array(hashes: List[str]) -> np.ndarray:
+        """
+        Wandelt 64-bit Hex-Hashes (8x8) in ein uint64-Array für batch_hash_similarity.
+
+        Args:
+            hashes: Hex-Strings mit 16 Zeichen
+
+        Returns:
+            uint64-Array
+        """
+        return np.fromiter((int(h, 16) for h in hashes), dtype=np.uint64, count=len(hashes))
+
+    @staticmethod
+    def batch_hash_similarity(query_hash: Union[str, int], gallery: np.ndarray) -> np.ndarray:
+        """
+        Hash-Ähnlichkeit eines Hashes gegen viele 64-bit Hashes auf einmal.
+
+        Args:
+            query_hash: Hex-Hash (16 Zeichen) oder 64-bit Integer
+            gallery: uint64-Array (siehe hashes_to_array)
+
+        Returns:
+            Ähnlichkeiten 0.0-1.0 pro Eintrag
+        """
+        if isinstance(query_hash, str):
+            query_hash = int(query_hash, 16)
+        xor = gallery ^ np.uint64(query_hash)
+        if hasattr(np, "bitwise_count"):
+            dist = np.bitwise_count(xor)
+        else:  # NumPy < 2.0
+            dist = np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+        return 1.0 - dist / 64.0
+
+    def _histogram_similarity(self, hist1: Union[List[float], np.ndarray], hist2: Union[List[float], np.ndarray]) -> float:
         """
         Berechnet Ähnlichkeit zwischen zwei Histogrammen.
 
         Verwendet Chi-Square-Distanz.
         """
         try:
-            h1 = np.array(hist1)
-            h2 = np.array(hist2)
-
-            # Chi-Square-Distanz
-            chi_square = np.sum((h1 - h2)**2 / (h1 + h2 + 1e-6))
+            # asarray: vorbereitete ndarrays werden nicht kopiert
+            h1 = np.asarray(hist1)
+            h2 = np.asarray(hist2)
+            dtype = np.result_type(h1, h2, np.float32)
+
+            # Chi-Square-Distanz (zwei Puffer, Rest in-place)
+            diff = np.subtract(h1, h2, dtype=dtype)
+            diff *= diff
+            denom = np.add(h1, h2, dtype=dtype)
+            denom += 1e-6
+            diff /= denom
+            chi_square = diff.sum()
 
             # Chi-Square in Ähnlichkeit konvertieren
             # Kleinere Distanz = höhere Ähnlichkeit
@@ -351,13 +734,13 @@ class FeatureExtractor:
             logger.error(f"Histogram similarity calculation failed: {e}")
             return 0.0
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
+    def _cosine_similarity(self, vec1: Union[List[float], np.ndarray], vec2: Union[List[float], np.ndarray]) -> float:
         """
         Berechnet Cosine-Similarity zwischen zwei Vektoren.
         """
         try:
-            v1 = np.array(vec1)
-            v2 = np.array(vec2)
+            v1 = np.asarray(vec1)
+            v2 = np.asarray(vec2)
 
             # Cosine Similarity
             dot_product = np.dot(v1, v2)
@@ -0,0 +1,187 @@
+# features/image_arrays.py
+# Gemeinsame Pixel-Puffer (RGB, Graustufen, LAB, Canny) für alle Analyzer
+
+import cv2
+import numpy as np
+from PIL import Image
+from typing import Dict, Optional, Tuple, Union
+
+# OpenCL (T-API) nur nutzen, wenn ein Gerät vorhanden ist
+OPENCL_AVAILABLE = cv2.ocl.haveOpenCL()
+
+
+class ImageArrays:
+    """
+    Hält die Pixel-Darstellungen eines Bildes, damit jede Konvertierung
+    pro Request nur einmal berechnet wird.
+
+    Graustufen werden sofort berechnet (von fast allen Analyzern benötigt),
+    LAB und Canny-Kanten erst bei Bedarf.
+    """
+
+    def __init__(
+        self,
+        rgb: np.ndarray,
+        scale: float = 1.0,
+        full_shape: Optional[Tuple[int, ...]] = None,
+        full_rgb: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            rgb: Numpy array (H, W, 3) in RGB oder (H, W) Graustufen
+            scale: Verkleinerungsfaktor gegenüber dem Originalbild
+            full_shape: Shape des Originalbildes (None = rgb.shape)
+            full_rgb: Originalbild, falls rgb verkleinert ist
+        """
+        self.rgb = rgb
+        self.scale = scale
+        self.full_shape = full_shape or rgb.shape
+        self._full_rgb = full_rgb
+        if rgb.ndim == 3:
+            self.gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        else:
+            self.gray = rgb
+        self._lab = None
+        self._edges: Dict[tuple, np.ndarray] = {}
+        self._views: Dict[int, "ImageArrays"] = {}
+
+    @classmethod
+    def ensure(cls, image: Union[Image.Image, np.ndarray, "ImageArrays"]) -> "ImageArrays":
+        """
+        Wandelt PIL Image oder Numpy array in ImageArrays um.
+
+        Args:
+            image: PIL Image, Numpy array oder bereits ImageArrays
+
+        Returns:
+            ImageArrays-Instanz
+        """
+        if isinstance(image, ImageArrays):
+            return image
+        if isinstance(image, Image.Image):
+            return cls(np.array(image.convert("RGB")))
+        return cls(image)
+
+    @classmethod
+    def downscaled(cls, rgb: np.ndarray, max_side: int) -> "ImageArrays":
+        """
+        Verkleinert das Bild einmalig auf max_side (längste Seite).
+
+        Die OpenCV-Analysen brauchen keine volle Kamera-Auflösung; OCR
+        arbeitet weiterhin auf dem Originalbild.
+
+        Args:
+            rgb: Numpy array (H, W, 3) in voller Auflösung
+            max_side: Maximale Kantenlänge (0 = nicht verkleinern)
+
+        Returns:
+            ImageArrays mit scale < 1.0 falls verkleinert
+        """
+        h, w = rgb.shape[:2]
+        scale = min(1.0, max_side / max(h, w)) if max_side else 1.0
+        if scale >= 1.0:
+            return cls(rgb)
+
+        small = cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cls(small, scale=scale, full_shape=rgb.shape, full_rgb=rgb)
+
+    def downscaled_view(self, max_side: int) -> "ImageArrays":
+        """
+        Weiter verkleinerte Ansicht dieses Bildes, je max_side einmal erzeugt.
+
+        Analyzer mit geringerem Auflösungsbedarf (z.B. Farbanalyse) teilen
+        sich so die kleinere Ansicht samt deren LAB-Puffer.
+
+        Args:
+            max_side: Maximale Kantenlänge (0 = nicht verkleinern)
+
+        Returns:
+            self falls bereits klein genug, sonst gecachte ImageArrays
+            (scale/full_shape bezogen auf das Originalbild)
+        """
+        if not max_side or max(self.shape[:2]) <= max_side:
+            return self
+
+        view = self._views.get(max_side)
+        if view is None:
+            small = ImageArrays.downscaled(self.rgb, max_side)
+            view = ImageArrays(
+                small.rgb,
+                scale=self.scale * small.scale,
+                full_shape=self.full_shape,
+                full_rgb=self._full_rgb if self._full_rgb is not None else self.rgb
+            )
+            self._views[max_side] = view
+        return view
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.rgb.shape
+
+    @property
+    def lab(self) -> np.ndarray:
+        """LAB-Farbraum (perzeptuell uniform), per OpenCL falls verfügbar."""
+        if self._lab is None:
+            self._lab = _rgb_to_lab(self.rgb)
+        return self._lab
+
+    def canny(self, low: int, high: int) -> np.ndarray:
+        """
+        Canny-Kanten des Graustufenbildes, je Schwellwert-Paar einmal berechnet.
+
+        Args:
+            low: Unterer Schwellwert
+            high: Oberer Schwellwert
+
+        Returns:
+            Binäres Kantenbild (uint8)
+        """
+        key = (low, high)
+        edges = self._edges.get(key)
+        if edges is None:
+            edges = cv2.Canny(self.gray, low, high)
+            self._edges[key] = edges
+        return edges
+
+    def canny_full(self, low: int, high: int) -> np.ndarray:
+        """
+        Canny-Kanten in Original-Auflösung (für Kennzahlen, die von der
+        Auflösung abhängen, z.B. Kantendichte). Ohne Verkleinerung identisch
+        mit canny().
+
+        Args:
+            low: Unterer Schwellwert
+            high: Oberer Schwellwert
+
+        Returns:
+            Binäres Kantenbild (uint8) in voller Auflösung
+        """
+        if self._full_rgb is None:
+            return self.canny(low, high)
+
+        key = ("full", low, high)
+        edges = self._edges.get(key)
+        if edges is None:
+            full = self._full_rgb
+            gray = cv2.cvtColor(full, cv2.COLOR_RGB2GRAY) if full.ndim == 3 else full
+            edges = cv2.Canny(gray, low, high)
+            self._edges[key] = edges
+        return edges
+
+
+def _rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    RGB -> LAB, über cv2.UMat auf der GPU/iGPU wenn OpenCL aktiv ist.
+
+    Args:
+        rgb: Numpy array (H, W, 3) in RGB
+
+    Returns:
+        LAB-Bild (uint8) als Numpy array
+    """
+    if OPENCL_AVAILABLE and cv2.ocl.useOpenCL():
+        try:
+            return cv2.cvtColor(cv2.UMat(rgb), cv2.COLOR_RGB2LAB).get()
+        except cv2.error:
+            pass  # Treiberproblem -> CPU
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)
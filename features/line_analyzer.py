@@ -1,11 +1,21 @@
 # features/line_analyzer.py
 # Gerade-Linien-Analyse für Typenschild-Erkennung
 
+import logging
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Dict, List
+from typing import Dict, Optional, Tuple, Union
 from config import config
+from features.image_arrays import ImageArrays
+
+logger = logging.getLogger(__name__)
+
+# CUDA-Module nur in OpenCV-Builds mit CUDA und vorhandener GPU
+try:
+    CUDA_AVAILABLE = cv2.cuda.getCudaEnabledDeviceCount() > 0
+except (AttributeError, cv2.error):
+    CUDA_AVAILABLE = False
 
 
 class LineAnalyzer:
@@ -16,11 +26,18 @@ class LineAnalyzer:
 
     def __init__(self):
         self.config = config.LINE_ANALYSIS
+        self._use_cuda = CUDA_AVAILABLE
+        self._cuda_params = None
+        self._cuda_canny = None
+        self._cuda_hough = None
 
-    def analyze_straight_lines(self, image: Image.Image) -> Dict:
+    def analyze_straight_lines(self, image: Union[Image.Image, ImageArrays]) -> Dict:
         """
         Führt Linien-Analyse durch.
 
+        Args:
+            image: PIL Image oder ImageArrays (teilt Graustufen/Canny-Puffer)
+
         Returns:
             {
                 "line_count": 24,
@@ -31,36 +48,38 @@ class LineAnalyzer:
                 "border_completeness": 4
             }
         """
-        img_array = np.array(image.convert("RGB"))
-        gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-
-        # Edge Detection
-        edges = cv2.Canny(
-            gray,
-            self.config["canny_low"],
-            self.config["canny_high"]
-        )
-
-        # Hough Line Transform
-        lines = cv2.HoughLinesP(
-            edges,
-            rho=1,
-            theta=np.pi / 180,
-            threshold=self.config["hough_threshold"],
-            minLineLength=self.config["hough_min_line_length"],
-            maxLineGap=self.config["hough_max_line_gap"]
-        )
+        arrays = ImageArrays.ensure(image)
+        hough_params = self._hough_params(arrays.scale)
 
+        lines = self._detect_lines_cuda(arrays.gray, hough_params) if self._use_cuda else None
         if lines is None:
+            # Edge Detection
+            edges = arrays.canny(
+                self.config["canny_low"],
+                self.config["canny_high"]
+            )
+
+            # Hough Line Transform
+            threshold, min_length, max_gap = hough_params
+            lines = cv2.HoughLinesP(
+                edges,
+                rho=1,
+                theta=np.pi / 180,
+                threshold=threshold,
+                minLineLength=min_length,
+                maxLineGap=max_gap
+            )
+
+        if lines is None or len(lines) == 0:
             return self._empty_result()
 
         # Linien klassifizieren
-        h, w = img_array.shape[:2]
+        h, w = arrays.shape[:2]
         horizontal_lines, vertical_lines = self._classify_lines(lines)
 
         # Rechteckiger Rand erkennen
         has_border, border_completeness = self._detect_rectangular_border(
-            horizontal_lines, vertical_lines, h, w
+            horizontal_lines, vertical_lines, h, w, arrays.scale
         )
 
         # Score berechnen
@@ -82,62 +101,117 @@ class LineAnalyzer:
             )
         }
 
-    def _classify_lines(self, lines: np.ndarray) -> tuple:
-        """Klassifiziert Linien als horizontal oder vertikal."""
-        horizontal = []
-        vertical = []
-        angle_tol = self.config["angle_tolerance"]
+    def _hough_params(self, scale: float) -> Tuple[int, int, int]:
+        """
+        Hough-Parameter in Pixeln des (ggf. verkleinerten) Analysebildes.
+
+        Die Konfiguration ist in Original-Pixeln angegeben; Stimmen-Schwelle,
+        Mindestlänge und Lücke skalieren linear mit der Kantenlänge.
+
+        Args:
+            scale: Verkleinerungsfaktor des Analysebildes (1.0 = Original)
+
+        Returns:
+            (threshold, min_line_length, max_line_gap)
+        """
+        cfg = self.config
+        return (
+            max(1, round(cfg["hough_threshold"] * scale)),
+            max(1, round(cfg["hough_min_line_length"] * scale)),
+            max(0, round(cfg["hough_max_line_gap"] * scale))
+        )
 
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
+    def _detect_lines_cuda(self, gray: np.ndarray, hough_params: Tuple[int, int, int]) -> Optional[np.ndarray]:
+        """
+        Canny + Hough-Segmente auf der GPU (cv2.cuda).
+
+        Detektoren werden bei geänderter Konfiguration neu erzeugt. Bei
+        einem OpenCV-Fehler wird CUDA deaktiviert und None geliefert,
+        damit der Aufrufer auf die CPU-Variante zurückfällt.
+
+        Args:
+            gray: Graustufenbild (uint8)
+            hough_params: (threshold, min_line_length, max_line_gap) in Pixeln von gray
 
-            # Winkel berechnen
-            angle = np.degrees(np.arctan2(y2 - y1, x2 - x1))
+        Returns:
+            Linien im HoughLinesP-Format (N, 1, 4) oder None
+        """
+        cfg = self.config
+        params = (cfg["canny_low"], cfg["canny_high"]) + tuple(hough_params)
+
+        try:
+            if params != self._cuda_params:
+                low, high, threshold, min_length, max_gap = params
+                self._cuda_canny = cv2.cuda.createCannyEdgeDetector(low, high)
+                self._cuda_hough = cv2.cuda.createHoughSegmentDetector(
+                    1, np.pi / 180, min_length, max_gap, threshold=threshold
+                )
+                self._cuda_params = params
+
+            gpu_gray = cv2.cuda_GpuMat()
+            gpu_gray.upload(gray)
+            edges = self._cuda_canny.detect(gpu_gray)
+            segments = self._cuda_hough.detect(edges).download()
+        except cv2.error as e:
+            logger.warning(f"CUDA line detection failed, using CPU: {e}")
+            self._use_cuda = False
+            return None
+
+        if segments is None:
+            return np.empty((0, 1, 4), dtype=np.int32)
+        return segments.reshape(-1, 1, 4)
+
+    def _classify_lines(self, lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Klassifiziert Linien als horizontal oder vertikal (alle auf einmal).
+
+        Args:
+            lines: HoughLinesP-Ergebnis (N, 1, 4)
+
+        Returns:
+            (horizontal, vertical) als (K, 4)-Arrays mit x1, y1, x2, y2
+        """
+        segments = lines.reshape(-1, 4)
+        angle_tol = self.config["angle_tolerance"]
 
-            # Normalisieren
-            angle = angle % 180
-            if angle > 90:
-                angle -= 180
+        # Winkel berechnen und auf (-90, 90] normalisieren
+        angles = np.degrees(np.arctan2(
+            segments[:, 3] - segments[:, 1], segments[:, 2] - segments[:, 0]
+        )) % 180
+        angles = np.abs(np.where(angles > 90, angles - 180, angles))
 
-            # Klassifizieren
-            if abs(angle) < angle_tol:  # Horizontal
-                horizontal.append(line)
-            elif abs(abs(angle) - 90) < angle_tol:  # Vertikal
-                vertical.append(line)
+        # Klassifizieren (horizontal hat Vorrang)
+        h_mask = angles < angle_tol
+        v_mask = ~h_mask & (np.abs(angles - 90) < angle_tol)
 
-        return horizontal, vertical
+        return segments[h_mask], segments[v_mask]
 
     def _detect_rectangular_border(
-        self, h_lines: List, v_lines: List, height: int, width: int
+        self, h_lines: np.ndarray, v_lines: np.ndarray, height: int, width: int,
+        scale: float = 1.0
     ) -> tuple:
-        """Erkennt rechteckigen Rahmen."""
-        threshold = self.config["edge_proximity_threshold"]
+        """
+        Erkennt rechteckigen Rahmen.
+
+        Je Bildkante eine Reduktion über alle Linien-Endpunkte. Der
+        Randabstand (Original-Pixel) wird auf das Analysebild skaliert.
+        """
+        threshold = self.config["edge_proximity_threshold"] * scale
 
-        has_top = any(self._is_near_edge(l, 'top', height, width, threshold) for l in h_lines)
-        has_bottom = any(self._is_near_edge(l, 'bottom', height, width, threshold) for l in h_lines)
-        has_left = any(self._is_near_edge(l, 'left', height, width, threshold) for l in v_lines)
-        has_right = any(self._is_near_edge(l, 'right', height, width, threshold) for l in v_lines)
+        # Endpunkte je Linie (leere Arrays ergeben False)
+        h_y = h_lines[:, [1, 3]]
+        v_x = v_lines[:, [0, 2]]
+
+        has_top = bool((h_y.min(axis=1) < threshold).any())
+        has_bottom = bool((h_y.max(axis=1) > height - threshold).any())
+        has_left = bool((v_x.min(axis=1) < threshold).any())
+        has_right = bool((v_x.max(axis=1) > width - threshold).any())
 
         completeness = sum([has_top, has_bottom, has_left, has_right])
         has_border = completeness >= 3
 
         return has_border, completeness
 
-    def _is_near_edge(self, line, edge_type: str, h: int, w: int, threshold: int) -> bool:
-        """Prüft ob Linie nahe am Bildrand ist."""
-        x1, y1, x2, y2 = line[0]
-
-        if edge_type == 'top':
-            return min(y1, y2) < threshold
-        elif edge_type == 'bottom':
-            return max(y1, y2) > h - threshold
-        elif edge_type == 'left':
-            return min(x1, x2) < threshold
-        elif edge_type == 'right':
-            return max(x1, x2) > w - threshold
-
-        return False
-
     def _calculate_line_score(self, h_count: int, v_count: int, has_border: bool) -> float:
         """Berechnet Line-Score für Typeplate-Erkennung."""
         score = 0.0
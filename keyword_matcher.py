@@ -0,0 +1,86 @@
+# keyword_matcher.py
+# Multi-Pattern-Suche: alle Keywords in einem Durchlauf über den OCR-Text
+
+import logging
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    ahocorasick = None
+    AHOCORASICK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordMatcher:
+    """
+    Findet Keywords als Teilstrings (wie `kw in text`).
+
+    Mit pyahocorasick wird einmalig ein Aho-Corasick-Automat gebaut, der
+    den Text in einem Durchlauf unabhängig von der Keyword-Anzahl scannt.
+    Ohne pyahocorasick: str.find pro Keyword (gleiches Ergebnis).
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        """
+        Args:
+            keywords: Keywords (werden kleingeschrieben, Reihenfolge bleibt erhalten)
+        """
+        self.keywords = list(dict.fromkeys(kw.lower() for kw in keywords if kw))
+        self._automaton = None
+
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            automaton = ahocorasick.Automaton()
+            for idx, kw in enumerate(self.keywords):
+                automaton.add_word(kw, (idx, kw))
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def first_positions(self, text_lower: str) -> Dict[str, int]:
+        """
+        Erste Fundstelle jedes enthaltenen Keywords.
+
+        Args:
+            text_lower: Bereits kleingeschriebener Text
+
+        Returns:
+            {keyword: position} in Keyword-Reihenfolge (nur gefundene)
+        """
+        if self._automaton is None:
+            found = {}
+            for kw in self.keywords:
+                pos = text_lower.find(kw)
+                if pos >= 0:
+                    found[kw] = pos
+            return found
+
+        # Erster Treffer je Keyword = frühestes Ende = früheste Position
+        hits: Dict[int, int] = {}
+        for end, (idx, kw) in self._automaton.iter(text_lower):
+            if idx not in hits:
+                hits[idx] = end - len(kw) + 1
+                if len(hits) == len(self.keywords):
+                    break
+
+        return {self.keywords[idx]: hits[idx] for idx in sorted(hits)}
+
+
+def get_matcher(keywords: Iterable[str]) -> KeywordMatcher:
+    """
+    Gibt einen (geteilten) Matcher für die Keyword-Liste zurück.
+
+    Der Automat wird pro Keyword-Liste nur einmal gebaut, auch wenn die
+    Konfiguration bei jeder Gewichtsänderung neu abgeleitet wird.
+
+    Args:
+        keywords: Keywords in Konfigurations-Reihenfolge
+    """
+    return _cached_matcher(tuple(keywords))
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
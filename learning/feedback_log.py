@@ -0,0 +1,87 @@
+# learning/feedback_log.py
+# Kompaktes, dauerhaftes Feedback-Log (Spalten-Records, per memmap gelesen)
+
+import logging
+import os
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Reihenfolge der Score-Spalte
+SCORE_KEYS = ("AR", "TP", "DOC", "PHOTO")
+
+# Ein Feedback = 80 Bytes (Klassennamen bis 16 Bytes UTF-8, Scores exakt als float64)
+FEEDBACK_DTYPE = np.dtype([
+    ("predicted", "S16"),
+    ("correct", "S16"),
+    ("scores", "<f8", (len(SCORE_KEYS),)),
+    ("confidence", "<f8"),
+    ("timestamp", "<f8"),
+])
+
+
+class FeedbackLog:
+    """
+    Append-only Datei mit festen Records statt einer Liste von Dicts.
+
+    Geschrieben wird per Anhängen (ein write je Feedback), gelesen beim
+    Start per np.memmap ohne die Datei komplett in Python-Objekte zu laden.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Pfad der Log-Datei (wird bei Bedarf angelegt)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, predicted: str, correct: str, scores: Dict, confidence: float, timestamp: float):
+        """Hängt ein Feedback als Record an."""
+        record = np.zeros(1, dtype=FEEDBACK_DTYPE)
+        record["predicted"] = str(predicted).encode("utf-8")[:16]
+        record["correct"] = str(correct).encode("utf-8")[:16]
+        record["scores"] = [float(scores.get(key, np.nan)) for key in SCORE_KEYS]
+        record["confidence"] = float(confidence or 0.0)
+        record["timestamp"] = timestamp
+
+        with open(self.path, "ab") as f:
+            f.write(record.tobytes())
+
+    def read(self) -> np.ndarray:
+        """
+        Alle vollständigen Records (read-only memmap, leer falls keine Datei).
+
+        Returns:
+            Structured array mit FEEDBACK_DTYPE
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.zeros(0, dtype=FEEDBACK_DTYPE)
+
+        count = size // FEEDBACK_DTYPE.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=FEEDBACK_DTYPE)
+        if size % FEEDBACK_DTYPE.itemsize:
+            logger.warning(f"Ignoring truncated record at end of {self.path}")
+        return np.memmap(self.path, dtype=FEEDBACK_DTYPE, mode="r", shape=(count,))
+
+    def truncate(self):
+        """Leert das Log."""
+        with open(self.path, "wb"):
+            pass
+
+
+def decode_class(value: bytes) -> str:
+    """Klassenname aus einem S16-Feld."""
+    return value.decode("utf-8", errors="replace")
+
+
+def scores_dict(row: np.ndarray) -> Dict[str, float]:
+    """Score-Spalte eines Records als Dict (fehlende Scores ausgelassen)."""
+    return {key: float(v) for key, v in zip(SCORE_KEYS, row.tolist()) if v == v}
@@ -78,7 +78,7 @@ class FeedbackProcessor:
             if not feedback_stored:
                 logger.warning("Failed to store feedback in CI4")
 
-            # 3. Gewichte anpassen
+            # 3. Gewichte anpassen (gesammelt, Snapshot nur am Sync-Intervall)
             updated_weights = self.scoring_engine.adjust_weights_from_feedback(
                 original,
                 feedback_data
@@ -86,10 +86,9 @@ class FeedbackProcessor:
 
             # 4. Bei genug Feedbacks: Gewichte an CI4 senden
             feedback_count = self.scoring_engine.feedback_count
-            weight_update_interval = config.LEARNING_CONFIG["weight_update_interval"]
 
             weights_updated = False
-            if feedback_count % weight_update_interval == 0:
+            if updated_weights is not None:
                 logger.info(f"Updating weights in CI4 (feedback count: {feedback_count})")
                 update_result = ci4_client.update_model_weights(
                     updated_weights,
@@ -126,6 +125,10 @@ class FeedbackProcessor:
         """
         return self.scoring_engine.get_statistics()
 
+    def flush(self):
+        """Wendet noch gesammelte Gewichts-Updates an (z.B. beim Shutdown)."""
+        self.scoring_engine.flush()
+
     def reset_learning(self):
         """
         Reset Learning-Historie (Admin-Funktion).
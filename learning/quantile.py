@@ -0,0 +1,94 @@
+# learning/quantile.py
+# Online-Quantil-Schätzung (P²-Algorithmus, Jain & Chlamtac 1985)
+
+import math
+from typing import List
+
+
+class P2Quantile:
+    """
+    Schätzt ein Quantil laufend mit fünf Markern statt aller Werte.
+
+    Jedes add() kostet O(1) Zeit und der Speicher bleibt konstant. Bis
+    einschließlich fünf Werten wird das Quantil exakt (lineare
+    Interpolation wie np.percentile) berechnet.
+    """
+
+    def __init__(self, quantile: float):
+        """
+        Args:
+            quantile: Gesuchtes Quantil in (0, 1), z.B. 0.25
+        """
+        if not 0.0 < quantile < 1.0:
+            raise ValueError(f"quantile must be in (0, 1), got {quantile}")
+
+        self.quantile = quantile
+        self.count = 0
+        p = quantile
+        self._heights: List[float] = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, value: float):
+        """Nimmt einen Wert in die Schätzung auf."""
+        value = float(value)
+        self.count += 1
+        q = self._heights
+
+        # Anlaufphase: die ersten fünf Werte sortiert sammeln
+        if self.count <= 5:
+            q.append(value)
+            q.sort()
+            return
+
+        # Zelle finden und Extrem-Marker anpassen
+        if value < q[0]:
+            q[0] = value
+            cell = 0
+        elif value >= q[4]:
+            q[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= q[cell + 1]:
+                cell += 1
+
+        n = self._positions
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Innere Marker höchstens um eine Position verschieben
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        """Stückweise parabolische (P²) Vorhersage für Marker i."""
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> float:
+        """Aktuelle Schätzung (NaN ohne Werte)."""
+        if self.count == 0:
+            return math.nan
+        if self.count <= 5:
+            # Exakt, lineare Interpolation zwischen den Rangwerten
+            rank = self.quantile * (self.count - 1)
+            lower = int(rank)
+            upper = min(lower + 1, self.count - 1)
+            frac = rank - lower
+            return self._heights[lower] + frac * (self._heights[upper] - self._heights[lower])
+        return self._heights[2]
@@ -2,14 +2,28 @@
 # Adaptive Gewichtsanpassung basierend auf User-Feedback
 
 import logging
-from typing import Dict, List, Tuple
+import math
+import threading
+from typing import Deque, Dict, List, Optional, Tuple
 from datetime import datetime
-from collections import Counter
-import numpy as np
+from collections import Counter, deque
 from config import config
+from learning.feedback_log import FeedbackLog, decode_class, scores_dict
+from learning.quantile import P2Quantile
 
 logger = logging.getLogger(__name__)
 
+# Mapping von Klassennamen zu Score-/Gewichts-Keys
+CLASS_TO_KEY = {
+    'arbeitsbericht': 'AR',
+    'typeplate': 'TP',
+    'document': 'DOC',
+    'photo': 'PHOTO'
+}
+
+# Vermeide dass Gewichte zu klein werden
+MIN_WEIGHT = 0.1
+
 
 class AdaptiveScoringEngine:
     """
@@ -21,19 +35,41 @@ class AdaptiveScoringEngine:
       - Falsche Klasse: Gewichte reduzieren (-10%)
       - Richtige Klasse: Gewichte verstärken (+10%)
     - Alle 50 Feedbacks: Schwellwerte neu berechnen
+
+    Die multiplikativen Updates werden als Summe von log(1 + factor) je
+    Klasse gesammelt und per flush() mit einer Operation je Klasse
+    angewendet (gleiches Produkt): alle weight_batch_size Feedbacks, am
+    CI4-Sync-Intervall (weight_update_interval) und beim Shutdown.
     """
 
     def __init__(self):
-        self.feedback_history: List[Dict] = []
+        # Nur die letzten Einträge vollständig, Statistiken laufend gezählt
+        self.feedback_history: Deque[Dict] = deque(
+            maxlen=config.LEARNING_CONFIG.get("recent_feedback_size", 10)
+        )
+        self._reset_counters()
         self.learning_rate = config.LEARNING_CONFIG["learning_rate"]
         self.feedback_count = 0
         self.weights_version = 1
+        self._pending_updates: Dict[str, float] = dict.fromkeys(CLASS_TO_KEY.values(), 0.0)
+        self._pending_clamp: set = set()  # Klassen mit Penalisierung -> MIN_WEIGHT anwenden
+        self._pending_count = 0  # Feedbacks seit dem letzten flush
+        # flush() läuft beim Shutdown aus dem Event-Loop, Feedback im Executor
+        self._pending_lock = threading.RLock()
+        # Score-Quantil der korrekten Klasse, laufend geschätzt (O(1) je Feedback)
+        self._score_quantiles = self._new_quantiles()
+
+        # Optionales dauerhaftes Log: Statistiken nach einem Neustart wiederherstellen
+        log_path = config.LEARNING_CONFIG.get("feedback_log_path")
+        self._log = FeedbackLog(log_path) if log_path else None
+        if self._log is not None:
+            self._replay_log()
 
     def adjust_weights_from_feedback(
         self,
         classification_data: dict,
         feedback: dict
-    ) -> dict:
+    ) -> Optional[dict]:
         """
         Passt Gewichte basierend auf einzelnem Feedback an.
 
@@ -42,164 +78,191 @@ class AdaptiveScoringEngine:
             feedback: User-Korrektur
 
         Returns:
-            Updated weights dictionary
+            Snapshot der (geflushten) Gewichte, wenn dieses Feedback das
+            CI4-Sync-Intervall erreicht, sonst None
         """
+        # Einmal binden (config_manager kann das Dict zur Laufzeit ersetzen)
+        learning = config.LEARNING_CONFIG
         predicted = classification_data['prediction']['class']
         correct = feedback['user_correction']['corrected_class']
         scores = classification_data['prediction']['scores']
 
         # Feedback speichern
-        feedback_entry = {
-            'predicted': predicted,
-            'correct': correct,
-            'scores': scores,
-            'timestamp': datetime.now().isoformat(),
-            'confidence': classification_data['prediction']['confidence']
-        }
-        self.feedback_history.append(feedback_entry)
-        self.feedback_count += 1
+        now = datetime.now()
+        confidence = classification_data['prediction']['confidence']
+        self._record(predicted, correct, scores, now.isoformat(), confidence)
+        if self._log is not None:
+            self._log.append(predicted, correct, scores, confidence, now.timestamp())
 
         logger.info(f"Feedback #{self.feedback_count}: Predicted={predicted}, Correct={correct}")
 
-        # Gewichte anpassen
-        if predicted == correct:
-            # Korrekte Vorhersage → Verstärken
-            logger.info("Correct prediction - reinforcing weights")
-            self._reinforce_weights(predicted, scores, factor=config.LEARNING_CONFIG["reinforce_factor"])
-        else:
-            # Falsche Vorhersage → Penalisieren + Belohnen
-            logger.info(f"Incorrect prediction - penalizing {predicted}, rewarding {correct}")
-            self._penalize_weights(predicted, scores, factor=config.LEARNING_CONFIG["penalize_factor"])
-            self._reinforce_weights(correct, scores, factor=config.LEARNING_CONFIG["reward_factor"])
+        with self._pending_lock:
+            # Gewichte anpassen
+            if predicted == correct:
+                # Korrekte Vorhersage → Verstärken
+                logger.info("Correct prediction - reinforcing weights")
+                self._reinforce_weights(predicted, scores, factor=learning["reinforce_factor"])
+            else:
+                # Falsche Vorhersage → Penalisieren + Belohnen
+                logger.info(f"Incorrect prediction - penalizing {predicted}, rewarding {correct}")
+                self._penalize_weights(predicted, scores, factor=learning["penalize_factor"])
+                self._reinforce_weights(correct, scores, factor=learning["reward_factor"])
+
+            # Gesammelte Updates alle weight_batch_size Feedbacks und vor dem CI4-Sync anwenden
+            self._pending_count += 1
+            sync_due = self.feedback_count % learning["weight_update_interval"] == 0
+            if sync_due or self._pending_count >= learning.get("weight_batch_size", 1):
+                self.flush()
 
         # Alle 50 Feedbacks: Schwellwerte optimieren
-        if self.feedback_count % config.LEARNING_CONFIG["threshold_recalc_interval"] == 0:
+        if self.feedback_count % learning["threshold_recalc_interval"] == 0:
             logger.info("Recalculating thresholds based on feedback history")
             self._recalculate_thresholds()
             self.weights_version += 1
 
-        return config.WEIGHTS
+        if not sync_due:
+            return None
+        # Kopie für den Sync (WEIGHTS wird von späteren flushes in-place geändert)
+        return {category: dict(values) for category, values in config.WEIGHTS.items()}
+
+    def flush(self):
+        """
+        Wendet alle gesammelten Gewichts-Updates an (eine Operation je Klasse).
+
+        Läuft automatisch im Batch-Takt und vor dem CI4-Sync; beim
+        Shutdown aufzurufen, sonst gehen noch offene Feedbacks verloren.
+        """
+        with self._pending_lock:
+            for key, log_factor in self._pending_updates.items():
+                if log_factor == 0.0 and key not in self._pending_clamp:
+                    continue
+
+                minimum = MIN_WEIGHT if key in self._pending_clamp else None
+                if config.scale_weights(key, math.expm1(log_factor), minimum=minimum):
+                    logger.debug("Applied %s weight update x%.4f", key, math.exp(log_factor))
+                self._pending_updates[key] = 0.0
+
+            self._pending_clamp.clear()
+            self._pending_count = 0
 
     def _reinforce_weights(self, class_name: str, scores: dict, factor: float):
         """
-        Verstärkt Gewichte für eine Klasse.
+        Merkt eine Verstärkung der Gewichte einer Klasse vor (siehe flush).
 
         Args:
             class_name: Klassen-Name (arbeitsbericht, typeplate, document, photo)
             scores: Score-Dictionary (AR, TP, DOC, PHOTO)
             factor: Verstärkungsfaktor (z.B. 0.05 = 5% Erhöhung)
         """
-        # Mapping von Klassennamen zu Score-Keys
-        class_to_key = {
-            'arbeitsbericht': 'AR',
-            'typeplate': 'TP',
-            'document': 'DOC',
-            'photo': 'PHOTO'
-        }
-
-        if class_name not in class_to_key:
+        if class_name not in CLASS_TO_KEY:
             logger.warning(f"Unknown class name: {class_name}")
             return
 
-        key = class_to_key[class_name]
+        key = CLASS_TO_KEY[class_name]
 
-        # Gewichte der entsprechenden Klasse erhöhen
-        if key in config.WEIGHTS:
-            for weight_key in config.WEIGHTS[key]:
-                if isinstance(config.WEIGHTS[key][weight_key], (int, float)):
-                    old_value = config.WEIGHTS[key][weight_key]
-                    new_value = old_value * (1 + factor)
-                    config.WEIGHTS[key][weight_key] = new_value
-                    logger.debug(f"Reinforced {key}.{weight_key}: {old_value:.3f} → {new_value:.3f}")
+        # Gewichte der entsprechenden Klasse erhöhen (beim nächsten flush)
+        self._pending_updates[key] += math.log1p(factor)
 
     def _penalize_weights(self, class_name: str, scores: dict, factor: float):
         """
-        Reduziert Gewichte für eine Klasse.
+        Merkt eine Reduktion der Gewichte einer Klasse vor (siehe flush).
 
         Args:
             class_name: Klassen-Name
             scores: Score-Dictionary
             factor: Penalisierungs-Faktor (z.B. -0.1 = 10% Reduktion)
         """
-        class_to_key = {
-            'arbeitsbericht': 'AR',
-            'typeplate': 'TP',
-            'document': 'DOC',
-            'photo': 'PHOTO'
-        }
-
-        if class_name not in class_to_key:
+        if class_name not in CLASS_TO_KEY:
             logger.warning(f"Unknown class name: {class_name}")
             return
 
-        key = class_to_key[class_name]
-
-        # Gewichte reduzieren (aber nicht unter Minimum)
-        MIN_WEIGHT = 0.1  # Vermeide dass Gewichte zu klein werden
+        key = CLASS_TO_KEY[class_name]
 
-        if key in config.WEIGHTS:
-            for weight_key in config.WEIGHTS[key]:
-                if isinstance(config.WEIGHTS[key][weight_key], (int, float)):
-                    old_value = config.WEIGHTS[key][weight_key]
-                    new_value = max(old_value * (1 + factor), MIN_WEIGHT)
-                    config.WEIGHTS[key][weight_key] = new_value
-                    logger.debug(f"Penalized {key}.{weight_key}: {old_value:.3f} → {new_value:.3f}")
+        # Gewichte reduzieren (aber beim flush nicht unter Minimum)
+        self._pending_updates[key] += math.log1p(factor)
+        self._pending_clamp.add(key)
 
     def _recalculate_thresholds(self):
         """
         Berechnet optimale Schwellwerte basierend auf Feedback-Historie.
 
         Verwendet einfache Statistik-basierte Optimierung:
-        - Berechnet Score-Verteilungen für jede Klasse
-        - Setzt Schwellwerte basierend auf Median/Quantilen
+        - Score-Verteilung jeder Klasse als laufende P²-Quantil-Schätzung
+        - Setzt Schwellwerte basierend auf dem 25%-Quantil
         """
-        if len(self.feedback_history) < config.LEARNING_CONFIG["min_feedback_for_update"]:
+        if self.feedback_count < config.LEARNING_CONFIG["min_feedback_for_update"]:
             logger.info("Not enough feedback for threshold recalculation")
             return
 
-        # Gruppiere Feedback nach korrekter Klasse
-        class_scores = {
-            'arbeitsbericht': [],
-            'typeplate': [],
-            'document': [],
-            'photo': []
-        }
+        thresholds = config.THRESHOLDS
 
-        for entry in self.feedback_history:
-            correct_class = entry['correct']
-            scores = entry['scores']
-
-            # Mapping von Klasse zu Score-Key
-            class_to_score_key = {
-                'arbeitsbericht': 'AR',
-                'typeplate': 'TP',
-                'document': 'DOC',
-                'photo': 'PHOTO'
-            }
-
-            if correct_class in class_to_score_key:
-                score_key = class_to_score_key[correct_class]
-                if score_key in scores:
-                    class_scores[correct_class].append(scores[score_key])
-
-        # Berechne neue Schwellwerte (25. Perzentil)
+        # Neue Schwellwerte (25. Perzentil der Scores je korrekter Klasse)
         # Damit werden 75% der korrekten Vorhersagen erkannt
-        for class_name, scores in class_scores.items():
-            if len(scores) >= 5:  # Mindestens 5 Samples
-                scores_array = np.array(scores)
-                # 25. Perzentil als Schwellwert (konservativ)
-                new_threshold = np.percentile(scores_array, 25)
+        for class_name, estimator in self._score_quantiles.items():
+            if estimator.count >= 5:  # Mindestens 5 Samples
+                # 25. Perzentil als Schwellwert (konservativ), ohne Scan der Historie
+                new_threshold = estimator.value
 
-                old_threshold = config.THRESHOLDS.get(class_name, 0.0)
+                old_threshold = thresholds.get(class_name, 0.0)
 
                 # Nur anpassen wenn Änderung signifikant (>10%)
                 if abs(new_threshold - old_threshold) / max(old_threshold, 0.1) > 0.1:
-                    config.THRESHOLDS[class_name] = round(float(new_threshold), 2)
+                    thresholds[class_name] = round(float(new_threshold), 2)
+                    config.mark_changed()
                     logger.info(
                         f"Updated threshold for {class_name}: "
                         f"{old_threshold:.2f} → {new_threshold:.2f}"
                     )
 
+    def _record(self, predicted: str, correct: str, scores: dict, timestamp: str, confidence: float):
+        """Nimmt ein Feedback in Historie, Zähler und Quantil-Schätzer auf."""
+        self.feedback_history.append({
+            'predicted': predicted,
+            'correct': correct,
+            'scores': scores,
+            'timestamp': timestamp,
+            'confidence': confidence
+        })
+        self._count_feedback(predicted, correct)
+        self.feedback_count += 1
+
+        score_key = CLASS_TO_KEY.get(correct)
+        if score_key is not None and score_key in scores:
+            self._score_quantiles[correct].add(scores[score_key])
+
+    def _replay_log(self):
+        """Baut Statistiken und Schwellwert-Schätzer aus dem Feedback-Log auf (ohne Gewichte)."""
+        records = self._log.read()
+        for row in records:
+            self._record(
+                decode_class(row["predicted"]),
+                decode_class(row["correct"]),
+                scores_dict(row["scores"]),
+                datetime.fromtimestamp(float(row["timestamp"])).isoformat(),
+                float(row["confidence"])
+            )
+        if len(records):
+            logger.info(f"Restored {len(records)} feedback entries from {self._log.path}")
+
+    def _reset_counters(self):
+        """Setzt die laufenden Statistik-Zähler zurück."""
+        self._n_correct = 0
+        self._predicted_counts: Counter = Counter()
+        self._correct_counts: Counter = Counter()
+        self._confusion: Counter = Counter()
+
+    def _count_feedback(self, predicted: str, correct: str):
+        """Aktualisiert Genauigkeit, Klassen-Verteilung und Confusion-Matrix."""
+        self._n_correct += predicted == correct
+        self._predicted_counts[predicted] += 1
+        self._correct_counts[correct] += 1
+        self._confusion[f"{predicted} -> {correct}"] += 1
+
+    @staticmethod
+    def _new_quantiles() -> Dict[str, P2Quantile]:
+        """Ein 25%-Quantil-Schätzer je Klasse."""
+        return {class_name: P2Quantile(0.25) for class_name in CLASS_TO_KEY}
+
     def get_statistics(self) -> dict:
         """
         Gibt Statistiken über das Learning zurück.
@@ -210,55 +273,54 @@ class AdaptiveScoringEngine:
                 "accuracy": 0.85,
                 "class_distribution": {...},
                 "confusion_matrix": {...},
-                "weights_version": 3
+                "weights_version": 3,
+                "pending_weight_updates": 5
             }
         """
-        if not self.feedback_history:
+        n = self.feedback_count
+        if n == 0:
             return {
                 "total_feedback": 0,
                 "accuracy": 0.0,
                 "class_distribution": {},
-                "weights_version": self.weights_version
+                "weights_version": self.weights_version,
+                "pending_weight_updates": self._pending_count
             }
 
-        # Genauigkeit berechnen
-        correct_predictions = sum(
-            1 for entry in self.feedback_history
-            if entry['predicted'] == entry['correct']
-        )
-        accuracy = correct_predictions / len(self.feedback_history)
-
-        # Klassen-Verteilung
-        predicted_classes = [entry['predicted'] for entry in self.feedback_history]
-        correct_classes = [entry['correct'] for entry in self.feedback_history]
-
+        # Alle Werte werden in adjust_weights_from_feedback mitgezählt (O(1))
+        accuracy = self._n_correct / n
         class_distribution = {
-            'predicted': dict(Counter(predicted_classes)),
-            'correct': dict(Counter(correct_classes))
+            'predicted': dict(self._predicted_counts),
+            'correct': dict(self._correct_counts)
         }
-
-        # Einfache Confusion-Matrix
-        confusion = {}
-        for entry in self.feedback_history:
-            key = f"{entry['predicted']} -> {entry['correct']}"
-            confusion[key] = confusion.get(key, 0) + 1
+        confusion = dict(self._confusion)
 
         return {
-            "total_feedback": len(self.feedback_history),
+            "total_feedback": n,
             "accuracy": round(accuracy, 3),
             "class_distribution": class_distribution,
             "confusion_matrix": confusion,
             "weights_version": self.weights_version,
+            # Feedbacks, deren Gewichts-Updates noch nicht angewendet sind
+            "pending_weight_updates": self._pending_count,
             "current_thresholds": config.THRESHOLDS.copy(),
-            "recent_feedback": self.feedback_history[-10:]  # Letzte 10 Feedbacks
+            "recent_feedback": list(self.feedback_history)  # Letzte 10 Feedbacks
         }
 
     def reset_learning(self):
         """Reset Learning-Historie (für Testing oder Rollback)."""
         logger.warning("Resetting learning history")
-        self.feedback_history = []
+        self.feedback_history.clear()
+        self._reset_counters()
+        if self._log is not None:
+            self._log.truncate()
         self.feedback_count = 0
-        # Gewichte NICHT zurücksetzen - nur Historie
+        self._score_quantiles = self._new_quantiles()
+        # Gewichte NICHT zurücksetzen - nur Historie (und noch offene Updates)
+        with self._pending_lock:
+            self._pending_updates = dict.fromkeys(CLASS_TO_KEY.values(), 0.0)
+            self._pending_clamp.clear()
+            self._pending_count = 0
 
 
 # Singleton-Instanz
@@ -0,0 +1,93 @@
+# models/clip_batcher.py
+# Micro-Batching für CLIP: bündelt gleichzeitige Requests zu einem Forward-Pass
+
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CLIPBatcher:
+    """
+    Sammelt gleichzeitig eintreffende Bilder und verarbeitet sie gemeinsam.
+
+    Ein Hintergrund-Task wartet höchstens max_wait_ms auf bis zu batch_size
+    Einträge, ruft batch_fn einmal mit der ganzen Liste auf (im Executor,
+    damit der Event-Loop frei bleibt) und verteilt die Ergebnisse an die
+    wartenden Aufrufer.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            batch_fn: Verarbeitet eine Liste von Eingaben, liefert gleich lange Ergebnisliste
+            batch_size: Maximale Batch-Größe
+            max_wait_ms: Maximale Wartezeit auf weitere Einträge
+            executor: Executor für batch_fn (None = Default-Executor des Loops)
+        """
+        self.batch_fn = batch_fn
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Reiht einen Eintrag ein und wartet auf dessen Ergebnis.
+
+        Args:
+            item: Eingabe für batch_fn (z.B. PIL Image)
+
+        Returns:
+            Das zugehörige Ergebnis aus batch_fn
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _ensure_worker(self):
+        """Startet den Hintergrund-Task im aktuell laufenden Loop."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        """Sammelt Batches und verarbeitet sie nacheinander."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            except Exception as e:
+                logger.error("CLIP batch of %d failed: %s", len(items), e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
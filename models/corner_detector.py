@@ -4,8 +4,17 @@
 import cv2
 import numpy as np
 from PIL import Image
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Union
 from config import config
+from features.image_arrays import ImageArrays, OPENCL_AVAILABLE
+
+def _scaled_ksize(ksize: int, scale: float) -> int:
+    """Ungerade Kernelgröße (>= 1) für ein um scale verkleinertes Bild."""
+    if scale == 1.0:
+        return ksize
+    scaled = max(1, round(ksize * scale))
+    return scaled if scaled % 2 else scaled + 1
+
 
 class CornerDetector:
     """
@@ -20,12 +29,12 @@ class CornerDetector:
     def __init__(self):
         self.config = config.CORNER_DETECTION
 
-    def detect_4_corners(self, image: np.ndarray) -> Dict:
+    def detect_4_corners(self, image: Union[np.ndarray, ImageArrays]) -> Dict:
         """
         Erkennt 4 Eckpunkte eines Dokuments/Typenschilds.
 
         Args:
-            image: Numpy array (RGB oder BGR)
+            image: Numpy array (RGB) oder ImageArrays (teilt Graustufen-Puffer)
 
         Returns:
             {
@@ -39,11 +48,13 @@ class CornerDetector:
                 "confidence": 0.92
             }
         """
+        image = ImageArrays.ensure(image)
+
         # Methode 1: Kontur-basiert (primär)
         corners, confidence = self._detect_corners_contour(image)
         if corners is not None and len(corners) == 4:
             ordered = self._order_points_clockwise(corners)
-            return self._format_response(ordered, "contour_based", confidence)
+            return self._format_response(self._to_full_resolution(ordered, image), "contour_based", confidence)
 
         # Methode 2: Harris Corner Detection (fallback)
         corners, confidence = self._detect_corners_harris(image)
@@ -51,43 +62,29 @@ class CornerDetector:
             selected = self._select_best_4_corners(corners, image.shape)
             if selected is not None:
                 ordered = self._order_points_clockwise(selected)
-                return self._format_response(ordered, "harris", confidence)
+                return self._format_response(self._to_full_resolution(ordered, image), "harris", confidence)
 
         # Methode 3: Bildbegrenzung (last resort)
-        corners = self._get_image_bounds(image.shape)
+        corners = self._get_image_bounds(image.full_shape)
         return self._format_response(corners, "image_bounds", 0.1)
 
-    def _detect_corners_contour(self, image: np.ndarray) -> Tuple[Optional[np.ndarray], float]:
+    def _detect_corners_contour(self, image: ImageArrays) -> Tuple[Optional[np.ndarray], float]:
         """
         Kontur-basierte Eckpunkt-Erkennung.
 
         Returns:
             (corners, confidence) oder (None, 0.0)
         """
-        # Zu Graustufen konvertieren
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image.copy()
-
-        # Preprocessing
-        blurred = cv2.GaussianBlur(
-            gray,
-            (self.config["gaussian_blur_ksize"], self.config["gaussian_blur_ksize"]),
-            0
-        )
-
-        # Edge Detection
-        edges = cv2.Canny(
-            blurred,
-            self.config["canny_low"],
-            self.config["canny_high"]
-        )
-
-        # Morphological Closing (um Lücken zu schließen)
-        kernel_size = self.config["morphology_ksize"]
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
-        closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+        closed = None
+        if OPENCL_AVAILABLE and cv2.ocl.useOpenCL():
+            try:
+                # Blur/Canny/Closing bleiben als UMat auf dem Gerät, nur das
+                # Ergebnis wird für findContours zurückgeholt
+                closed = self._closed_edges(cv2.UMat(image.gray), image.scale).get()
+            except cv2.error:
+                closed = None  # Treiberproblem -> CPU
+        if closed is None:
+            closed = self._closed_edges(image.gray, image.scale)
 
         # Konturen finden
         contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -127,27 +124,49 @@ class CornerDetector:
 
         return None, 0.0
 
-    def _detect_corners_harris(self, image: np.ndarray) -> Tuple[Optional[np.ndarray], float]:
+    def _closed_edges(self, gray, scale: float = 1.0):
         """
-        Harris Corner Detection (fallback).
+        Blur -> Canny -> Morphological Closing.
+
+        Args:
+            gray: Graustufenbild als Numpy array oder cv2.UMat (OpenCL)
+            scale: Verkleinerungsfaktor des Analysebildes (Kernelgrößen sind
+                in Original-Pixeln konfiguriert)
 
         Returns:
-            (corners, confidence) oder (None, 0.0)
+            Geschlossenes Kantenbild im selben Typ wie gray
         """
-        # Zu Graustufen
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image.copy()
+        # Preprocessing
+        blur_ksize = _scaled_ksize(self.config["gaussian_blur_ksize"], scale)
+        blurred = cv2.GaussianBlur(gray, (blur_ksize, blur_ksize), 0)
+
+        # Edge Detection
+        edges = cv2.Canny(
+            blurred,
+            self.config["canny_low"],
+            self.config["canny_high"]
+        )
 
-        gray = gray.astype(np.float32)
+        # Morphological Closing (um Lücken zu schließen)
+        kernel_size = _scaled_ksize(self.config["morphology_ksize"], scale)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+        return cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+
+    def _detect_corners_harris(self, image: ImageArrays) -> Tuple[Optional[np.ndarray], float]:
+        """
+        Harris Corner Detection (fallback).
 
-        # Shi-Tomasi Corner Detection (Verbesserung von Harris)
+        Returns:
+            (corners, confidence) oder (None, 0.0)
+        """
+        # Shi-Tomasi Corner Detection (Verbesserung von Harris); uint8 direkt,
+        # eine float32-Kopie liefert dieselben Ecken. Mindestabstand ist in
+        # Original-Pixeln konfiguriert -> auf das Analysebild skalieren
         corners = cv2.goodFeaturesToTrack(
-            gray,
+            image.gray,
             maxCorners=self.config["harris_max_corners"],
             qualityLevel=self.config["harris_quality"],
-            minDistance=self.config["harris_min_distance"]
+            minDistance=max(1.0, self.config["harris_min_distance"] * image.scale)
         )
 
         if corners is None or len(corners) < 4:
@@ -185,12 +204,33 @@ class CornerDetector:
             center = np.array([w/2, h/2])
             distances = np.linalg.norm(points - center, axis=1)
 
-            # Wähle 4 Punkte mit größter Distanz (äußere Ecken)
-            indices = np.argsort(distances)[-4:]
+            # Wähle 4 Punkte mit größter Distanz (äußere Ecken, Reihenfolge
+            # egal - wird danach im Uhrzeigersinn geordnet)
+            indices = np.argpartition(distances, -4)[-4:]
             return points[indices]
 
         return None
 
+    def _to_full_resolution(self, corners: np.ndarray, image: ImageArrays) -> np.ndarray:
+        """
+        Rechnet Eckpunkte eines verkleinerten Bildes auf Originalkoordinaten um.
+
+        Args:
+            corners: Numpy array (4, 2) im verkleinerten Bild
+            image: ImageArrays mit scale und full_shape
+
+        Returns:
+            Numpy array (4, 2) in Originalkoordinaten
+        """
+        if image.scale == 1.0:
+            return corners
+
+        h, w = image.full_shape[:2]
+        full = np.rint(corners / image.scale)
+        full[:, 0] = np.clip(full[:, 0], 0, w - 1)
+        full[:, 1] = np.clip(full[:, 1], 0, h - 1)
+        return full
+
     def _get_image_bounds(self, image_shape: Tuple) -> np.ndarray:
         """
         Gibt Bildränder als Fallback-Eckpunkte zurück.
@@ -213,7 +253,14 @@ class CornerDetector:
         Returns:
             Geordnetes numpy array (4, 2)
         """
-        # Sortiere nach y-Koordinate
+        # Geschlossene Form: TL = min(x+y), BR = max(x+y), TR = min(y-x), BL = max(y-x)
+        s = pts.sum(axis=1)
+        d = pts[:, 1] - pts[:, 0]
+        order = [s.argmin(), d.argmin(), s.argmax(), d.argmax()]
+        if len(set(order)) == 4:
+            return pts[order]
+
+        # Mehrdeutig (z.B. um ~45° gedrehtes Viereck): nach y, dann x sortieren
         sorted_pts = pts[np.argsort(pts[:, 1])]
 
         # Obere 2 Punkte
@@ -1,11 +1,145 @@
 # models/ocr_analyzer.py
 # OCR-Analyse mit verbesserter Arbeitsbericht-Erkennung
 
+import os
 import re
-from typing import Tuple, Dict
+import threading
+import logging
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from PIL import Image
-import pytesseract
 from config import config
+from keyword_matcher import KeywordMatcher
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = None
+    NUMBA_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def count_digits(text: str) -> int:
+    """
+    Zählt Ziffern (Semantik wie str.isdigit) ohne Python-Schleife pro Zeichen.
+
+    Reiner ASCII-Text (der Normalfall bei OCR) wird als Byte-Array in NumPy
+    gezählt; sonst str.isdigit über map (Unicode-Ziffern wie "²").
+    """
+    if text.isascii():
+        arr = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        return int(np.count_nonzero((arr - 48) < 10))  # uint8-Überlauf: nur '0'-'9' < 10
+    return sum(map(str.isdigit, text))
+
+
+# Datumsformate DD.MM.YYYY / DD. MM. YYYY / DD/MM/YYYY / YYYY-MM-DD als eine Alternation
+_DATE_RE = re.compile(r'\d{1,2}(?:\.\s*\d{1,2}\.\s*|/\d{1,2}/)\d{4}|\d{4}-\d{2}-\d{2}')
+
+# Voltage/Frequenz/Leistung (z.B. "230V", "50Hz", "1.5kW") in einem Durchlauf
+_TECH_RE = re.compile(
+    r'(?P<voltage>\d+\s*[vV])|(?P<frequency>\d+\s*[hH][zZ])|(?P<power>\d+\.?\d*\s*[kK]?[wW])'
+)
+
+_MAIN_KEYWORD = "arbeitsbericht"
+
+# Seriennummer-/Modell-Muster (ein Automat statt acht Teilstring-Suchen)
+_SERIAL_PATTERNS = ("serial", "s/n", "ser.", "serial no")
+_MODEL_PATTERNS = ("model", "type", "mod.", "model no")
+_SPEC_MATCHER = KeywordMatcher(_SERIAL_PATTERNS + _MODEL_PATTERNS)
+
+_PUNCTUATION = '.,;:!?-()[]{}"\''
+
+# Zeichenklassen als Bit-Flags je ASCII-Byte (aus den str-Methoden abgeleitet,
+# damit die Semantik identisch bleibt, z.B. isspace für '\x1c'-'\x1f')
+_ALPHA, _DIGIT, _SPACE, _PUNCT, _UPPER = 1, 2, 4, 8, 16
+_ASCII_CLASSES = np.zeros(256, dtype=np.uint8)
+for _i in range(128):
+    _c = chr(_i)
+    _ASCII_CLASSES[_i] = (
+        _ALPHA * _c.isalpha() | _DIGIT * _c.isdigit() | _SPACE * _c.isspace()
+        | _PUNCT * (_c in _PUNCTUATION) | _UPPER * _c.isupper()
+    )
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, nogil=True)
+    def _count_ascii_classes(buf, classes):
+        """Ein Durchlauf über die Bytes, fünf Zähler aus den Klassen-Bits."""
+        alpha = digit = space = punct = upper = 0
+        for byte in buf:
+            flags = classes[byte]
+            alpha += flags & 1
+            digit += (flags >> 1) & 1
+            space += (flags >> 2) & 1
+            punct += (flags >> 3) & 1
+            upper += (flags >> 4) & 1
+        return alpha, digit, space, punct, upper
+
+    # Einmal beim Import kompilieren (bzw. aus dem Cache laden), nicht im Request
+    _count_ascii_classes(np.zeros(1, dtype=np.uint8), _ASCII_CLASSES)
+
+
+def count_char_classes(text: str) -> Dict[str, int]:
+    """
+    Zählt Buchstaben, Ziffern, Leerzeichen, Satzzeichen und Großbuchstaben
+    in einem Durchlauf.
+
+    ASCII-Text: ein Lookup-Table-Zugriff pro Byte, mit Numba in einer
+    kompilierten Schleife, sonst in NumPy. Sonst wird jedes verschiedene
+    Zeichen einmal klassifiziert (Counter zählt in C).
+
+    Returns:
+        {"alpha": ..., "digit": ..., "space": ..., "punct": ..., "upper": ...}
+    """
+    if text.isascii() and NUMBA_AVAILABLE:
+        buf = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        alpha, digit, space, punct, upper = _count_ascii_classes(buf, _ASCII_CLASSES)
+        return {
+            "alpha": int(alpha), "digit": int(digit), "space": int(space),
+            "punct": int(punct), "upper": int(upper)
+        }
+
+    if text.isascii():
+        flags = _ASCII_CLASSES[np.frombuffer(text.encode("ascii"), dtype=np.uint8)]
+        return {
+            name: int(np.count_nonzero(flags & bit))
+            for name, bit in (
+                ("alpha", _ALPHA), ("digit", _DIGIT), ("space", _SPACE),
+                ("punct", _PUNCT), ("upper", _UPPER)
+            )
+        }
+
+    counts = {"alpha": 0, "digit": 0, "space": 0, "punct": 0, "upper": 0}
+    for c, n in Counter(text).items():
+        if c.isalpha():
+            counts["alpha"] += n
+        if c.isdigit():
+            counts["digit"] += n
+        if c.isspace():
+            counts["space"] += n
+        if c in _PUNCTUATION:
+            counts["punct"] += n
+        if c.isupper():
+            counts["upper"] += n
+    return counts
+
+
+def _load_tesserocr():
+    """
+    Importiert tesserocr (In-Process C++ API) falls installiert.
+
+    Erst beim ersten OCR-Aufruf, damit OMP_THREAD_LIMIT bereits gesetzt ist.
+    """
+    try:
+        import tesserocr
+        return tesserocr
+    except ImportError:
+        logger.info("tesserocr not installed, using pytesseract subprocess")
+        return None
 
 
 class OCRAnalyzer:
@@ -22,6 +156,44 @@ class OCRAnalyzer:
         self.config = config.OCR_CONFIG
         self.arbeitsbericht_keywords = self.config["arbeitsbericht_keywords"]
         self.typeplate_keywords = self.config["typeplate_keywords"]
+        self._tesserocr = None
+        self._tesserocr_checked = False
+        self._local = threading.local()  # Eine PyTessBaseAPI pro Thread
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_api(self):
+        """
+        Gibt die tesserocr-API des aktuellen Threads zurück (oder None).
+
+        Die API hält Sprachmodell und Traineddata geladen, anders als der
+        pytesseract-Subprozess pro Aufruf.
+        """
+        if not self._tesserocr_checked:
+            self._tesserocr = _load_tesserocr()
+            self._tesserocr_checked = True
+        if self._tesserocr is None:
+            return None
+
+        lang = self.config["tesseract_lang"]
+        api = getattr(self._local, "api", None)
+        if api is None or self._local.lang != lang:
+            if api is not None:
+                api.End()
+            api = self._tesserocr.PyTessBaseAPI(lang=lang)
+            self._local.api = api
+            self._local.lang = lang
+        return api
+
+    def _image_to_string(self, image: Image.Image) -> str:
+        """OCR via tesserocr (In-Process) mit Fallback auf pytesseract."""
+        api = self._get_api()
+        if api is None:
+            import pytesseract
+            return pytesseract.image_to_string(image, lang=self.config["tesseract_lang"])
+
+        api.SetImage(image)
+        return api.GetUTF8Text()
 
     def analyze(self, image: Image.Image) -> Dict:
         """
@@ -40,7 +212,7 @@ class OCRAnalyzer:
             }
         """
         # OCR durchführen
-        text = pytesseract.image_to_string(image, lang=self.config["tesseract_lang"])
+        text = self._image_to_string(image)
 
         # Text-Metriken berechnen
         text_length = len(text.strip())
@@ -60,7 +232,65 @@ class OCRAnalyzer:
             "line_count": line_count
         }
 
-    def detect_arbeitsbericht(self, text: str) -> Tuple[float, Dict]:
+    def analyze_text(self, text: str) -> Tuple[Tuple[float, Dict], Dict]:
+        """
+        Arbeitsbericht- und Typenschild-Analyse mit einmal kleingeschriebenem Text.
+
+        Args:
+            text: OCR-extrahierter Text
+
+        Returns:
+            (detect_arbeitsbericht-Ergebnis, analyze_typeplate_features-Ergebnis)
+        """
+        t_low = text.lower()
+        return (
+            self.detect_arbeitsbericht(text, t_low),
+            self.analyze_typeplate_features(text, t_low)
+        )
+
+    def analyze_batch(
+        self,
+        images: List[Image.Image],
+        executor: Optional[Executor] = None
+    ) -> List[Dict]:
+        """
+        OCR für mehrere Bilder parallel.
+
+        tesserocr gibt während der Erkennung den GIL frei und jeder Worker
+        behält seine geladene API (Sprachmodell wird nur einmal pro Thread
+        initialisiert); pytesseract-Subprozesse laufen ebenfalls parallel.
+        Setzt OMP_THREAD_LIMIT=1 voraus (siehe classifier_service).
+
+        Args:
+            images: PIL Images
+            executor: Eigener Pool (None = interner Pool mit cpu_count Threads)
+
+        Returns:
+            Ergebnisse wie analyze, in Eingabe-Reihenfolge
+        """
+        pool = executor or self._get_pool()
+        return list(pool.map(self.analyze, images))
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Erzeugt den internen Thread-Pool beim ersten Bedarf (API je Worker vorgeladen)."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=os.cpu_count() or 1,
+                        thread_name_prefix="ocr",
+                        initializer=self._warm_api
+                    )
+        return self._pool
+
+    def _warm_api(self):
+        """Lädt die tesserocr-API im Worker vor (Fehler erst beim OCR-Aufruf melden)."""
+        try:
+            self._get_api()
+        except Exception as e:
+            logger.warning(f"Tesseract warm-up failed: {e}")
+
+    def detect_arbeitsbericht(self, text: str, t_low: Optional[str] = None) -> Tuple[float, Dict]:
         """
         Erkennt ob Text ein "Arbeitsbericht" ist.
 
@@ -71,27 +301,32 @@ class OCRAnalyzer:
 
         Args:
             text: OCR-extrahierter Text
+            t_low: Optional bereits kleingeschriebener Text
 
         Returns:
             (score, debug_info)
         """
-        t_low = text.lower()
+        if t_low is None:
+            t_low = text.lower()
+
+        # Alle Keywords in einem Durchlauf (Hauptkeyword inklusive)
+        matcher = config.get_arbeitsbericht_matcher()
+        positions = matcher.first_positions(t_low)
 
-        # Hauptkeyword prüfen (case-insensitive)
-        has_main_keyword = "arbeitsbericht" in t_low
+        # Hauptkeyword prüfen (case-insensitive); nur falls es nicht
+        # konfiguriert ist, separat suchen
+        if _MAIN_KEYWORD in matcher.keywords:
+            main_position = positions.get(_MAIN_KEYWORD, -1)
+        else:
+            main_position = t_low.find(_MAIN_KEYWORD)
+        has_main_keyword = main_position >= 0
 
         # Zusatz-Keywords zählen (ohne Hauptkeyword)
-        additional_keywords = self.arbeitsbericht_keywords[1:]  # Skip "arbeitsbericht"
-        keyword_hits = []
-
-        for kw in additional_keywords:
-            if kw in t_low:
-                # Position im Text finden
-                pos = t_low.index(kw)
-                keyword_hits.append({
-                    "keyword": kw,
-                    "position": pos
-                })
+        keyword_hits = [
+            {"keyword": kw, "position": pos}
+            for kw, pos in positions.items()
+            if kw != _MAIN_KEYWORD
+        ]
 
         # Textlänge prüfen
         text_length = len(text.strip())
@@ -113,15 +348,19 @@ class OCRAnalyzer:
             "keyword_details": keyword_hits,
             "text_length": text_length,
             "is_long_text": is_long_text,
-            "main_keyword_position": t_low.index("arbeitsbericht") if has_main_keyword else -1
+            "main_keyword_position": main_position
         }
 
         return score, debug_info
 
-    def analyze_typeplate_features(self, text: str) -> Dict:
+    def analyze_typeplate_features(self, text: str, t_low: Optional[str] = None) -> Dict:
         """
         Analysiert Typenschild-spezifische Text-Features.
 
+        Args:
+            text: OCR-extrahierter Text
+            t_low: Optional bereits kleingeschriebener Text
+
         Returns:
             {
                 "digit_ratio": 0.45,
@@ -131,36 +370,35 @@ class OCRAnalyzer:
                 "has_model_number": True
             }
         """
-        t_low = text.lower()
+        if t_low is None:
+            t_low = text.lower()
 
         # Ziffern-Ratio berechnen
-        digit_count = sum(c.isdigit() for c in text)
+        digit_count = count_digits(text)
         total_chars = len(text)
         digit_ratio = digit_count / max(total_chars, 1)
 
-        # Typeplate-Keywords zählen
-        keyword_hits = []
-        for kw in self.typeplate_keywords:
-            if kw in t_low:
-                keyword_hits.append(kw)
+        # Typeplate-Keywords zählen (ein Durchlauf für alle Keywords)
+        keyword_hits = list(config.get_typeplate_matcher().first_positions(t_low))
 
         # Spezielle Muster erkennen
-        has_serial_number = any(pattern in t_low for pattern in [
-            "serial", "s/n", "ser.", "serial no"
-        ])
-
-        has_model_number = any(pattern in t_low for pattern in [
-            "model", "type", "mod.", "model no"
-        ])
-
-        # Voltage/Power-Muster (z.B. "230V", "50Hz", "1.5kW")
-        voltage_pattern = r'\d+\s*[vV]'
-        frequency_pattern = r'\d+\s*[hH][zZ]'
-        power_pattern = r'\d+\.?\d*\s*[kK]?[wW]'
-
-        has_voltage = bool(re.search(voltage_pattern, text))
-        has_frequency = bool(re.search(frequency_pattern, text))
-        has_power = bool(re.search(power_pattern, text))
+        spec_hits = _SPEC_MATCHER.first_positions(t_low)
+        has_serial_number = any(pattern in spec_hits for pattern in _SERIAL_PATTERNS)
+        has_model_number = any(pattern in spec_hits for pattern in _MODEL_PATTERNS)
+
+        # Voltage/Power-Muster: Treffer verschiedener Arten überlappen nicht
+        # (unterschiedliche Endbuchstaben), ein finditer findet also alle
+        # Alle drei Muster brauchen eine Ziffer -> ohne Ziffern kein Regex-Lauf
+        found = set()
+        if digit_count:
+            for match in _TECH_RE.finditer(text):
+                found.add(match.lastgroup)
+                if len(found) == 3:
+                    break
+
+        has_voltage = "voltage" in found
+        has_frequency = "frequency" in found
+        has_power = "power" in found
 
         return {
             "digit_ratio": digit_ratio,
@@ -182,18 +420,7 @@ class OCRAnalyzer:
 
         Muster: DD.MM.YYYY, DD/MM/YYYY, YYYY-MM-DD, etc.
         """
-        date_patterns = [
-            r'\d{1,2}\.\d{1,2}\.\d{4}',  # DD.MM.YYYY
-            r'\d{1,2}/\d{1,2}/\d{4}',    # DD/MM/YYYY
-            r'\d{4}-\d{2}-\d{2}',        # YYYY-MM-DD
-            r'\d{1,2}\.\s*\d{1,2}\.\s*\d{4}',  # DD. MM. YYYY
-        ]
-
-        for pattern in date_patterns:
-            if re.search(pattern, text):
-                return True
-
-        return False
+        return _DATE_RE.search(text) is not None
 
     def get_text_statistics(self, text: str) -> Dict:
         """
@@ -214,25 +441,20 @@ class OCRAnalyzer:
             }
         """
         char_count = len(text)
-        word_count = len(text.split())
+        words = text.split()
+        word_count = len(words)
         line_count = len([l for l in text.split('\n') if l.strip()])
 
-        # Durchschnittliche Wortlänge
-        words = text.split()
-        avg_word_length = sum(len(w) for w in words) / max(word_count, 1)
-
-        # Zeichen-Verhältnisse
-        alpha_count = sum(c.isalpha() for c in text)
-        digit_count = sum(c.isdigit() for c in text)
-        space_count = sum(c.isspace() for c in text)
-        punct_count = sum(c in '.,;:!?-()[]{}"\'' for c in text)
-        upper_count = sum(c.isupper() for c in text)
-
-        alpha_ratio = alpha_count / max(char_count, 1)
-        digit_ratio = digit_count / max(char_count, 1)
-        space_ratio = space_count / max(char_count, 1)
-        punctuation_ratio = punct_count / max(char_count, 1)
-        uppercase_ratio = upper_count / max(char_count, 1)
+        # Durchschnittliche Wortlänge (Wörter enthalten alle Nicht-Leerzeichen)
+        avg_word_length = len("".join(words)) / max(word_count, 1)
+
+        # Zeichen-Verhältnisse (alle Klassen in einem Durchlauf)
+        counts = count_char_classes(text)
+        alpha_ratio = counts["alpha"] / max(char_count, 1)
+        digit_ratio = counts["digit"] / max(char_count, 1)
+        space_ratio = counts["space"] / max(char_count, 1)
+        punctuation_ratio = counts["punct"] / max(char_count, 1)
+        uppercase_ratio = counts["upper"] / max(char_count, 1)
 
         # Datumserkennung
         has_date = self.detect_date_patterns(text)
@@ -0,0 +1,27 @@
+# responses.py
+# Schnelle JSON-Responses via orjson (Fallback: Standard-JSONResponse)
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse mit orjson-Serialisierung (C, serialisiert auch NumPy-Typen).
+
+    Wird der Inhalt direkt als Response zurückgegeben, entfällt zusätzlich
+    FastAPIs jsonable_encoder-Durchlauf über das komplette Dict.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if not ORJSON_AVAILABLE:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
@@ -1,22 +1,201 @@
 # routers/config_api.py
 # Configuration API endpoints
 
+import asyncio
+import hashlib
+import hmac
+import json
 import os
 import logging
-from fastapi import APIRouter, HTTPException, Header, Depends
-from typing import Optional, Dict, Any
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header, Depends, Response
+from typing import Optional, Dict, Any, Awaitable, Callable, Hashable, Tuple
 
 from config_manager import config_manager
 from config_schemas import FullConfigSchema, ConfigMetadata
 from config import ClassificationConfig
+from cache import TTLCache
+
+# CI4-Client einmalig beim Import auflösen statt in jedem Request
+try:
+    from database.ci4_client import async_ci4_client as ci4_client
+except ImportError:
+    ci4_client = None
+from responses import ORJSON_AVAILABLE, ORJSONResponse, orjson
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["configuration"])
+# orjson für alle Endpoints, auch wenn der Router ohne die App-Defaults eingebunden wird
+router = APIRouter(tags=["configuration"], default_response_class=ORJSONResponse)
+
+# Config-Sektionen, deren Änderung das Learning-System zurücksetzt
+_LEARNING_RESET_KEYS = frozenset({"WEIGHTS", "THRESHOLDS"})
+
+# API-Key einmalig beim Import lesen (ändert sich zur Laufzeit nicht)
+_API_KEY_BYTES: Optional[bytes] = None
+
+
+def reload_api_key():
+    """Liest CONFIG_API_KEY erneut aus der Umgebung (z.B. für Tests)."""
+    global _API_KEY_BYTES
+    key = os.getenv("CONFIG_API_KEY", "")
+    _API_KEY_BYTES = key.encode("utf-8") if key else None
+
+
+reload_api_key()
+
+
+def _json_bytes(obj: Any) -> bytes:
+    """Serialisiert nach JSON-Bytes (orjson falls verfügbar)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _build_schema_json() -> Optional[bytes]:
+    """JSON-Schema einmalig serialisieren (deterministisch, None bei Fehler)."""
+    try:
+        return _json_bytes(FullConfigSchema.model_json_schema())
+    except Exception as e:
+        logger.error("Failed to build config schema: %s", e)
+        return None
+
+
+_SCHEMA_JSON = _build_schema_json()
+
+# Antworten der GET-Endpoints kurz zwischenspeichern. Der Schlüssel enthält
+# die Config-REVISION (Learning ändert Gewichte direkt), Änderungen über
+# diesen Router leeren den Cache; externe Datei-Edits greifen nach der TTL.
+RESPONSE_CACHE_TTL = 5.0
+_response_cache = TTLCache(maxsize=64, ttl=RESPONSE_CACHE_TTL)
+
+
+async def _cached(key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Liefert die zwischengespeicherte Antwort oder berechnet sie neu.
+
+    Args:
+        key: Endpoint + Parameter
+        factory: Coroutine-Funktion, die die Antwort berechnet
+
+    Returns:
+        Antwort (geteilt zwischen Requests, nicht verändern)
+    """
+    cache_key = (key, ClassificationConfig.REVISION)
+    value = _response_cache.get(cache_key)
+    if value is None:
+        value = await factory()
+        _response_cache.set(cache_key, value)
+    return value
+
+
+def _is_noop_update(current: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """
+    Prüft, ob ein (partielles) Update nichts an der Config ändern würde.
+
+    Args:
+        current: Aktuelle Config
+        update: Update aus dem PUT-Body
+
+    Returns:
+        True wenn jeder Wert im Update bereits so gesetzt ist
+    """
+    stack = [(current, update)]
+    while stack:
+        current_level, update_level = stack.pop()
+        for key, value in update_level.items():
+            if key not in current_level:
+                return False
+            existing = current_level[key]
+            if isinstance(existing, dict) and isinstance(value, dict):
+                stack.append((existing, value))
+            elif existing != value:
+                return False
+    return True
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Prüft einen If-None-Match-Header (Liste, "*" und schwache ETags)."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Defaults als Diff-Baseline: (REVISION, dict), wird nur gelesen
+_defaults_baseline: Optional[Tuple[int, Dict[str, Any]]] = None
+
+
+def _get_defaults_baseline() -> Dict[str, Any]:
+    """
+    Werkseinstellungen für /diff, einmal je Config-REVISION aufgebaut.
+
+    Returns:
+        Geteiltes Defaults-Dict (nicht verändern)
+    """
+    global _defaults_baseline
+    revision = ClassificationConfig.REVISION
+    if _defaults_baseline is None or _defaults_baseline[0] != revision:
+        _defaults_baseline = (revision, config_manager._get_defaults())
+    return _defaults_baseline[1]
+
+
+# CI4-Syncs serialisieren; Änderungen, die während eines laufenden Syncs
+# eintreffen, werden zusammengeführt und in einem Aufruf nachgereicht
+_ci4_sync_lock = asyncio.Lock()
+_ci4_pending: Optional[Dict[str, Any]] = None
+
+
+async def _sync_config_to_ci4(config_update: Dict[str, Any]):
+    """
+    Überträgt eine Config-Änderung an CI4 (BackgroundTask nach PUT).
+
+    Bei mehreren PUTs kurz hintereinander werden die (partiellen) Änderungen
+    per Deep-Merge gesammelt, spätere Werte gewinnen. Der erste Task, der
+    den Lock bekommt, sendet alles; die übrigen finden nichts mehr vor.
+
+    Args:
+        config_update: Angewendete Änderung
+    """
+    global _ci4_pending
+    if _ci4_pending is None:
+        _ci4_pending = {}
+    config_manager._merge_into(_ci4_pending, config_update)
+
+    async with _ci4_sync_lock:
+        payload, _ci4_pending = _ci4_pending, None
+        if not payload:
+            return  # Bereits von einem vorherigen Sync mitgenommen
+
+        try:
+            await ci4_client.update_base_config(payload)
+            logger.info("Configuration synced to CI4")
+        except Exception as e:
+            logger.error("Failed to sync to CI4: %s", e)
+
+
+async def _sync_defaults_to_ci4(weights: Dict[str, Any], thresholds: Dict[str, Any]):
+    """
+    Überträgt die Werkseinstellungen an CI4 (BackgroundTask nach Reset).
+
+    Args:
+        weights: Default-Gewichte
+        thresholds: Default-Schwellwerte
+    """
+    global _ci4_pending
+    # Die Defaults ersetzen alle vorher noch nicht gesendeten Änderungen
+    _ci4_pending = None
+
+    async with _ci4_sync_lock:
+        try:
+            await ci4_client.update_model_weights(weights, thresholds)
+            logger.info("Default configuration synced to CI4")
+        except Exception as e:
+            logger.error("Failed to sync defaults to CI4: %s", e)
 
 
 # Authentication dependency
-async def verify_api_key(x_config_api_key: str = Header(...)) -> bool:
+async def verify_api_key(x_config_api_key: Optional[str] = Header(None)) -> bool:
     """
     Verify configuration API key.
 
@@ -27,17 +206,25 @@ async def verify_api_key(x_config_api_key: str = Header(...)) -> bool:
         True if valid
 
     Raises:
-        HTTPException: If invalid or not configured
+        HTTPException: If missing, invalid or not configured
     """
-    expected = os.getenv("CONFIG_API_KEY")
+    expected = _API_KEY_BYTES
 
-    if not expected:
+    if expected is None:
         raise HTTPException(
             status_code=503,
             detail="Configuration API is not enabled. Set CONFIG_API_KEY environment variable."
         )
 
-    if x_config_api_key != expected:
+    # Fehlender Header: direkt 401 statt 422 mit Validierungsfehler
+    if not x_config_api_key:
+        raise HTTPException(
+            status_code=401,
+            detail="Missing X-Config-API-Key header"
+        )
+
+    # Konstante Laufzeit, damit der Vergleich keinen Präfix verrät
+    if not hmac.compare_digest(x_config_api_key.encode("utf-8"), expected):
         raise HTTPException(
             status_code=403,
             detail="Invalid configuration API key"
@@ -46,9 +233,32 @@ async def verify_api_key(x_config_api_key: str = Header(...)) -> bool:
     return True
 
 
-@router.get("", response_model=Dict[str, Any])
+def _ci4_client_or_raise():
+    """
+    CI4-Client für Endpoints, die CI4 zwingend brauchen.
+
+    Returns:
+        Async CI4-Client
+
+    Raises:
+        HTTPException: 400 wenn CI4 deaktiviert, 503 wenn Client fehlt
+    """
+    if not ClassificationConfig.CI4_ENABLED:
+        raise HTTPException(status_code=400, detail="CI4 integration not enabled")
+    if ci4_client is None:
+        raise HTTPException(status_code=503, detail="CI4 client not available")
+    return ci4_client
+
+
+async def require_ci4_client(authenticated: bool = Depends(verify_api_key)):
+    """Dependency: erst API-Key prüfen, dann CI4-Client (siehe _ci4_client_or_raise)."""
+    return _ci4_client_or_raise()
+
+
+@router.get("")
 async def get_full_config(
     include_runtime: bool = False,
+    if_none_match: Optional[str] = Header(None),
     authenticated: bool = Depends(verify_api_key)
 ):
     """
@@ -56,25 +266,36 @@ async def get_full_config(
 
     Args:
         include_runtime: Include runtime learning adjustments (default: False)
+        if_none_match: ETag of a previous response (304 if unchanged)
 
     Returns:
         Complete configuration with metadata
     """
-    try:
+    async def build():
         config = await config_manager.get_config()
         metadata = config_manager.get_metadata()
 
-        return {
+        body = _json_bytes({
             "config": config,
-            "metadata": metadata.dict()
-        }
+            "metadata": metadata.model_dump()
+        })
+        # ETag über den kompletten Body (Config und Metadaten)
+        return body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+    try:
+        body, etag = await _cached(("full", include_runtime), build)
 
     except Exception as e:
-        logger.error(f"Failed to get configuration: {e}")
+        logger.error("Failed to get configuration: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": etag}
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
-@router.get("/weights", response_model=Dict[str, Any])
+@router.get("/weights")
 async def get_weights(authenticated: bool = Depends(verify_api_key)):
     """
     Get current weights (base + runtime learning adjustments).
@@ -83,13 +304,13 @@ async def get_weights(authenticated: bool = Depends(verify_api_key)):
         Current weights configuration
     """
     try:
-        return await config_manager.get_config("WEIGHTS")
+        return ORJSONResponse(await _cached("WEIGHTS", lambda: config_manager.get_config("WEIGHTS")))
     except Exception as e:
-        logger.error(f"Failed to get weights: {e}")
+        logger.error("Failed to get weights: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/thresholds", response_model=Dict[str, float])
+@router.get("/thresholds")
 async def get_thresholds(authenticated: bool = Depends(verify_api_key)):
     """
     Get current classification thresholds.
@@ -98,9 +319,9 @@ async def get_thresholds(authenticated: bool = Depends(verify_api_key)):
         Current thresholds configuration
     """
     try:
-        return await config_manager.get_config("THRESHOLDS")
+        return ORJSONResponse(await _cached("THRESHOLDS", lambda: config_manager.get_config("THRESHOLDS")))
     except Exception as e:
-        logger.error(f"Failed to get thresholds: {e}")
+        logger.error("Failed to get thresholds: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -113,16 +334,20 @@ async def get_config_schema():
     Returns:
         Pydantic JSON schema
     """
+    if _SCHEMA_JSON is not None:
+        return Response(content=_SCHEMA_JSON, media_type="application/json")
+
     try:
-        return FullConfigSchema.schema()
+        return ORJSONResponse(FullConfigSchema.model_json_schema())
     except Exception as e:
-        logger.error(f"Failed to get schema: {e}")
+        logger.error("Failed to get schema: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("", response_model=Dict[str, Any])
+@router.put("")
 async def update_config(
     config_update: Dict[str, Any],
+    background_tasks: BackgroundTasks,
     dry_run: bool = False,
     authenticated: bool = Depends(verify_api_key)
 ):
@@ -139,8 +364,21 @@ async def update_config(
     WARNING: Updating weights will reset the learning system!
     """
     try:
+        # Einmal lesen, für No-op-Prüfung und Safety-Validierung
+        current = await config_manager.get_config_mutable()
+
+        # No-op (leer oder identisch zur aktuellen Config): kein Schreiben, kein CI4-Sync
+        if not dry_run and _is_noop_update(current, config_update):
+            return {
+                "status": "noop",
+                "warnings": [],
+                "config": current,
+                "learning_reset_required": False,
+                "ci4_synced": False
+            }
+
         # Safety validation
-        warnings = await config_manager.validate_safety(config_update)
+        warnings = await config_manager.validate_safety(config_update, current=current)
 
         if dry_run:
             return {
@@ -150,8 +388,9 @@ async def update_config(
             }
 
         # Apply update
-        learning_reset = "WEIGHTS" in config_update or "THRESHOLDS" in config_update
+        learning_reset = not _LEARNING_RESET_KEYS.isdisjoint(config_update)
         updated_config = await config_manager.update_config(config_update, persist=True)
+        _response_cache.clear()
 
         # Reset learning system if weights changed
         if learning_reset:
@@ -159,17 +398,14 @@ async def update_config(
             # Note: Learning system reset will be triggered in classifier_service.py
             # via feedback_processor.reset_learning()
 
-        # Sync to CI4 if enabled
+        # Sync to CI4 if enabled (nach der Antwort, Fehler landen im Log)
         ci4_synced = False
-        if ClassificationConfig.CI4_CONFIG.get("enabled"):
-            try:
-                from database.ci4_client import ci4_client
-                await ci4_client.update_base_config(config_update)
-                ci4_synced = True
-                logger.info("Configuration synced to CI4")
-            except Exception as e:
-                logger.error(f"Failed to sync to CI4: {e}")
-                warnings.append(f"CI4 sync failed: {str(e)}")
+        if ClassificationConfig.CI4_ENABLED:
+            if ci4_client is None:
+                warnings.append("CI4 sync failed: CI4 client not available")
+            else:
+                background_tasks.add_task(_sync_config_to_ci4, config_update)
+                ci4_synced = "pending"
 
         return {
             "status": "updated",
@@ -182,11 +418,11 @@ async def update_config(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Failed to update configuration: {e}")
+        logger.error("Failed to update configuration: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/reload", response_model=Dict[str, Any])
+@router.post("/reload")
 async def reload_config(
     clear_runtime: bool = True,
     authenticated: bool = Depends(verify_api_key)
@@ -204,6 +440,7 @@ async def reload_config(
     """
     try:
         config = await config_manager.reload(clear_runtime=clear_runtime)
+        _response_cache.clear()
 
         return {
             "status": "reloaded",
@@ -212,12 +449,15 @@ async def reload_config(
         }
 
     except Exception as e:
-        logger.error(f"Failed to reload configuration: {e}")
+        logger.error("Failed to reload configuration: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/reset", response_model=Dict[str, Any])
-async def reset_config(authenticated: bool = Depends(verify_api_key)):
+@router.post("/reset")
+async def reset_config(
+    background_tasks: BackgroundTasks,
+    authenticated: bool = Depends(verify_api_key)
+):
     """
     Reset configuration to factory defaults.
 
@@ -228,20 +468,20 @@ async def reset_config(authenticated: bool = Depends(verify_api_key)):
     """
     try:
         defaults = await config_manager.reset_to_defaults()
+        _response_cache.clear()
 
-        # Sync to CI4 if enabled
+        # Sync to CI4 if enabled (nach der Antwort, Fehler landen im Log)
         ci4_synced = False
-        if ClassificationConfig.CI4_CONFIG.get("enabled"):
-            try:
-                from database.ci4_client import ci4_client
-                await ci4_client.update_model_weights(
+        if ClassificationConfig.CI4_ENABLED:
+            if ci4_client is None:
+                logger.error("Failed to sync defaults to CI4: CI4 client not available")
+            else:
+                background_tasks.add_task(
+                    _sync_defaults_to_ci4,
                     defaults.get("WEIGHTS", {}),
                     defaults.get("THRESHOLDS", {})
                 )
-                ci4_synced = True
-                logger.info("Default configuration synced to CI4")
-            except Exception as e:
-                logger.error(f"Failed to sync defaults to CI4: {e}")
+                ci4_synced = "pending"
 
         return {
             "status": "reset",
@@ -250,11 +490,11 @@ async def reset_config(authenticated: bool = Depends(verify_api_key)):
         }
 
     except Exception as e:
-        logger.error(f"Failed to reset configuration: {e}")
+        logger.error("Failed to reset configuration: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/diff", response_model=Dict[str, Any])
+@router.get("/diff")
 async def get_config_diff(
     compare_to: str = "defaults",
     authenticated: bool = Depends(verify_api_key)
@@ -268,62 +508,66 @@ async def get_config_diff(
     Returns:
         Comparison result showing differences
     """
-    try:
-        current = await config_manager.get_config()
-
+    async def build():
+        # Aktuelle Config und Baseline sind unabhängig -> parallel laden
         if compare_to == "defaults":
-            baseline = config_manager._get_defaults()
+            current = await config_manager.get_config_mutable()
+            baseline = _get_defaults_baseline()
             baseline_name = "Factory Defaults"
 
         elif compare_to == "file":
-            baseline = await config_manager._load_from_file()
+            current, baseline = await asyncio.gather(
+                config_manager.get_config_mutable(),
+                config_manager._load_from_file()
+            )
             if not baseline:
                 raise HTTPException(status_code=404, detail="No config file exists")
             baseline_name = "Config File"
 
         elif compare_to == "ci4":
-            if not ClassificationConfig.CI4_CONFIG.get("enabled"):
-                raise HTTPException(status_code=400, detail="CI4 integration not enabled")
-
-            try:
-                from database.ci4_client import ci4_client
-                ci4_data = await ci4_client.get_model_weights()
-                if not ci4_data:
-                    raise HTTPException(status_code=404, detail="No weights in CI4")
-
-                baseline = {
-                    "WEIGHTS": ci4_data.get("weights", {}),
-                    "THRESHOLDS": ci4_data.get("thresholds", {})
-                }
-                baseline_name = "CI4 Database"
-
-            except ImportError:
-                raise HTTPException(status_code=503, detail="CI4 client not available")
+            ci4 = _ci4_client_or_raise()
+            current, ci4_data = await asyncio.gather(
+                config_manager.get_config_mutable(),
+                ci4.get_model_weights()
+            )
+            if not ci4_data:
+                raise HTTPException(status_code=404, detail="No weights in CI4")
+
+            baseline = {
+                "WEIGHTS": ci4_data.get("weights", {}),
+                "THRESHOLDS": ci4_data.get("thresholds", {})
+            }
+            baseline_name = "CI4 Database"
 
         else:
             raise HTTPException(status_code=400, detail=f"Invalid compare_to value: {compare_to}")
 
         diff = config_manager._calculate_diff(baseline, current)
 
-        return {
+        # Einmal serialisiert im Cache, jeder weitere Request sendet nur die Bytes
+        return _json_bytes({
             "baseline": baseline_name,
             "has_differences": bool(diff),
             "diff": diff,
             "current": current,
             "baseline_config": baseline
-        }
+        })
+
+    try:
+        body = await _cached(("diff", compare_to), build)
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to calculate diff: {e}")
+        logger.error("Failed to calculate diff: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/sync-from-ci4", response_model=Dict[str, Any])
+@router.post("/sync-from-ci4")
 async def sync_from_ci4(
     persist: bool = True,
-    authenticated: bool = Depends(verify_api_key)
+    ci4=Depends(require_ci4_client)
 ):
     """
     Pull latest configuration from CI4 database.
@@ -334,14 +578,9 @@ async def sync_from_ci4(
     Returns:
         Synced configuration
     """
-    if not ClassificationConfig.CI4_CONFIG.get("enabled"):
-        raise HTTPException(status_code=400, detail="CI4 integration not enabled")
-
     try:
-        from database.ci4_client import ci4_client
-
-        # Get weights from CI4
-        ci4_data = await ci4_client.get_model_weights()
+        # Get weights from CI4 (explicit sync: bypass the client cache)
+        ci4_data = await ci4.get_model_weights(use_cache=False)
         if not ci4_data:
             raise HTTPException(status_code=404, detail="No weights available in CI4")
 
@@ -352,6 +591,7 @@ async def sync_from_ci4(
 
         # Apply update
         updated_config = await config_manager.update_config(update, persist=persist)
+        _response_cache.clear()
 
         return {
             "status": "synced",
@@ -359,10 +599,8 @@ async def sync_from_ci4(
             "config": updated_config
         }
 
-    except ImportError:
-        raise HTTPException(status_code=503, detail="CI4 client not available")
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to sync from CI4: {e}")
+        logger.error("Failed to sync from CI4: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
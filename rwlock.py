@@ -0,0 +1,64 @@
+# rwlock.py
+# Asyncio Reader-Writer-Lock: parallele Leser, exklusive Schreiber
+
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class AsyncRWLock:
+    """
+    Reader-Writer-Lock für asyncio.
+
+    Beliebig viele Leser dürfen gleichzeitig halten, ein Schreiber nur
+    exklusiv. Wartende Schreiber haben Vorrang, damit ein stetiger Strom
+    von Lesern sie nicht aushungert. Nicht reentrant.
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @property
+    def reader_lock(self):
+        """Context Manager für geteilten Lesezugriff."""
+        return self._read()
+
+    @property
+    def writer_lock(self):
+        """Context Manager für exklusiven Schreibzugriff."""
+        return self._write()
+
+    @asynccontextmanager
+    async def _read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def _write(self):
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            except BaseException:
+                # Abgebrochen: blockierte Leser wieder freigeben
+                self._waiting_writers -= 1
+                self._cond.notify_all()
+                raise
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()